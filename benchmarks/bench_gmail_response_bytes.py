@@ -0,0 +1,50 @@
+"""
+Compare Gmail response bytes for a draft-style thread read, before and after
+partial responses and tiered fetching.
+
+"Before" is one unmasked ``threads.get(format='full')`` plus a second one
+for the reply headers, as ``/email/draft`` and ``/email/send`` used to do.
+"After" is the thread store's tiered fetch plus an uncached reply-header
+lookup. Needs a logged-in user in the configured database.
+
+Usage:
+    python benchmarks/bench_gmail_response_bytes.py <email> <thread_id>
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from draftly_v1.services import gmail_client  # noqa: E402
+from draftly_v1.services.gmail_services import get_gmail_client  # noqa: E402
+from draftly_v1.services.thread_store import ThreadStore  # noqa: E402
+
+
+def _snapshot(label: str):
+    total = gmail_client.get_response_stats()["total"]
+    print(f"{label:8} requests={total['requests']:3}  "
+          f"bytes={total['response_bytes']:10}  "
+          f"bytes/request={total['bytes_per_request']:9}")
+    gmail_client.reset_response_stats()
+
+
+async def main(email: str, thread_id: str):
+    client = get_gmail_client(email)
+    gmail_client.reset_response_stats()
+
+    await client.get_thread(thread_id, format='full')
+    await client.get_thread(thread_id)
+    _snapshot("before")
+
+    store = ThreadStore()
+    await store.get(client, thread_id)
+    await ThreadStore().get_reply_headers(client, thread_id)
+    _snapshot("after")
+    await gmail_client.close_http_client()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    asyncio.run(main(sys.argv[1], sys.argv[2]))
@@ -0,0 +1,74 @@
+"""
+Benchmark the per-call setup overhead of generate_draft.
+
+Compares the previous code path, which constructed a ChatGroq client,
+parsed the PromptTemplate and composed the chain on every call, with the
+shared client and chain from ``llm_services.get_draft_chain``. Only local
+work is timed (no request is sent). Reusing the pooled keep-alive
+connection also saves a TLS handshake per draft, and that is not
+included here.
+
+Usage:
+    python benchmarks/bench_llm_client.py
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+os.environ.setdefault("GROQ_API_KEY", "benchmark-key")
+
+from langchain_core.output_parsers import StrOutputParser  # noqa: E402
+from langchain_core.prompts import PromptTemplate  # noqa: E402
+from langchain_groq import ChatGroq  # noqa: E402
+from draftly_v1.services.llm_services import (  # noqa: E402
+    DRAFT_PROMPT, formatted_context, get_draft_chain)
+
+CONTEXT = [{
+    "from": "alice@example.com",
+    "to": "bob@example.com",
+    "date": "Mon, 1 Jun 2026 09:00:00 +0000",
+    "subject": "Quarterly review",
+    "body": "<p>Can we move the review to Thursday?</p>" * 20,
+}]
+
+
+def _variables() -> dict:
+    return {"user_style": "Professional",
+            "email_context": formatted_context(CONTEXT),
+            "sender_name": "Bob"}
+
+
+def legacy_setup():
+    """The work generate_draft did before invoking the model."""
+    llm = ChatGroq(model="llama-3.3-70b-versatile")
+    prompt = PromptTemplate.from_template(DRAFT_PROMPT.template)
+    chain = prompt | llm | StrOutputParser()
+    return chain, prompt.invoke(_variables())
+
+
+def shared_setup():
+    chain = get_draft_chain()
+    return chain, DRAFT_PROMPT.invoke(_variables())
+
+
+def _time(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1000
+
+
+def main():
+    shared_setup()  # first call builds the client, as the app does at startup
+    legacy_ms = _time(legacy_setup, 20)
+    shared_ms = _time(shared_setup, 200)
+    print(f"{'path':24} {'ms per call':>12}")
+    print(f"{'new client per call':24} {legacy_ms:12.3f}")
+    print(f"{'shared client + chain':24} {shared_ms:12.3f}")
+    print(f"speedup: {legacy_ms / shared_ms:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark MIME body extraction on synthetic Gmail payloads.
+
+Compares the previous top-level loop, which re-normalized the accumulated
+body after every part, with ``mime_parser.extract_body``.
+
+Usage:
+    python benchmarks/bench_mime_parser.py
+"""
+import base64
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from draftly_v1.services.utils.mime_parser import extract_body  # noqa: E402
+
+
+def _encode(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def legacy_body(payload: dict) -> str:
+    """Body loop formerly inlined in fetch_email_thread_by_id (older messages)."""
+    body = ""
+    parts = payload.get('parts', [])
+    if parts:
+        for part in parts:
+            if part.get('mimeType') == 'text/html':
+                data = part.get('body', {}).get('data', '')
+                if data:
+                    body += base64.urlsafe_b64decode(data).decode('utf-8')
+                    body = re.sub(r'[\r\n\t]+', ' ', body).strip()
+    else:
+        data = payload.get('body', {}).get('data', '')
+        if data:
+            body += base64.urlsafe_b64decode(data).decode('utf-8')
+            body = re.sub(r'[\r\n\t]+', ' ', body).strip()
+    return body
+
+
+def many_parts(count: int = 50, part_size: int = 20_000) -> dict:
+    """multipart/mixed with ``count`` HTML parts, each with a plain alternative."""
+    line = "<p>Quarterly numbers attached, see below.</p>\r\n"
+    html = line * (part_size // len(line))
+    plain = html.replace("<p>", "").replace("</p>", "")
+    return {
+        "mimeType": "multipart/mixed",
+        "parts": [{"mimeType": "text/html", "body": {"data": _encode(html)}}
+                  for _ in range(count)],
+    }, {
+        "mimeType": "multipart/mixed",
+        "parts": [{
+            "mimeType": "multipart/alternative",
+            "parts": [
+                {"mimeType": "text/plain", "body": {"data": _encode(plain)}},
+                {"mimeType": "text/html", "body": {"data": _encode(html)}},
+            ],
+        } for _ in range(count)],
+    }
+
+
+def large_message(size: int = 5 * 1024 * 1024) -> dict:
+    line = "Line of a very long status report.\r\n\t"
+    text = line * (size // len(line))
+    return {"mimeType": "text/plain", "body": {"data": _encode(text)}}
+
+
+def _time(fn, payload, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    flat, nested = many_parts()
+    large = large_message()
+    cases = [
+        ("50 html parts (flat)", flat, flat),
+        ("50 parts (nested alternative)", flat, nested),
+        ("5 MB single part", large, large),
+    ]
+    print(f"{'case':32} {'legacy ms':>10} {'walker ms':>10} {'speedup':>8}")
+    for name, legacy_payload, payload in cases:
+        legacy_ms = _time(legacy_body, legacy_payload)
+        walker_ms = _time(extract_body, payload)
+        speedup = legacy_ms / walker_ms
+        print(f"{name:32} {legacy_ms:10.1f} {walker_ms:10.1f} {speedup:7.1f}x")
+    print(f"legacy body for the nested message: {len(legacy_body(nested))} chars "
+          f"(walker: {len(extract_body(nested))} chars)")
+
+
+if __name__ == "__main__":
+    main()
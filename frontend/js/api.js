@@ -52,10 +52,13 @@ export async function regenerateDraftAPI( userStyle, thread_id) {
     });
 }
 
-export async function sendEmailAPI(emailId, threadId, draftBody, toEmail, draftOnly = false) {
+export async function sendEmailAPI(emailId, threadId, draftBody, toEmail, draftOnly = false, idempotencyKey = null) {
+    const headers = {'Content-Type': 'application/json'};
+    // The same key on a repeated submit returns the first request's job instead of sending again
+    if (idempotencyKey) headers['Idempotency-Key'] = idempotencyKey;
     return await authenticatedFetch('/email/send', {
         method: 'POST',
-        headers: {'Content-Type': 'application/json'},
+        headers,
         body: JSON.stringify({ 
             email: emailId, 
             thread_id: threadId, 
@@ -65,3 +68,91 @@ export async function sendEmailAPI(emailId, threadId, draftBody, toEmail, draftO
         })
     });
 }
+
+export async function fetchInboxPage(emailId, cursor, pageSize, onRecord) {
+    // Paged listing: records arrive one JSON object per line, the last line carries next_cursor
+    const response = await fetch('/email/fetch_latest', {
+        method: 'POST',
+        credentials: 'include',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Session-Token': localStorage.getItem('draftly_session')
+        },
+        body: JSON.stringify({ email: emailId, cursor, page_size: pageSize })
+    });
+    if (!await handleResponse(response)) return null;
+    if (!response.ok) throw new Error(`Inbox page failed with status ${response.status}`);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let nextCursor = null;
+    const handleLine = (line) => {
+        if (!line.trim()) return;
+        const item = JSON.parse(line);
+        if (item.error) throw new Error(item.error);
+        if ('next_cursor' in item) nextCursor = item.next_cursor;
+        else onRecord(item);
+    };
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.forEach(handleLine);
+    }
+    handleLine(buffer);
+    return { nextCursor };
+}
+
+export async function streamDraftAPI(path, payload, onEvent, signal) {
+    // Draft generation streamed as Server-Sent Events over a POST (EventSource only supports GET)
+    const response = await fetch(path, {
+        method: 'POST',
+        credentials: 'include',
+        signal,
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Session-Token': localStorage.getItem('draftly_session')
+        },
+        body: JSON.stringify(payload)
+    });
+    if (!await handleResponse(response)) return false;
+    if (!response.ok) throw new Error(`Draft stream failed with status ${response.status}`);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    const handleMessage = (message) => {
+        let event = 'message';
+        const data = [];
+        message.split('\n').forEach(line => {
+            if (line.startsWith('event: ')) event = line.slice(7);
+            else if (line.startsWith('data: ')) data.push(line.slice(6));
+        });
+        if (data.length) onEvent(event, JSON.parse(data.join('\n')));
+    };
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop();
+        messages.forEach(handleMessage);
+    }
+    if (buffer.trim()) handleMessage(buffer);
+    return true;
+}
+
+export async function fetchOutboxJob(jobId) {
+    return await authenticatedFetch(`/email/outbox/${jobId}`, { method: 'GET' });
+}
+
+export async function autosaveDraftAPI(threadId, draftBody, toEmail) {
+    return await authenticatedFetch('/email/autosave', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({ thread_id: threadId, draft_body: draftBody, toEmail: toEmail })
+    });
+}
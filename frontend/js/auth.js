@@ -29,7 +29,9 @@ export async function handleAuth() {
     if (!isLoggedIn) {
         window.location.href = "/login";
     } else {
-        // Logout: call backend and clear local state
+        // Logout: close the inbox stream, call backend and clear local state
+        const { stopInboxStream } = await import('./emailManager.js');
+        stopInboxStream();
         try {
             await fetch('/auth/logout', {
                 method: 'POST',
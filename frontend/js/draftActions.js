@@ -1,45 +1,157 @@
 // Draft Actions Module (Send & Save)
 
-import { sendEmailAPI } from './api.js';
+import { sendEmailAPI, fetchOutboxJob, autosaveDraftAPI, streamDraftAPI } from './api.js';
 import { getAuthState } from './auth.js';
 import { syncEmails } from './emailManager.js';
 
-export async function approveAndSend() {
-    const { emailId } = getAuthState();
-    const content = document.getElementById('ai-draft-body').innerHTML;
+const OUTBOX_POLL_INTERVAL = 2000; // used when EventSource is unavailable or its stream fails
+const OUTBOX_POLL_MAX_FAILURES = 5; // consecutive failed status checks before giving up
+const AUTOSAVE_DELAY = 1000; // the server debounces further before uploading to Gmail
 
-    // Get current thread and recipient from email manager
-    const { currentThreadId, recipientEmail } = await import('./emailManager.js');
-    
-    if (!currentThreadId) return alert("Select an email first!");
-    
+let autosaveTimer = null;
+let draftStream = null; // AbortController of the draft being generated, if any
 
-    const response = await sendEmailAPI(emailId, currentThreadId, content, recipientEmail, false);
-    
-    if (!response) return;
-    if (response.message_id) {
-        document.getElementById('ai-draft-body').innerHTML = "<div style='color: green;'>Email sent successfully!</div>";
-        document.getElementById('thread-content').innerHTML = '<div class="text-center text-muted mt-5">Select an email to view thread context</div>';
-        await syncEmails();
+// Idempotency keys of submissions not yet finished, so a double click reuses the key
+const pendingKeys = new Map();
+
+function idempotencyKeyFor(threadId, draftOnly, content) {
+    const submission = `${threadId}:${draftOnly}:${content}`;
+    if (!pendingKeys.has(submission)) pendingKeys.set(submission, crypto.randomUUID());
+    return [submission, pendingKeys.get(submission)];
+}
+
+// UNKNOWN: Gmail did not confirm a send, so the server does not retry it
+const FINAL_JOB_STATUSES = ['DONE', 'FAILED', 'UNKNOWN'];
+const isFinalJob = job => job && FINAL_JOB_STATUSES.includes(job.status);
+
+function pollOutboxJob(jobId) {
+    // Resolves with the finished job, or a FAILED stand-in once the job cannot be read any more
+    return new Promise(resolve => {
+        let failures = 0;
+        const poll = async () => {
+            try {
+                const job = await fetchOutboxJob(jobId);
+                if (isFinalJob(job)) return resolve(job);
+                if (!job || !job.status) {
+                    return resolve({ status: 'FAILED', error: (job && job.detail) || 'request status unavailable' });
+                }
+                failures = 0;
+            } catch (err) {
+                console.warn("Outbox status check failed", err);
+                if (++failures >= OUTBOX_POLL_MAX_FAILURES) {
+                    return resolve({ status: 'FAILED', error: 'lost contact with the server, check Sent before retrying' });
+                }
+            }
+            setTimeout(poll, OUTBOX_POLL_INTERVAL);
+        };
+        poll();
+    });
+}
+
+function waitForOutboxJob(jobId) {
+    // Resolves with the job once the server reports a final status
+    if (!window.EventSource) return pollOutboxJob(jobId);
+    return new Promise(resolve => {
+        const stream = new EventSource(`/email/outbox/${jobId}/stream`, { withCredentials: true });
+        stream.addEventListener('job', (event) => {
+            const job = JSON.parse(event.data);
+            if (isFinalJob(job)) {
+                stream.close();
+                resolve(job);
+            }
+        });
+        // A dropped or refused stream would otherwise leave the UI waiting forever
+        stream.onerror = () => {
+            stream.close();
+            resolve(pollOutboxJob(jobId));
+        };
+    });
+}
+
+export async function streamDraftInto(draftArea, path, payload, onContext) {
+    // Render the draft token by token; a newer stream (or leaving the thread) aborts this one
+    if (draftStream) draftStream.abort();
+    const controller = new AbortController();
+    draftStream = controller;
+    draftArea.contentEditable = "false";
+    let text = '';
+    let failed = false;
+    try {
+        const ok = await streamDraftAPI(path, payload, (event, data) => {
+            if (event === 'context' && onContext) onContext(data);
+            else if (event === 'token') {
+                if (!text) draftArea.innerHTML = '';
+                text += data.text;
+                draftArea.innerHTML = text;
+            } else if (event === 'done') draftArea.innerHTML = data.draft || "No draft generated. retry again.";
+            else if (event === 'error') failed = true;
+        }, controller.signal);
+        if (!ok) return;
+        if (failed) draftArea.innerHTML = "Failed to generate draft.";
+    } catch (err) {
+        if (err.name === 'AbortError') return;
+        throw err;
+    } finally {
+        if (draftStream === controller) {
+            draftStream = null;
+            draftArea.contentEditable = "true";
+        }
     }
 }
 
-export async function draftEmail() {
+export function startDraftAutosave() {
+    const draftArea = document.getElementById('ai-draft-body');
+    draftArea.addEventListener('input', () => {
+        clearTimeout(autosaveTimer);
+        autosaveTimer = setTimeout(async () => {
+            const { currentThreadId, recipientEmail } = await import('./emailManager.js');
+            if (!currentThreadId) return;
+            try {
+                await autosaveDraftAPI(currentThreadId, draftArea.innerHTML, recipientEmail);
+            } catch (err) {
+                console.warn("Autosave failed", err);
+            }
+        }, AUTOSAVE_DELAY);
+    });
+}
+
+async function submitReply(draftOnly) {
     const { emailId } = getAuthState();
-    const content = document.getElementById('ai-draft-body').innerHTML;
+    const draftArea = document.getElementById('ai-draft-body');
+    const content = draftArea.innerHTML;
 
-    
     // Get current thread and recipient from email manager
     const { currentThreadId, recipientEmail } = await import('./emailManager.js');
     
     if (!currentThreadId) return alert("Select an email first!");
+    if (draftStream) return alert("Wait for the draft to finish generating.");
 
-    const response = await sendEmailAPI(emailId, currentThreadId, content, recipientEmail, true);
+    clearTimeout(autosaveTimer);
+    const [submission, idempotencyKey] = idempotencyKeyFor(currentThreadId, draftOnly, content);
+    const response = await sendEmailAPI(emailId, currentThreadId, content, recipientEmail, draftOnly, idempotencyKey);
     
-    if (!response) return;
-    if (response.draft_id) {
-        document.getElementById('ai-draft-body').innerHTML = "<div style='color: green;'>Draft Saved successfully!</div>";
+    if (!response || !response.job_id) return;
+    draftArea.innerHTML = `<div class='text-muted'>${draftOnly ? 'Saving draft' : 'Sending'}...</div>`;
+
+    const job = await waitForOutboxJob(response.job_id);
+    pendingKeys.delete(submission);
+    if (job.status === 'DONE') {
+        draftArea.innerHTML = `<div style='color: green;'>${draftOnly ? 'Draft Saved' : 'Email sent'} successfully!</div>`;
         document.getElementById('thread-content').innerHTML = '<div class="text-center text-muted mt-5">Select an email to view thread context</div>';
         await syncEmails();
+    } else if (job.status === 'UNKNOWN') {
+        draftArea.innerHTML = content;
+        alert('The email may have been sent, but Gmail did not confirm it. Check Sent before sending again.');
+    } else {
+        draftArea.innerHTML = content;
+        alert(`Could not ${draftOnly ? 'save the draft' : 'send the email'}: ${job.error || 'unknown error'}`);
     }
 }
+
+export async function approveAndSend() {
+    await submitReply(false);
+}
+
+export async function draftEmail() {
+    await submitReply(true);
+}
@@ -1,25 +1,57 @@
 // Email Management Module
 
-import { fetchLatestEmails, fetchEmailThread, regenerateDraftAPI, sendEmailAPI } from './api.js';
+import { fetchLatestEmails, fetchInboxPage, sendEmailAPI } from './api.js';
+import { streamDraftInto } from './draftActions.js';
 import { getAuthState } from './auth.js';
 
 export let currentThreadId = null;
 export let emailThreadContentData = {};
+let regeneratedTone = null; // style of the draft shown after the last regeneration
 export let recipientEmail = "";
 export let fromEmail = "";
 export let toEmail = "";
 
-const AUTO_REFRESH_INTERVAL = 2 * 60 * 1000; // 2 minutes
+const FALLBACK_REFRESH_INTERVAL = 2 * 60 * 1000; // 2 minutes, only when SSE is unavailable
+const INBOX_PAGE_SIZE = 25;
 
-export function startAutoPolling() {
-    console.log("Auto-polling started...");
-    setInterval(async () => {
+let inboxStream = null;
+// Paging state for "Load more": threads already listed and the cursor of the next page
+let listedThreads = new Set();
+let pageCursor = null;
+
+export function startInboxStream() {
+    // Server pushes inbox updates when Gmail notifies us of new mail
+    if (!window.EventSource) {
+        console.log("EventSource unsupported, falling back to polling...");
+        setInterval(async () => {
+            const { isLoggedIn } = getAuthState();
+            if (isLoggedIn) {
+                await syncEmails();
+            }
+        }, FALLBACK_REFRESH_INTERVAL);
+        return;
+    }
+    if (inboxStream) return;
+
+    console.log("Inbox stream started...");
+    inboxStream = new EventSource('/email/stream', { withCredentials: true });
+    inboxStream.addEventListener('inbox', (event) => {
         const { isLoggedIn } = getAuthState();
-        if (isLoggedIn) {
-            console.log("refresh to sync emails...");
-            await syncEmails();
-        }
-    }, AUTO_REFRESH_INTERVAL);
+        if (!isLoggedIn) return;
+        console.log("inbox update pushed by server");
+        renderSyncResult(JSON.parse(event.data));
+    });
+    inboxStream.onerror = () => {
+        // EventSource reconnects on its own; just surface the state
+        console.warn("Inbox stream interrupted, reconnecting...");
+    };
+}
+
+export function stopInboxStream() {
+    if (inboxStream) {
+        inboxStream.close();
+        inboxStream = null;
+    }
 }
 
 export async function syncEmails() {
@@ -34,43 +66,7 @@ export async function syncEmails() {
     try {
         const data  = await fetchLatestEmails(emailId);
         if (!data) return;
-
-        const now = new Date();
-        syncTimeDisplay.innerText = now.toLocaleTimeString([], 
-            { hour: '2-digit', minute: '2-digit', second: '2-digit' });
-        
-        const messages = data.messages || data.message_ids;
-        if(typeof(data.message) == "string") 
-        {
-            listContainer.innerHTML = `<div class="p-3 text-center">${data.message}</div>`;
-            return;
-        }
-        
-        const subjects = messages.subject;
-        if (!messages || !subjects) {
-            listContainer.innerHTML = '<div class="p-3 text-center">No emails found</div>';
-            return;
-        }
-        
-        
-        const msgIds = messages.msgId;
-        const threadIds = messages.threadId;
-        const from = messages.from || "Unknown Sender";
-        const snippet = messages.snippet || [];
-        const toEmail = messages.toEmail || [];
-        
-        const emailList = msgIds.map((msgId, index) => ({
-            msgId: msgId,
-            threadId: threadIds[index],
-            subject: subjects[index],
-            from: from[index] || "Unknown Sender",
-            snippet: snippet[index] || "",
-            toEmail: toEmail[index]
-        }));
-        
-        console.log("Processed emails:", emailList);
-        renderEmailList(emailList, listContainer);
-        
+        renderSyncResult(data);
     } catch (err) {
         console.error("Sync failed", err);
         syncTimeDisplay.innerText = "Error";
@@ -79,25 +75,104 @@ export async function syncEmails() {
     }
 }
 
+function renderSyncResult(data) {
+    const listContainer = document.getElementById('email-list');
+    const syncTimeDisplay = document.getElementById('last-sync-time');
+
+    const now = new Date();
+    syncTimeDisplay.innerText = now.toLocaleTimeString([], 
+        { hour: '2-digit', minute: '2-digit', second: '2-digit' });
+    syncTimeDisplay.classList.remove('text-danger');
+    
+    const messages = data.messages || data.message_ids;
+    if(typeof(data.message) == "string") 
+    {
+        listContainer.innerHTML = `<div class="p-3 text-center">${data.message}</div>`;
+        return;
+    }
+    
+    const subjects = messages?.subject;
+    if (!messages || !subjects) {
+        listContainer.innerHTML = '<div class="p-3 text-center">No emails found</div>';
+        return;
+    }
+    
+    
+    const msgIds = messages.msgId;
+    const threadIds = messages.threadId;
+    const from = messages.from || "Unknown Sender";
+    const snippet = messages.snippet || [];
+    const toEmail = messages.toEmail || [];
+    
+    const emailList = msgIds.map((msgId, index) => ({
+        msgId: msgId,
+        threadId: threadIds[index],
+        subject: subjects[index],
+        from: from[index] || "Unknown Sender",
+        snippet: snippet[index] || "",
+        toEmail: toEmail[index]
+    }));
+    
+    console.log("Processed emails:", emailList);
+    renderEmailList(emailList, listContainer);
+}
+
+function renderEmailItem(email, container) {
+    const item = document.createElement('div');
+    item.className = 'list-group-item email-item p-3';
+    item.onclick = () => loadThread(email.threadId, email.subject, email.from);
+    item.innerHTML = `
+        <div class="d-flex justify-content-between"><strong>${email.subject}</strong></div>
+        <div class="small text-truncate">${email.from}</div>
+        <div class="small text-truncate">${email.snippet}</div>
+    `;
+    container.appendChild(item);
+    listedThreads.add(email.threadId);
+}
+
 function renderEmailList(emailList, container) {
     container.innerHTML = '';
-    emailList.forEach(email => {
-        const item = document.createElement('div');
-        item.className = 'list-group-item email-item p-3';
-        item.onclick = () => loadThread(email.threadId, email.subject, email.from);
-        item.innerHTML = `
-            <div class="d-flex justify-content-between"><strong>${email.subject}</strong></div>
-            <div class="small text-truncate">${email.from}</div>
-            <div class="small text-truncate">${email.snippet}</div>
-        `;
-        container.appendChild(item);
-    });
+    listedThreads = new Set();
+    pageCursor = null;
+    emailList.forEach(email => renderEmailItem(email, container));
+    renderLoadMore(container);
+}
+
+function renderLoadMore(container) {
+    const button = document.createElement('button');
+    button.id = 'load-more-btn';
+    button.className = 'list-group-item list-group-item-action text-center small';
+    button.innerText = 'Load more';
+    button.onclick = () => loadMoreEmails();
+    container.appendChild(button);
+}
+
+export async function loadMoreEmails() {
+    // Pages through the whole unread inbox; records are rendered as they stream in
+    const { emailId } = getAuthState();
+    const container = document.getElementById('email-list');
+    const button = document.getElementById('load-more-btn');
+    if (button) button.remove();
+
+    try {
+        const page = await fetchInboxPage(emailId, pageCursor, INBOX_PAGE_SIZE, record => {
+            if (listedThreads.has(record.threadId)) return;
+            renderEmailItem(record, container);
+        });
+        if (!page) return;
+        pageCursor = page.nextCursor;
+        if (pageCursor) renderLoadMore(container);
+    } catch (err) {
+        console.error("Loading more emails failed", err);
+        renderLoadMore(container);
+    }
 }
 
 export async function loadThread(threadId, subject, from) {
     const { emailId, draftTone } = getAuthState();
     currentThreadId = threadId;
     recipientEmail = from;
+    regeneratedTone = null;
     
     document.getElementById('view-subject').innerText = subject;
     const draftArea = document.getElementById('ai-draft-body');
@@ -106,14 +181,11 @@ export async function loadThread(threadId, subject, from) {
     threadContent.innerHTML = 'Loading conversation...';
     draftArea.innerHTML = "AI is thinking...";
     
-    try {
-        emailThreadContentData = await fetchEmailThread(emailId, threadId, draftTone || 'Professional');
-        if (!emailThreadContentData) return;
-        
-        const draft = emailThreadContentData.draft || "No draft generated. retry again.";
-        const threadMsgs = emailThreadContentData.thread_context?.llm_context || [];
-        fromEmail = emailThreadContentData.thread_context?.llm_context.from_email || "";
-        toEmail = emailThreadContentData.thread_context?.llm_context.to_email || "";
+    const renderThread = (data) => {
+        emailThreadContentData = data;
+        const threadMsgs = data.thread_context?.llm_context || [];
+        fromEmail = data.thread_context?.llm_context.from_email || "";
+        toEmail = data.thread_context?.llm_context.to_email || "";
 
         threadContent.innerHTML = threadMsgs.map(msg => `
             <div class="mb-3 p-2 border-bottom">
@@ -125,9 +197,12 @@ export async function loadThread(threadId, subject, from) {
                 <p class="mb-0 mt-2">${msg.body || 'No content'}</p>
             </div>
         `).join('');
+    };
 
-        draftArea.innerHTML = draft;
-        
+    try {
+        // The thread arrives first, then the draft streams in as it is generated
+        await streamDraftInto(draftArea, '/email/draft/stream',
+            { threadId, tone: draftTone || 'Professional', email: emailId }, renderThread);
     } catch (err) {
         console.error("Thread fetch failed", err);
         draftArea.innerHTML = "Failed to generate draft.";
@@ -137,19 +212,13 @@ export async function loadThread(threadId, subject, from) {
 export async function regenerateDraft(tone) {
     const draftArea = document.getElementById('ai-draft-body');
     draftArea.innerHTML = "AI is thinking...";
-    
-    const threadMsgs = emailThreadContentData.thread_context?.llm_context || [];
-    const llmContext = threadMsgs.map(msg => msg.body || 'No content');
+    // Choosing the style already shown asks for a new draft; other styles may come from the draft cache
+    const forceFresh = tone === regeneratedTone;
+    regeneratedTone = tone;
     
     try {
-        const data  = await regenerateDraftAPI(tone, currentThreadId);
-        if (!data) return;
-        
-       
-        const draft = data.draft || "No draft generated. retry again.";
-        draftArea.innerHTML = draft;
-        draftArea.contentEditable = "true";
-        
+        await streamDraftInto(draftArea, '/email/regenerate_draft/stream',
+            { user_style: tone, thread_id: currentThreadId, force_fresh: forceFresh });
     } catch (err) {
         console.error("Regenerate failed", err);
         draftArea.innerHTML = "Failed to generate draft.";
@@ -1,8 +1,8 @@
 // Main Application Entry Point
 
 import { handleAuth, setAuthState, updateAuthUI, restartAuthFlow } from './auth.js';
-import { syncEmails, startAutoPolling, regenerateDraft } from './emailManager.js';
-import { approveAndSend, draftEmail } from './draftActions.js';
+import { syncEmails, startInboxStream, regenerateDraft } from './emailManager.js';
+import { approveAndSend, draftEmail, startDraftAutosave } from './draftActions.js';
 
 // Expose functions to global scope for inline onclick handlers
 window.handleAuth = handleAuth;
@@ -29,7 +29,8 @@ async function initializeApp() {
             }
             setAuthState(true, data.email);
             updateAuthUI();
-            startAutoPolling();
+            startInboxStream();
+            startDraftAutosave();
             await syncEmails(); // Initial sync
         } else {
             // Not authenticated, redirect to login
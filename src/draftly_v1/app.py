@@ -1,22 +1,51 @@
 """Draftly - AI Email Assistant Application"""
 import sys
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from draftly_v1.services.utils.logger_config import setup_logging
 from draftly_v1.config import FRONTEND_DIR, ALLOWED_ORIGINS
-from draftly_v1.routes import auth_routes, email_routes, static_routes
+from draftly_v1.routes import (auth_routes, email_routes, static_routes,
+                              notification_routes)
+from draftly_v1.services.gmail_client import close_http_client
+from draftly_v1.services.google_http import close_http_session
+from draftly_v1.services.llm_services import get_draft_chain, llm_clients
+from draftly_v1.services.autosave_services import draft_autosaver
+from draftly_v1.services.outbox_services import outbox_dispatcher
+from draftly_v1.services.prefetch_services import prefetch_tasks
+from draftly_v1.services.speculative_services import speculative_drafter
 
 # Setup logging
 setup_logging(logging.INFO)
 _logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown hooks"""
+    # Build the LLM client and draft chain now rather than on the first draft request
+    get_draft_chain()
+    await outbox_dispatcher.start()
+    yield
+    # Pending autosaves are queued in the outbox table before the workers stop
+    await draft_autosaver.shutdown()
+    await outbox_dispatcher.shutdown()
+    await prefetch_tasks.shutdown()
+    await speculative_drafter.tasks.shutdown()
+    # Release pooled keep-alive connections
+    await close_http_client()
+    close_http_session()
+    await llm_clients.close()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Draftly API",
     description="AI-powered email drafting assistant",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -36,6 +65,7 @@ app.include_router(static_routes.router)
 app.include_router(static_routes.router)
 app.include_router(auth_routes.router)
 app.include_router(email_routes.router)
+app.include_router(notification_routes.router)
 
 
 def main():
@@ -2,32 +2,19 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-import glob
+from draftly_v1.services.utils.client_secrets import ClientSecretsProvider
 
 load_dotenv()
 
 # Paths
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
+# Shared, cached view of the OAuth client secrets (used by config and database)
+CLIENT_SECRETS = ClientSecretsProvider(BASE_DIR / "resources")
+
 def get_client_secrets_file():
     """Find the first client_secret*.json file in resources directory"""
-    resources_dir = BASE_DIR / "resources"
-    if not resources_dir.exists():
-        raise FileNotFoundError(f"Resources directory not found: {resources_dir}")
-    
-    # Search for any client_secret*.json file
-    secret_files = list(resources_dir.glob("client_secret*.json"))
-    
-    if not secret_files:
-        raise FileNotFoundError(
-            f"No client_secret*.json file found in {resources_dir}. "
-            "Please download your OAuth credentials from Google Cloud Console."
-        )
-    
-    if len(secret_files) > 1:
-        print(f"Warning: Multiple client secret files found. Using: {secret_files[0].name}")
-    
-    return secret_files[0]
+    return CLIENT_SECRETS.path
 
 CLIENT_SECRETS_FILE = get_client_secrets_file()
 FRONTEND_DIR = BASE_DIR / "frontend"
@@ -42,6 +29,133 @@ REDIRECT_URI = 'http://localhost:8000/auth/callback'
 
 # Security
 MAX_EMAIL_LENGTH = 50000
+# /metrics needs "Authorization: Bearer <token>"; it is disabled while unset
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Async Gmail REST client connection pool
+GMAIL_HTTP_MAX_CONNECTIONS = int(os.getenv("GMAIL_HTTP_MAX_CONNECTIONS", "100"))
+GMAIL_HTTP_MAX_KEEPALIVE = int(os.getenv("GMAIL_HTTP_MAX_KEEPALIVE", "20"))
+# Seconds an idle keep-alive connection is kept open
+GMAIL_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("GMAIL_HTTP_KEEPALIVE_EXPIRY", "60"))
+GMAIL_HTTP_TIMEOUT = float(os.getenv("GMAIL_HTTP_TIMEOUT", "30"))  # seconds
+# HTTP/2 is negotiated only when the optional h2 package is installed
+GMAIL_HTTP2_ENABLED = os.getenv("GMAIL_HTTP2_ENABLED", "true").lower() == "true"
+
+# Shared blocking transport for googleapiclient (OAuth userinfo) and token refresh
+# Hosts kept pooled, and keep-alive connections per host
+GOOGLE_HTTP_POOL_CONNECTIONS = int(os.getenv("GOOGLE_HTTP_POOL_CONNECTIONS", "10"))
+GOOGLE_HTTP_POOL_MAXSIZE = int(os.getenv("GOOGLE_HTTP_POOL_MAXSIZE", "20"))
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "30"))  # seconds
+
+# LLM (Groq) clients, shared process-wide per model and parameters
+GROQ_MODEL_NAME = os.getenv("GROQ_MODEL_NAME", "llama-3.3-70b-versatile")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "512"))  # completion tokens per draft
+# Keep-alive connections to the LLM API
+LLM_HTTP_POOL_MAXSIZE = int(os.getenv("LLM_HTTP_POOL_MAXSIZE", "20"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "60"))  # seconds
+# LLM calls in flight per process, and how many of those one user may hold
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_PER_USER = int(os.getenv("LLM_MAX_PER_USER", "2"))
+# Thread tokens per draft prompt
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "6000"))
+# Bytes of cleaned message bodies kept in memory
+CLEAN_HTML_CACHE_MAX_BYTES = int(
+    os.getenv("CLEAN_HTML_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Generated drafts cached by prompt hash (memory LRU in front of the draft_cache table)
+DRAFT_CACHE_ENABLED = os.getenv("DRAFT_CACHE_ENABLED", "true").lower() == "true"
+DRAFT_CACHE_MEMORY_SIZE = int(os.getenv("DRAFT_CACHE_MEMORY_SIZE", "256"))
+DRAFT_CACHE_TTL = int(os.getenv("DRAFT_CACHE_TTL", "86400"))  # seconds
+# Least recently used rows beyond this are evicted
+DRAFT_CACHE_MAX_ROWS = int(os.getenv("DRAFT_CACHE_MAX_ROWS", "10000"))
+
+# Gmail quota limiter (token buckets in quota units per second)
+GMAIL_RATE_LIMIT_ENABLED = (
+    os.getenv("GMAIL_RATE_LIMIT_ENABLED", "true").lower() == "true")
+# Gmail's limits: 250 units per user and 1,200,000 per minute per project
+GMAIL_USER_QUOTA_PER_SECOND = float(os.getenv("GMAIL_USER_QUOTA_PER_SECOND", "250"))
+GMAIL_PROJECT_QUOTA_PER_SECOND = float(
+    os.getenv("GMAIL_PROJECT_QUOTA_PER_SECOND", "20000"))
+
+# Gmail batch executor
+# Calls per batch (Gmail allows up to 100) and batches in flight per call
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "50"))
+GMAIL_BATCH_CONCURRENCY = int(os.getenv("GMAIL_BATCH_CONCURRENCY", "4"))
+GMAIL_BATCH_MAX_RETRIES = int(os.getenv("GMAIL_BATCH_MAX_RETRIES", "3"))
+# Seconds before the first retry, doubled per retry
+GMAIL_BATCH_BACKOFF_BASE = float(os.getenv("GMAIL_BATCH_BACKOFF_BASE", "0.5"))
+
+# Gmail push notifications (users.watch -> Pub/Sub -> /notifications/gmail)
+# Pub/Sub topic, e.g. projects/<project>/topics/<topic>
+GMAIL_PUBSUB_TOPIC = os.getenv("GMAIL_PUBSUB_TOPIC")
+# Required: the webhook rejects every push while it is unset
+PUBSUB_VERIFICATION_TOKEN = os.getenv("PUBSUB_VERIFICATION_TOKEN")
+NOTIFY_COALESCE_SECONDS = float(os.getenv("NOTIFY_COALESCE_SECONDS", "2"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "25"))
+# Inbox poll interval used when no topic is set
+INBOX_FALLBACK_SYNC_SECONDS = float(os.getenv("INBOX_FALLBACK_SYNC_SECONDS", "120"))
+
+# Paginated inbox listing (/email/fetch_latest with page_size / cursor)
+INBOX_PAGE_SIZE = int(os.getenv("INBOX_PAGE_SIZE", "25"))
+# Gmail messages.list returns at most 500
+INBOX_PAGE_SIZE_MAX = int(os.getenv("INBOX_PAGE_SIZE_MAX", "100"))
+# Messages whose metadata is fetched and streamed per step
+INBOX_PAGE_CHUNK = int(os.getenv("INBOX_PAGE_CHUNK", "25"))
+
+# Outbox: /email/send queues replies that background workers save or send
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+# Retry delays in seconds: the base doubles per attempt up to the max
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "1"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "60"))
+# Idle workers re-check the table this often
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+# A RUNNING job is taken over after this many seconds
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+# Seconds an Idempotency-Key is remembered
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+# Quiet period before an autosave uploads, and the longest wait while the user types
+AUTOSAVE_DEBOUNCE_SECONDS = float(os.getenv("AUTOSAVE_DEBOUNCE_SECONDS", "3"))
+AUTOSAVE_MAX_DELAY_SECONDS = float(os.getenv("AUTOSAVE_MAX_DELAY_SECONDS", "30"))
+
+# Bulk save / send: replies per /email/send_bulk request
+BULK_SEND_MAX_ITEMS = int(os.getenv("BULK_SEND_MAX_ITEMS", "100"))
+
+# Parsed thread store (memory + SQL, validated by thread historyId)
+THREAD_STORE_CACHE_SIZE = int(os.getenv("THREAD_STORE_CACHE_SIZE", "512"))
+THREAD_STORE_CACHE_TTL = int(os.getenv("THREAD_STORE_CACHE_TTL", "3600"))  # seconds
+# Seconds a cached thread is trusted without a Gmail call
+THREAD_STORE_REVALIDATE_SECONDS = float(
+    os.getenv("THREAD_STORE_REVALIDATE_SECONDS", "30"))
+# Stored threads not rewritten for this many seconds are pruned
+THREAD_STORE_DB_TTL = int(os.getenv("THREAD_STORE_DB_TTL", "604800"))
+# Most recently saved threads kept per user
+THREAD_STORE_DB_MAX_PER_USER = int(os.getenv("THREAD_STORE_DB_MAX_PER_USER", "500"))
+# Newest messages fetched with full bodies
+THREAD_BODY_MESSAGES = int(os.getenv("THREAD_BODY_MESSAGES", "5"))
+
+# Background prefetch of inbox threads after a sync (opt-in)
+THREAD_PREFETCH_ENABLED = (
+    os.getenv("THREAD_PREFETCH_ENABLED", "false").lower() == "true")
+THREAD_PREFETCH_MAX_THREADS = int(os.getenv("THREAD_PREFETCH_MAX_THREADS", "10"))
+# Prefetch tasks per user
+THREAD_PREFETCH_CONCURRENCY = int(os.getenv("THREAD_PREFETCH_CONCURRENCY", "1"))
+
+# Speculative draft pre-generation for the top unread threads (opt-in)
+SPECULATIVE_DRAFTS_ENABLED = (
+    os.getenv("SPECULATIVE_DRAFTS_ENABLED", "false").lower() == "true")
+SPECULATIVE_DRAFTS_TOP_N = int(os.getenv("SPECULATIVE_DRAFTS_TOP_N", "3"))
+# LLM tokens per user per hour, and generations in flight across all users
+SPECULATIVE_TOKEN_BUDGET_PER_HOUR = int(
+    os.getenv("SPECULATIVE_TOKEN_BUDGET_PER_HOUR", "20000"))
+SPECULATIVE_MAX_CONCURRENCY = int(os.getenv("SPECULATIVE_MAX_CONCURRENCY", "1"))
+
+# OAuth access token store
+GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
+# Tokens are refreshed this many seconds before they expire
+ACCESS_TOKEN_REFRESH_MARGIN = int(os.getenv("ACCESS_TOKEN_REFRESH_MARGIN", "300"))
+ACCESS_TOKEN_DB_TIER = os.getenv("ACCESS_TOKEN_DB_TIER", "false").lower() == "true"
 
 # CORS Origins
 ALLOWED_ORIGINS = [
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, DateTime, Integer, String
+from draftly_v1.model.base import Base
+
+
+class AccessToken(Base):
+    """Short-lived OAuth access tokens shared between worker processes"""
+    __tablename__ = "access_tokens"
+
+    id = Column(Integer, primary_key=True)
+    user_email = Column(String, unique=True, nullable=False, index=True)
+    token = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # naive UTC, as issued by google-auth
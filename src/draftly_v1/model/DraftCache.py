@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, Integer, String, Text
+from datetime import datetime, timezone
+from draftly_v1.model.base import Base
+
+
+class DraftCache(Base):
+    """Generated draft stored under a hash of the prompt, model and temperature"""
+    __tablename__ = "draft_cache"
+
+    id = Column(Integer, primary_key=True)
+    # sha256 hex, see draft_cache.draft_cache_key
+    cache_key = Column(String(64), nullable=False, unique=True)
+    model = Column(String, nullable=False)
+    draft_content = Column(Text, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # size-based eviction
+    last_used_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                          index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
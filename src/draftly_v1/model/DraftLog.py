@@ -14,6 +14,12 @@ class DraftLog(Base):
     draft_content = Column(Text, nullable=False)  # HTML content of the draft
     gmail_draft_id = Column(String)  # Gmail draft ID if saved to Gmail
     thread_context = Column(JSON, nullable=True)  # Store thread context for reference
-    status = Column(String, nullable=False, index=True)  # DRAFT, SENT, DELETED
+    # Subject / Message-ID / References of the message replied to
+    reply_headers = Column(JSON, nullable=True)
+    # DRAFT, SENT, DELETED, SPECULATIVE
+    status = Column(String, nullable=False, index=True)
+    # Gmail thread historyId a SPECULATIVE draft was generated for
+    thread_history_id = Column(String, nullable=True)
+    user_style = Column(String, nullable=True)  # style a SPECULATIVE draft used
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
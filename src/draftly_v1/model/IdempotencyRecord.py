@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, Integer, String, UniqueConstraint
+from datetime import datetime, timezone
+from draftly_v1.model.base import Base
+
+
+class IdempotencyRecord(Base):
+    """Idempotency-Key sent with /email/send and the outbox job it created"""
+    __tablename__ = "idempotency_records"
+    __table_args__ = (UniqueConstraint("user_email", "key",
+                                       name="uq_idempotency_user_key"),)
+
+    id = Column(Integer, primary_key=True)
+    user_email = Column(String, nullable=False, index=True)
+    key = Column(String, nullable=False)
+    # sha256 of the request the key was first used with
+    request_hash = Column(String, nullable=False)
+    job_id = Column(String, nullable=False)  # OutboxJob.job_id with status and result
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
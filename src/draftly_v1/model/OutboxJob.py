@@ -0,0 +1,30 @@
+from sqlalchemy import Boolean, Column, DateTime, Integer, JSON, String, Text
+from datetime import datetime, timezone
+from draftly_v1.model.base import Base
+
+
+class OutboxJob(Base):
+    """A queued reply to save as a Gmail draft or send, processed by the outbox"""
+    __tablename__ = "outbox_jobs"
+
+    id = Column(Integer, primary_key=True)  # also the per-user processing order
+    # public id returned to the client
+    job_id = Column(String, unique=True, nullable=False, index=True)
+    user_email = Column(String, nullable=False, index=True)
+    thread_id = Column(String, nullable=False)
+    recipient_email = Column(String, nullable=False)
+    draft_body = Column(Text, nullable=False)
+    # save a Gmail draft instead of sending
+    draft_only = Column(Boolean, default=False, nullable=False)
+    # QUEUED, RUNNING, RETRY, DONE, FAILED, UNKNOWN
+    status = Column(String, nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                             nullable=False)
+    locked_until = Column(DateTime, nullable=True)  # lease of the worker running it
+    result = Column(JSON, nullable=True)  # draft_id / message_id once DONE
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
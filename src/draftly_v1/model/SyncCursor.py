@@ -0,0 +1,17 @@
+from sqlalchemy import Boolean, Column, DateTime, Integer, JSON, String
+from datetime import datetime, timezone
+from draftly_v1.model.base import Base
+
+
+class SyncCursor(Base):
+    """Per-user Gmail history cursor and the inbox snapshot it describes"""
+    __tablename__ = "sync_cursors"
+
+    id = Column(Integer, primary_key=True)
+    user_email = Column(String, unique=True, nullable=False, index=True)
+    history_id = Column(String, nullable=False)  # Gmail historyId of the snapshot
+    messages = Column(JSON, nullable=False)  # compact unread records, newest first
+    # more unread mail exists beyond the snapshot
+    has_more = Column(Boolean, default=False, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, DateTime, Integer, JSON, String, UniqueConstraint
+from datetime import datetime, timezone
+from draftly_v1.model.base import Base
+
+
+class ThreadCache(Base):
+    """Parsed Gmail thread, valid for as long as the thread's historyId is unchanged"""
+    __tablename__ = "thread_cache"
+    __table_args__ = (UniqueConstraint("user_email", "thread_id",
+                                       name="uq_thread_cache_user_thread"),)
+
+    id = Column(Integer, primary_key=True)
+    user_email = Column(String, nullable=False, index=True)
+    thread_id = Column(String, nullable=False)
+    history_id = Column(String, nullable=False)  # thread historyId of the parsed data
+    messages = Column(JSON, nullable=False)  # parsed messages, oldest first
+    # Subject / Message-ID / References of the latest message
+    reply_headers = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc),
+                        onupdate=lambda: datetime.now(timezone.utc))
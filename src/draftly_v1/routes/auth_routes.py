@@ -1,16 +1,25 @@
 """Authentication and OAuth routes"""
 import logging
-from draftly_v1.services.utils.session_mangement import create_user_session
+from draftly_v1.services.utils.session_mangement import (create_user_session,
+                                                        validate_session)
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import RedirectResponse
-from googleapiclient.discovery import build
+import json
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from google_auth_oauthlib.flow import Flow
-from draftly_v1.services.database import store_user
+from draftly_v1.services.database import store_user, access_token_store
+from draftly_v1.services.google_http import authorized_http, get_http_session
+from draftly_v1.services.prefetch_services import cancel_prefetch
+from draftly_v1.services.speculative_services import speculative_drafter
 from draftly_v1.config import CLIENT_SECRETS_FILE, GMAIL_SCOPES, REDIRECT_URI
 
 _logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
+# Bundled discovery document, parsed once instead of fetched on every login
+OAUTH2_DISCOVERY_DOC = json.loads(get_static_doc('oauth2', 'v2'))
+
 
 @router.get("/me")
 async def get_current_user(request: Request):
@@ -25,6 +34,14 @@ async def get_current_user(request: Request):
 async def logout(request: Request):
     """Logout and clear session"""
     from fastapi.responses import JSONResponse
+    try:
+        # The user_email cookie alone is not proof of identity
+        user_email = await validate_session(request)
+    except HTTPException:
+        user_email = None
+    if user_email:
+        cancel_prefetch(user_email)
+        speculative_drafter.tasks.cancel_user(user_email)
     response = JSONResponse(content={"message": "Logged out successfully"})
     response.delete_cookie("user_email")
     response.delete_cookie("session_token")
@@ -65,10 +82,13 @@ async def auth_callback(request: Request):
             scopes=GMAIL_SCOPES,
             redirect_uri=REDIRECT_URI
         )
+        # Token exchange and userinfo share the pooled Google transport
+        flow.oauth2session.mount("https://", get_http_session().get_adapter("https://"))
         flow.fetch_token(authorization_response=str(request.url))
         
         credentials = flow.credentials
-        user_info_service = build('oauth2', 'v2', credentials=credentials)
+        user_info_service = build_from_document(OAUTH2_DISCOVERY_DOC,
+                                                http=authorized_http(credentials))
         user_info = user_info_service.userinfo().get().execute()
         user_email = user_info.get("email")
         
@@ -77,6 +97,8 @@ async def auth_callback(request: Request):
             refresh_token=credentials.token,
             style_profile=None
         )
+        # Seed the token store so the first Gmail calls skip an OAuth refresh
+        access_token_store.put(user_email, credentials.token, credentials.expiry)
         token = create_user_session(user_email=user_email)
         # Redirect to home without email in URL
         response = RedirectResponse(url='http://localhost:8000/home', status_code=302)
@@ -1,17 +1,31 @@
 """Email management routes"""
 import re
+import asyncio
 import logging
 import time
 from draftly_v1.services.utils.session_mangement import validate_session
 from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import JSONResponse
-from draftly_v1.services.gmail_services import fetch_email_thread_by_id, mark_thread_as_read, fetch_latest_email
-from draftly_v1.services.email_services import  create_gmail_draft, send_gmail_draft
-from draftly_v1.services.llm_services import generate_draft, clean_html_for_llm
-from draftly_v1.services.database import (get_creds_from_db, save_thread_context,
+from fastapi.responses import JSONResponse, StreamingResponse
+from draftly_v1.services.gmail_services import (fetch_email_thread_by_id,
+                                                fetch_latest_email, stream_inbox_page)
+from draftly_v1.services.sync_services import InvalidCursorError
+from draftly_v1.services.speculative_services import speculative_drafter
+from draftly_v1.services.llm_services import (agenerate_draft, stream_draft,
+                                              clean_html_for_llm)
+from draftly_v1.services.database import (save_thread_context,
                                           update_user_preferences, get_user_preferences,
-                                          get_user_by_email, delete_thread_context, get_thread_context)
-from draftly_v1.config import MAX_EMAIL_LENGTH
+                                          get_user_by_email, get_thread_context,
+                                          get_outbox_job)
+from draftly_v1.services.notification_services import inbox_notifier, ensure_inbox_watch
+from draftly_v1.services.outbox_services import (outbox_dispatcher,
+                                                 OUTBOX_FINAL_STATUSES,
+                                                 IdempotencyKeyReuseError)
+from draftly_v1.services.autosave_services import draft_autosaver
+from draftly_v1.services.email_services import deliver_replies_bulk
+from draftly_v1.services.utils.sse import format_sse, SSE_KEEPALIVE
+from draftly_v1.config import (MAX_EMAIL_LENGTH, SSE_KEEPALIVE_SECONDS,
+                              INBOX_FALLBACK_SYNC_SECONDS, INBOX_PAGE_SIZE,
+                              INBOX_PAGE_SIZE_MAX, BULK_SEND_MAX_ITEMS)
 
 _logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/email", tags=["email"])
@@ -28,13 +42,30 @@ def sanitize_draft_content(content: str) -> str:
 async def fetch_unread_email(request: Request):
     
     
-    """Fetch latest unread emails ids from inbox"""
+    """Fetch latest unread emails ids from inbox.
+
+    With ``page_size`` or ``cursor`` in the body the inbox is paged instead:
+    the response streams one compact record per line (NDJSON) and ends with
+    a ``next_cursor`` line to pass back for the following page.
+    """
     _logger.info("Fetch Unread Email Endpoint Hit")
     body = await request.json()
     req_email = await validate_session(request)
     
     if not req_email:
         raise HTTPException(status_code=400, detail="Email is required in the request body.")
+
+    if body.get("page_size") is not None or body.get("cursor"):
+        try:
+            page_size = int(body.get("page_size") or INBOX_PAGE_SIZE)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="page_size must be an integer.")
+        page_size = max(1, min(page_size, INBOX_PAGE_SIZE_MAX))
+        try:
+            lines = await stream_inbox_page(req_email, page_size, body.get("cursor"))
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return StreamingResponse(lines, media_type="application/x-ndjson")
     
     try:
         latest_msgs = await fetch_latest_email(email=req_email)
@@ -47,9 +78,43 @@ async def fetch_unread_email(request: Request):
         raise HTTPException(status_code=500, detail=f"Error fetching emails: {str(e)}")
 
 
+@router.get("/stream")
+async def stream_inbox_updates(request: Request):
+    """Server-Sent Events stream of inbox updates triggered by Gmail push"""
+    user_email = await validate_session(request)
+    push_enabled = await ensure_inbox_watch(user_email)
+    queue = inbox_notifier.subscribe(user_email)
+
+    async def event_stream():
+        last_sync = time.monotonic()
+        try:
+            while not await request.is_disconnected():
+                try:
+                    payload = await asyncio.wait_for(queue.get(),
+                                                     timeout=SSE_KEEPALIVE_SECONDS)
+                    last_sync = time.monotonic()
+                    yield format_sse(payload, event="inbox")
+                except asyncio.TimeoutError:
+                    # Without a Pub/Sub topic, fall back to a cheap server-side
+                    # history sync
+                    since_sync = time.monotonic() - last_sync
+                    if not push_enabled and since_sync >= INBOX_FALLBACK_SYNC_SECONDS:
+                        last_sync = time.monotonic()
+                        inbox_notifier.notify(user_email)
+                    yield SSE_KEEPALIVE
+        finally:
+            inbox_notifier.unsubscribe(user_email, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/regenerate_draft")
 async def regenerate_email_draft(request: Request):
-    """Regenerate email draft with different style"""
+    """Regenerate email draft with different style; ``force_fresh`` skips the cache"""
     _logger.info("Regenerate Email Draft Endpoint Hit")
     body = await request.json()
     user_email = await validate_session(request)
@@ -65,7 +130,11 @@ async def regenerate_email_draft(request: Request):
         # Clean HTML content for LLM
         cleaned_context = clean_html_for_llm(email_context)
         #("Cleaned Context:", cleaned_context)
-        email_draft = generate_draft(email_context=cleaned_context, user_style=user_style, sender_name=body.get("sender_name"))
+        email_draft = await agenerate_draft(email_context=cleaned_context,
+                                            user_style=user_style,
+                                            sender_name=body.get("sender_name"),
+                                            user=user_email,
+                                            force_fresh=bool(body.get("force_fresh")))
         _logger.debug(f"Regenerated draft: {email_draft}")
         save_thread_context(user_email, thread_id,email_context, email_draft)
         return JSONResponse(
@@ -76,6 +145,132 @@ async def regenerate_email_draft(request: Request):
         _logger.error(f"Error in regenerate_email_draft: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error regenerating email draft: {str(e)}")
 
+def _draft_event_stream(request: Request, chunks, save_draft, first_event: dict = None):
+    """
+    Server-Sent Events for a draft being generated: an optional ``context``
+    event, one ``token`` event per chunk, then ``done`` with the final draft
+    after ``save_draft(draft)`` stored it. A disconnected client stops the
+    generation and nothing is saved.
+    """
+    async def event_stream():
+        parts = []
+        try:
+            if first_event is not None:
+                yield format_sse(first_event, event="context")
+            async for text in chunks:
+                if await request.is_disconnected():
+                    _logger.info("Client disconnected, draft generation stopped")
+                    return
+                parts.append(text)
+                yield format_sse({"text": text}, event="token")
+            draft = re.sub(r'[\r\n\t]+', ' ', "".join(parts)).strip()
+            await asyncio.to_thread(save_draft, draft)
+            yield format_sse({"draft": draft}, event="done")
+        except Exception as e:
+            _logger.error(f"Error streaming draft: {str(e)}", exc_info=True)
+            yield format_sse({"detail": "Error generating draft"}, event="error")
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _preferred_style(user_email: str) -> str | None:
+    """
+    The user's saved drafting style, "Professional" when none is saved; None
+    for an unknown user.
+    """
+    user = get_user_by_email(user_email)
+    if not user:
+        return None
+    return get_user_preferences(user.id).get("user_style", "Professional")
+
+
+def _save_preferred_style(user_email: str, user_style: str):
+    user = get_user_by_email(user_email)
+    if user:
+        update_user_preferences(user.id, {"user_style": user_style})
+
+
+async def _single_chunk(text: str):
+    yield text
+
+
+@router.post("/draft/stream")
+async def stream_email_draft(request: Request):
+    """Fetch email thread and stream the AI draft as Server-Sent Events"""
+    _logger.info("Stream Email Draft Endpoint Hit")
+    body = await request.json()
+    req_email = await validate_session(request)
+    tone = body.get("tone")
+    thread_id = body.get("threadId")
+
+    try:
+        if not tone:
+            tone = await asyncio.to_thread(_preferred_style, req_email)
+        thread_context = await fetch_email_thread_by_id(email=req_email,
+                                                        thread_id=thread_id)
+    except Exception as e:
+        _logger.error(f"Error in stream_email_draft: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500,
+                            detail=f"Error fetching email thread: {str(e)}")
+
+    # A draft pre-generated for this exact thread state and tone arrives as a
+    # single chunk
+    speculative_draft = await speculative_drafter.take(
+        req_email, thread_id, thread_context.get("history_id"), tone)
+    if speculative_draft is not None:
+        chunks = _single_chunk(speculative_draft)
+    else:
+        cleaned_context = clean_html_for_llm(thread_context.get("llm_context"))
+        chunks = stream_draft(email_context=cleaned_context, user_style=tone,
+                              sender_name=req_email, user=req_email)
+
+    def save_draft(draft):
+        save_thread_context(user_email=req_email, thread_id=thread_id,
+                            thread_context=thread_context.get("llm_context"),
+                            draft_content=draft,
+                            reply_headers=thread_context.get("reply_headers"),
+                            history_id=thread_context.get("history_id"))
+
+    return _draft_event_stream(request, chunks, save_draft, first_event={
+        "thread_context": thread_context,
+        "speculative": speculative_draft is not None,
+    })
+
+
+@router.post("/regenerate_draft/stream")
+async def stream_regenerated_draft(request: Request):
+    """
+    Regenerate email draft with different style, streamed as Server-Sent
+    Events; ``force_fresh`` skips the draft cache.
+    """
+    _logger.info("Stream Regenerate Email Draft Endpoint Hit")
+    body = await request.json()
+    user_email = await validate_session(request)
+    thread_id = body.get("thread_id")
+    user_style = body.get("user_style")
+    draft_log = await asyncio.to_thread(get_thread_context, user_email, thread_id)
+    if not draft_log:
+        raise HTTPException(status_code=404, detail="No open draft for this thread.")
+    email_context = draft_log.thread_context
+
+    if user_style:
+        await asyncio.to_thread(_save_preferred_style, user_email, user_style)
+
+    chunks = stream_draft(email_context=clean_html_for_llm(email_context),
+                          user_style=user_style,
+                          sender_name=body.get("sender_name"), user=user_email,
+                          force_fresh=bool(body.get("force_fresh")))
+    return _draft_event_stream(
+        request, chunks,
+        lambda draft: save_thread_context(user_email, thread_id, email_context, draft))
+
+
 @router.post("/draft")
 async def fetch_email_thread(request: Request):
     """Fetch email thread and generate AI draft"""
@@ -88,30 +283,39 @@ async def fetch_email_thread(request: Request):
     try:
         # Get user's preferred style if no tone specified
         if not tone:
-            user = get_creds_from_db(req_email)
-            if user:
-                preferences = get_user_preferences(user.id)
-                tone = preferences.get("user_style", "Professional")  # Default to Professional
+            tone = await asyncio.to_thread(_preferred_style, req_email)
         
         thread_context = await fetch_email_thread_by_id(email=req_email, thread_id=thread_id)
         _logger.debug(f"Thread context retrieved: {thread_context}")
         
-        cleaned_context = clean_html_for_llm(thread_context.get("llm_context"))
-        email_draft = generate_draft(
-            email_context=cleaned_context, 
-            user_style=tone,
-            sender_name=req_email
-        )
-        email_draft = re.sub(r'[\r\n\t]+', ' ', email_draft).strip()
-        _logger.info("Email draft generated successfully")
+        # A draft pre-generated for this exact thread state and tone is returned as is
+        email_draft = await speculative_drafter.take(
+            req_email, thread_id, thread_context.get("history_id"), tone)
+        speculative = email_draft is not None
+        if not speculative:
+            cleaned_context = clean_html_for_llm(thread_context.get("llm_context"))
+            email_draft = await agenerate_draft(
+                email_context=cleaned_context, 
+                user_style=tone,
+                sender_name=req_email,
+                user=req_email
+            )
+            email_draft = re.sub(r'[\r\n\t]+', ' ', email_draft).strip()
+        _logger.info("Email draft served from speculative cache" if speculative
+                     else "Email draft generated successfully")
         
         response_content = {
             "draft": email_draft, 
-            "thread_context": thread_context
+            "thread_context": thread_context,
+            "speculative": speculative
         }
         
         # Save thread context to database for future reference
-        save_thread_context(user_email=req_email, thread_id=thread_id, thread_context=thread_context.get("llm_context"), draft_content= email_draft)
+        save_thread_context(user_email=req_email, thread_id=thread_id,
+                            thread_context=thread_context.get("llm_context"),
+                            draft_content=email_draft,
+                            reply_headers=thread_context.get("reply_headers"),
+                            history_id=thread_context.get("history_id"))
         return JSONResponse(content=response_content, headers={"Content-Type": "application/json"})
     except Exception as e:
         _logger.error(f"Error in fetch_email_thread_by_id: {str(e)}", exc_info=True)
@@ -119,77 +323,184 @@ async def fetch_email_thread(request: Request):
     
 @router.post("/send")
 async def send_email(request: Request):
-    """Send or save email draft with automatic retry on failure"""
+    """Queue an email draft to be sent (or saved as a Gmail draft) by the outbox.
+
+    An optional ``Idempotency-Key`` header makes retries safe: a repeated key
+    returns the job of the first request instead of queuing another send.
+    """
     _logger.info("Send Email or Draft Endpoint Hit")
     body = await request.json()
-    await validate_session(request)
-    user_email = body.get("email")
+    user_email = await validate_session(request)
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= 255:
+        raise HTTPException(status_code=400,
+                            detail="Idempotency-Key must be 1-255 characters.")
     recipient_email = body.get("toEmail")
     thread_id = body.get("thread_id")
     draft_only = body.get("draft_only", True)
     draft_body = sanitize_draft_content(body.get("draft_body", ""))
 
-    # Retry configuration
-    max_retries = 3
-    retry_delays = [1, 2, 4]  # Exponential backoff in seconds
-    
-    last_error = None
-    for attempt in range(max_retries):
-        try:
-            if draft_only:
-                draft_response = create_gmail_draft(user_email, recipient_email, thread_id, draft_body)
-                _logger.info(f"Draft saved successfully: {draft_response}")
-                mark_thread_as_read(user_email, thread_id)
-                 # Delete thread context from database after successful send
-                delete_thread_context(user_email, thread_id, draft_response.get('id'))
-                return JSONResponse(content={
-                    "message": "Draft saved successfully", 
-                    "draft_id": draft_response.get("id")
-                })
-            
-            else:
-                response = send_gmail_draft(user_email, recipient_email, thread_id, draft_body)
-                _logger.info(f"Email sent successfully: {response}")
-                mark_thread_as_read(user_email, thread_id)
-                # Delete thread context from database after successful send
-                delete_thread_context(user_email, thread_id, response.get('id'))
-                return JSONResponse(content={
-                    "message": "Email sent successfully", 
-                    "message_id": response.get("id")
-                })
-        except Exception as e:
-            last_error = e
-            error_str = str(e).lower()
-            
-            # Check for specific error types that shouldn't be retried
-            if any(token_error in error_str for token_error in 
-                   ["token_expired", "invalid_grant", "invalid_token", "unauthorized", "401"]):
-                _logger.error(f"Authentication error in send_email (attempt {attempt + 1}): {str(e)}", exc_info=True)
-                raise HTTPException(
-                    status_code=401, 
-                    detail="Your authentication token has expired. Please log in again to continue."
-                )
-            
-            if any(perm_error in error_str for perm_error in 
-                   ["quota", "rate limit", "permission denied", "forbidden", "403"]):
-                _logger.error(f"Permission/quota error in send_email: {str(e)}", exc_info=True)
-                raise HTTPException(
-                    status_code=403, 
-                    detail=f"Unable to send email due to permission or quota restrictions: {str(e)}"
-                )
-            
-            # retry with exponential backoff
-            if attempt < max_retries - 1:
-                retry_delay = retry_delays[attempt]
-                _logger.warning(
-                    f"Attempt {attempt + 1} failed to send email. Retrying in {retry_delay}s. Error: {str(e)}"
-                )
-                time.sleep(retry_delay)
+    if not thread_id or not recipient_email:
+        raise HTTPException(status_code=400,
+                            detail="thread_id and toEmail are required.")
+
+    # An explicit save or send supersedes any autosave still waiting for the thread
+    await draft_autosaver.discard(user_email, thread_id)
+    try:
+        job = await outbox_dispatcher.enqueue(user_email, thread_id, recipient_email,
+                                              draft_body, draft_only,
+                                              idempotency_key=idempotency_key)
+    except IdempotencyKeyReuseError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except RuntimeError as e:
+        _logger.error(f"Error queuing email for {user_email[:6]}XXX: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail="Unable to queue the email right now. Please try again.")
+
+    if job.get("replayed"):
+        # Same key as an earlier request: report that request's job, finished or not
+        return JSONResponse(
+            status_code=200 if job["status"] in OUTBOX_FINAL_STATUSES else 202,
+            content={"message": "Duplicate request", **_job_status(job)},
+            headers={"Idempotent-Replayed": "true"}
+        )
+    return JSONResponse(status_code=202, content={
+        "message": "Draft queued" if draft_only else "Email queued",
+        "job_id": job["job_id"],
+        "status": job["status"],
+    })
+
+
+@router.post("/send_bulk")
+async def send_email_bulk(request: Request):
+    """Save or send many replies in one request.
+
+    Body: ``{"items": [{"thread_id", "toEmail", "draft_body", "draft_only"}, ...]}``.
+    The Gmail calls are grouped into batch requests and the answer carries
+    one status per item, in request order. ``UNKNOWN`` marks a send Gmail
+    did not confirm; check the Sent folder before sending it again.
+    """
+    _logger.info("Bulk Send Email or Draft Endpoint Hit")
+    body = await request.json()
+    user_email = await validate_session(request)
+    raw_items = body.get("items")
+    if not isinstance(raw_items, list) or not raw_items:
+        raise HTTPException(status_code=400, detail="items must be a non-empty list.")
+    if len(raw_items) > BULK_SEND_MAX_ITEMS:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {BULK_SEND_MAX_ITEMS} items per request.")
+
+    items = []
+    for index, raw in enumerate(raw_items):
+        if (not isinstance(raw, dict) or not raw.get("thread_id")
+                or not raw.get("toEmail")):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Item {index}: thread_id and toEmail are required.")
+        items.append({
+            "thread_id": raw["thread_id"],
+            "toEmail": raw["toEmail"],
+            "draft_body": sanitize_draft_content(raw.get("draft_body", "")),
+            "draft_only": raw.get("draft_only", True),
+        })
+    if len({item["thread_id"] for item in items}) != len(items):
+        raise HTTPException(status_code=400,
+                            detail="Each thread_id may appear only once.")
+
+    for item in items:
+        await draft_autosaver.discard(user_email, item["thread_id"])
+    try:
+        results = await deliver_replies_bulk(user_email, items)
+    except HTTPException:
+        raise
+    except Exception as e:
+        _logger.error(f"Error in bulk send for {user_email[:6]}XXX: {str(e)}",
+                      exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail="Unable to process the replies right now. Please try again.")
+
+    delivered = sum(1 for result in results if result["status"] == "DONE")
+    unknown = sum(1 for result in results if result["status"] == "UNKNOWN")
+    return JSONResponse(status_code=200, content={
+        "delivered": delivered,
+        "failed": len(results) - delivered - unknown,
+        "unknown": unknown,
+        "results": results,
+    })
+
+
+@router.post("/autosave")
+async def autosave_draft(request: Request):
+    """
+    Accept editor content; only the latest version within the debounce
+    window is saved to Gmail.
+    """
+    body = await request.json()
+    user_email = await validate_session(request)
+    thread_id = body.get("thread_id")
+    recipient_email = body.get("toEmail")
+    draft_body = sanitize_draft_content(body.get("draft_body", ""))
+    if not thread_id or not recipient_email:
+        raise HTTPException(status_code=400,
+                            detail="thread_id and toEmail are required.")
+
+    draft_autosaver.submit(user_email, thread_id, recipient_email, draft_body)
+    return JSONResponse(status_code=202, content={"status": "pending"})
+
+
+def _job_status(job: dict) -> dict:
+    """Public view of an outbox job"""
+    return {
+        "job_id": job["job_id"],
+        "thread_id": job["thread_id"],
+        "draft_only": job["draft_only"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["last_error"] if job["status"] in ("FAILED", "UNKNOWN") else None,
+    }
+
+
+@router.get("/outbox/{job_id}")
+async def get_outbox_status(job_id: str, request: Request):
+    """Current status of a queued send"""
+    user_email = await validate_session(request)
+    job = await asyncio.to_thread(get_outbox_job, job_id, user_email)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return JSONResponse(content=_job_status(job))
+
+
+@router.get("/outbox/{job_id}/stream")
+async def stream_outbox_status(job_id: str, request: Request):
+    """Server-Sent Events stream of a queued send's status until it is final"""
+    user_email = await validate_session(request)
+    job = await asyncio.to_thread(get_outbox_job, job_id, user_email)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def event_stream():
+        current, last_sent = job, None
+        while not await request.is_disconnected():
+            status = _job_status(current)
+            if status != last_sent:
+                last_sent = status
+                yield format_sse(status, event="job")
             else:
-                _logger.error(f"All {max_retries} attempts failed to send email: {str(e)}", exc_info=True)
-    
-    raise HTTPException(
-        status_code=500, 
-        detail=f"Failed to send email after {max_retries} attempts. Please try again later. Last error: {str(last_error)}"
+                yield SSE_KEEPALIVE
+            if status["status"] in OUTBOX_FINAL_STATUSES:
+                break
+            # Workers in this process signal changes; the timeout covers
+            # workers in other processes
+            await outbox_dispatcher.wait_for_update(SSE_KEEPALIVE_SECONDS)
+            current = (await asyncio.to_thread(get_outbox_job, job_id, user_email)
+                       or current)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
@@ -0,0 +1,39 @@
+"""Gmail push notification webhook"""
+import logging
+import secrets
+from fastapi import APIRouter, Request, HTTPException, Response
+from draftly_v1.services.notification_services import (decode_push_notification,
+                                                       inbox_notifier)
+from draftly_v1.config import PUBSUB_VERIFICATION_TOKEN
+
+_logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/notifications", tags=["notifications"])
+
+
+@router.post("/gmail")
+async def gmail_push_notification(request: Request):
+    """
+    Receive Gmail watch notifications pushed by Pub/Sub (``?token=`` must
+    match PUBSUB_VERIFICATION_TOKEN)
+    """
+    if not PUBSUB_VERIFICATION_TOKEN:
+        # Without a shared secret anyone could trigger syncs for any user
+        _logger.warning("Rejected push notification: "
+                        "PUBSUB_VERIFICATION_TOKEN is not set")
+        raise HTTPException(status_code=403,
+                            detail="Push notifications are not configured")
+    if not secrets.compare_digest(request.query_params.get("token", ""),
+                                  PUBSUB_VERIFICATION_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid verification token")
+
+    try:
+        envelope = await request.json()
+        email, history_id = decode_push_notification(envelope)
+    except ValueError as e:
+        _logger.warning(f"Rejected push notification: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+    _logger.info(f"Push notification for {email[:6]}XXX at history {history_id}")
+    inbox_notifier.notify(email, history_id)
+    # Any 2xx acknowledges the message so Pub/Sub does not redeliver it
+    return Response(status_code=204)
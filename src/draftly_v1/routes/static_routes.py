@@ -1,7 +1,9 @@
 """Static file serving routes"""
-from fastapi import APIRouter
+import secrets
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import FileResponse
-from draftly_v1.config import FRONTEND_DIR
+from draftly_v1.config import FRONTEND_DIR, METRICS_TOKEN
+from draftly_v1.services.utils.metrics import collect_metrics
 
 router = APIRouter(tags=["static"])
 
@@ -15,6 +17,17 @@ async def health():
     }
 
 
+@router.get("/metrics")
+async def metrics(request: Request):
+    """Expose cache and client counters for monitoring (METRICS_TOKEN bearer auth)"""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(request.headers.get("Authorization", ""),
+                                  f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return collect_metrics()
+
+
 @router.get("/login")
 async def read_login():
     """Serve login page"""
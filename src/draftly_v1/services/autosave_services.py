@@ -0,0 +1,144 @@
+"""Server-side debounce of editor autosaves into Gmail draft saves"""
+import asyncio
+import logging
+import time
+from draftly_v1.config import AUTOSAVE_DEBOUNCE_SECONDS, AUTOSAVE_MAX_DELAY_SECONDS
+from draftly_v1.services.database import get_open_drafts
+from draftly_v1.services.outbox_services import outbox_dispatcher
+from draftly_v1.services.utils.logger_config import setup_logging
+from draftly_v1.services.utils.metrics import register_metrics
+
+setup_logging(logging.INFO)
+_logger = logging.getLogger(__name__)
+
+
+async def queue_draft_save(email: str, thread_id: str, recipient_email: str,
+                           draft_body: str):
+    """
+    Save the draft through the outbox, which updates the thread's Gmail draft
+    in place. Nothing is saved once the thread's draft is closed: the reply
+    was sent and a new Gmail draft would be left behind.
+    """
+    if not await asyncio.to_thread(get_open_drafts, email, [thread_id]):
+        _logger.info(f"Draft of thread {thread_id} is no longer open, autosave skipped")
+        return
+    await outbox_dispatcher.enqueue(email, thread_id, recipient_email, draft_body, True)
+
+
+class DraftAutosaver:
+    """
+    Coalesce autosaves per ``(email, thread_id)`` so only the latest version
+    is uploaded.
+
+    A draft is saved once no newer autosave arrived for ``debounce_seconds``,
+    or ``max_delay`` seconds after its first pending edit while the user keeps
+    typing. Pending drafts are flushed on shutdown.
+
+    Args:
+        debounce_seconds (float): quiet period before a draft is saved
+        max_delay (float): longest a pending draft waits
+        save_fn (callable): ``async (email, thread_id, recipient_email,
+            draft_body) -> None``
+    """
+
+    def __init__(self, debounce_seconds: float = 3, max_delay: float = 30,
+                 save_fn=None):
+        self.debounce_seconds = debounce_seconds
+        self.max_delay = max_delay
+        self._save = save_fn or queue_draft_save
+        self._pending = {}  # (email, thread_id) -> latest autosave
+        self._timers = {}  # (email, thread_id) -> flush task
+        self._saving = {}  # (email, thread_id) -> save in progress
+        self.received = 0
+        self.saved = 0
+        self.coalesced = 0
+
+    def submit(self, email: str, thread_id: str, recipient_email: str, draft_body: str):
+        """Record the latest editor content; it is saved after the debounce window."""
+        key = (email, thread_id)
+        now = time.monotonic()
+        previous = self._pending.get(key)
+        if previous is not None:
+            self.coalesced += 1
+        self._pending[key] = {
+            "recipient_email": recipient_email,
+            "draft_body": draft_body,
+            "updated_at": now,
+            "first_at": previous["first_at"] if previous else now,
+        }
+        self.received += 1
+        if key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+    async def discard(self, email: str, thread_id: str) -> bool:
+        """
+        Drop a pending autosave (e.g. because the reply is being sent).
+
+        A save already in progress for the thread is awaited, so it is queued
+        before whatever the caller does next instead of landing after it.
+
+        Returns:
+            bool: True if a pending autosave was dropped
+        """
+        key = (email, thread_id)
+        dropped = self._pending.pop(key, None) is not None
+        saving = self._saving.get(key)
+        if saving is not None:
+            await asyncio.wait([saving])
+        return dropped
+
+    async def _flush_later(self, key: tuple):
+        try:
+            while key in self._pending:
+                pending = self._pending[key]
+                due = min(pending["updated_at"] + self.debounce_seconds,
+                          pending["first_at"] + self.max_delay)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                await self._flush(key)
+        finally:
+            self._timers.pop(key, None)
+
+    async def _flush(self, key: tuple):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        email, thread_id = key
+        saving = asyncio.ensure_future(self._save(
+            email, thread_id, pending["recipient_email"], pending["draft_body"]))
+        self._saving[key] = saving
+        try:
+            await saving
+            self.saved += 1
+        except Exception as e:
+            _logger.error(f"Autosave failed for {email[:6]}XXX thread {thread_id}: "
+                          f"{str(e)}")
+        finally:
+            if self._saving.get(key) is saving:
+                del self._saving[key]
+
+    async def shutdown(self):
+        """Stop the timers and save whatever is still pending."""
+        timers = list(self._timers.values())
+        for task in timers:
+            task.cancel()
+        await asyncio.gather(*timers, return_exceptions=True)
+        for key in list(self._pending):
+            await self._flush(key)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "received": self.received,
+            "saved": self.saved,
+            "coalesced": self.coalesced,
+        }
+
+
+draft_autosaver = DraftAutosaver(
+    debounce_seconds=AUTOSAVE_DEBOUNCE_SECONDS,
+    max_delay=AUTOSAVE_MAX_DELAY_SECONDS,
+)
+register_metrics("draft_autosave", draft_autosaver.stats)
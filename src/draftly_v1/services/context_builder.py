@@ -0,0 +1,177 @@
+"""Thread context for the draft prompt, fitted to a token budget"""
+import logging
+import re
+from dataclasses import dataclass
+from draftly_v1.config import LLM_CONTEXT_TOKEN_BUDGET
+from draftly_v1.services.utils.metrics import register_metrics
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # estimate used when tiktoken is not installed
+FIRST_PARAGRAPH_MAX_CHARS = 400
+_PARAGRAPH_BREAK = re.compile(r'</p\s*>|</div\s*>|<br\s*/?>\s*<br\s*/?>|\n\s*\n',
+                              re.IGNORECASE)
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                _logger.warning(f"tiktoken encoding unavailable, estimating token "
+                                f"counts: {str(e)}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in ``text``: tiktoken's cl100k_base, else about 4 characters each."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def first_paragraph(body: str, clean) -> str:
+    """First non-empty paragraph of an HTML or plain-text body, cleaned and capped."""
+    for piece in _PARAGRAPH_BREAK.split(body or ""):
+        text = clean(piece)
+        if text:
+            if len(text) > FIRST_PARAGRAPH_MAX_CHARS:
+                text = text[:FIRST_PARAGRAPH_MAX_CHARS].rsplit(" ", 1)[0] + " ..."
+            return text
+    return ""
+
+
+@dataclass
+class ContextReport:
+    """Token accounting for one built context"""
+    tokens: int
+    full_tokens: int
+    shortened: int = 0
+    dropped: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.full_tokens - self.tokens
+
+
+class ContextBuilder:
+    """
+    Render a thread for the draft prompt within ``budget`` tokens.
+
+    The latest email is always kept in full. If the whole thread does not
+    fit, older emails are shortened to their headers and first paragraph,
+    oldest first, and if that is still too much they are dropped, oldest
+    first, leaving a note of how many were omitted.
+
+    Args:
+        budget (int): tokens allowed for the rendered thread
+    """
+
+    def __init__(self, budget: int = 6000):
+        self.budget = budget
+        self.requests = 0
+        self.trimmed_requests = 0
+        self.tokens_saved = 0
+        self.shortened = 0
+        self.dropped = 0
+
+    def build(self, messages: list, render_message, clean,
+              record: bool = True) -> tuple:
+        """
+        Args:
+            messages (list): message dicts, latest first (as in ``llm_context``)
+            render_message (callable): ``(msg, body) -> str`` for one email
+            clean (callable): HTML to plain text
+            record (bool): count this build in ``stats`` (False for estimates)
+
+        Returns:
+            tuple: (context text, ContextReport)
+        """
+        latest, older = messages[0], messages[1:]
+        latest_text = render_message(latest, clean(latest.get('body', '')))
+        rendered = [render_message(msg, clean(msg.get('body', ''))) for msg in older]
+        full_tokens = count_tokens(self._assemble(rendered, 0, latest_text))
+
+        # Per-email costs decide what to trim; the final text is counted exactly
+        costs = [count_tokens(text) for text in rendered]
+        remaining = (self.budget - count_tokens(self._assemble([], 0, latest_text))
+                     - count_tokens(self._header()))
+        shortened = set()
+        # The oldest email is last: shorten from that end first, then drop from it
+        for index in reversed(range(len(rendered))):
+            if sum(costs) <= remaining:
+                break
+            short = render_message(older[index],
+                                   first_paragraph(older[index].get('body', ''), clean))
+            short_cost = count_tokens(short)
+            if short_cost < costs[index]:
+                rendered[index], costs[index] = short, short_cost
+                shortened.add(index)
+        dropped = 0
+        while rendered and sum(costs) > remaining:
+            rendered.pop()
+            costs.pop()
+            shortened.discard(len(rendered))
+            dropped += 1
+
+        text = self._assemble(rendered, dropped, latest_text)
+        report = ContextReport(tokens=count_tokens(text), full_tokens=full_tokens,
+                               shortened=len(shortened), dropped=dropped)
+        if record:
+            self._record(report)
+        return text, report
+
+    def _assemble(self, rendered: list, dropped: int, latest_text: str) -> str:
+        text = ""
+        if rendered or dropped:
+            text = self._header()
+            for idx, body in enumerate(rendered):
+                text += f"Email #{idx + 1}:\n{body}\n"
+            if dropped:
+                plural = 's' if dropped > 1 else ''
+                text += f"({dropped} earlier email{plural} omitted)\n\n"
+        return text + "=== LATEST EMAIL (Reply to this) ===\n\n" + latest_text
+
+    @staticmethod
+    def _header() -> str:
+        return "=== PREVIOUS EMAIL THREAD (for context only) ===\n\n"
+
+    def _record(self, report: ContextReport):
+        self.requests += 1
+        if report.shortened or report.dropped:
+            self.trimmed_requests += 1
+            self.tokens_saved += max(0, report.tokens_saved)
+            self.shortened += report.shortened
+            self.dropped += report.dropped
+            _logger.info(f"Thread context trimmed to {report.tokens} tokens "
+                         f"({report.tokens_saved} saved, {report.shortened} shortened, "
+                         f"{report.dropped} dropped)")
+
+    def stats(self) -> dict:
+        return {
+            "budget": self.budget,
+            "tokenizer": "tiktoken" if _get_encoding() is not None else "estimate",
+            "requests": self.requests,
+            "trimmed_requests": self.trimmed_requests,
+            "tokens_saved": self.tokens_saved,
+            "shortened": self.shortened,
+            "dropped": self.dropped,
+        }
+
+
+context_builder = ContextBuilder(budget=LLM_CONTEXT_TOKEN_BUDGET)
+register_metrics("llm_context", context_builder.stats)
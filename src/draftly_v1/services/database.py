@@ -1,14 +1,26 @@
-import json
 import os
 import logging
-from sqlalchemy import create_engine
-from datetime import datetime, timezone
+import uuid
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import sessionmaker, Session
-from pathlib import Path
 from draftly_v1.model.base import Base
 from draftly_v1.model.User import User
 from draftly_v1.model.UserSession import UserSession
 from draftly_v1.model.DraftLog import DraftLog
+from draftly_v1.model.AccessToken import AccessToken
+from draftly_v1.model.SyncCursor import SyncCursor
+from draftly_v1.model.ThreadCache import ThreadCache
+from draftly_v1.model.OutboxJob import OutboxJob
+from draftly_v1.model.IdempotencyRecord import IdempotencyRecord
+from draftly_v1.model.DraftCache import DraftCache
+from draftly_v1.services.token_store import TokenStore, refresh_access_token
+from draftly_v1.services.utils.metrics import register_metrics
+from draftly_v1.config import (CLIENT_SECRETS, GOOGLE_TOKEN_URI,
+                               ACCESS_TOKEN_REFRESH_MARGIN, ACCESS_TOKEN_DB_TIER,
+                               OUTBOX_LEASE_SECONDS, THREAD_STORE_DB_TTL,
+                               THREAD_STORE_DB_MAX_PER_USER)
 
 _logger = logging.getLogger(__name__)
 
@@ -23,6 +35,45 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base.metadata.create_all(bind=engine)
 
+
+def add_missing_columns(bind=engine) -> list:
+    """
+    Add mapped columns that an existing table does not have yet.
+
+    ``create_all`` only creates missing tables, so a database created before
+    a column was added to its model keeps the old table. Safe to run on
+    every start: columns already present are left alone. New columns must be
+    nullable or have a server default to be added this way.
+
+    Returns:
+        list: "table.column" names that were added
+    """
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            present = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in present:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    _logger.warning(f"Cannot add NOT NULL column "
+                                    f"{table.name}.{column.name} without a default")
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} '
+                                  f'ADD COLUMN {column.name} {column_type}'))
+                added.append(f"{table.name}.{column.name}")
+    if added:
+        _logger.info(f"Added columns to existing tables: {', '.join(added)}")
+    return added
+
+
+add_missing_columns()
+
 def get_db_session() -> Session:
     """Get a database session"""
     
@@ -32,6 +83,42 @@ def get_db_session() -> Session:
     finally:
         pass  # Session will be closed by caller
 
+def load_access_token(email: str):
+    """Load a persisted access token as ``(token, expiry)``, or None."""
+    db = get_db_session()
+    try:
+        row = db.query(AccessToken).filter(AccessToken.user_email == email).first()
+        return (row.token, row.expires_at) if row else None
+    finally:
+        db.close()
+
+
+def save_access_token(email: str, token: str, expiry: datetime) -> None:
+    """Persist an access token so other workers can reuse it until expiry."""
+    db = get_db_session()
+    try:
+        row = db.query(AccessToken).filter(AccessToken.user_email == email).first()
+        if row:
+            row.token = token
+            row.expires_at = expiry
+        else:
+            db.add(AccessToken(user_email=email, token=token, expires_at=expiry))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+access_token_store = TokenStore(
+    refresh_margin=ACCESS_TOKEN_REFRESH_MARGIN,
+    db_loader=load_access_token if ACCESS_TOKEN_DB_TIER else None,
+    db_saver=save_access_token if ACCESS_TOKEN_DB_TIER else None,
+)
+register_metrics("access_token_store", access_token_store.stats)
+
+
 def get_user_by_email(email: str) -> User | None:
     """
     Retrieve user from the database by email.
@@ -56,12 +143,15 @@ def get_creds_from_db(email: str,) -> dict:
     
     """
     Retrieve user credentials from the database and return in format for Google OAuth Credentials.
+    The access token comes from ``access_token_store`` and is refreshed (once per user
+    at a time) shortly before it expires.
     
     Args:
         user_id (int): The user's ID in the database
         
     Returns:
-        dict: Credentials dictionary with token, refresh_token, token_uri, client_id, client_secret, scopes
+        dict: Credentials dictionary with token, expiry, refresh_token,
+            token_uri, client_id, client_secret, scopes
         
     Raises:
         ValueError: If user is not found in database
@@ -73,36 +163,13 @@ def get_creds_from_db(email: str,) -> dict:
         if not user:
             raise ValueError(f"User with email {email} not found in database")
         
-        # Get client secrets from the JSON file
-        BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
-        CLIENT_SECRETS_FILE = BASE_DIR / "resources" / "client_secret.json"
-        
-        if not CLIENT_SECRETS_FILE.exists():
-            raise FileNotFoundError(f"Client secrets file not found at: {CLIENT_SECRETS_FILE}")
-        
-        with open(CLIENT_SECRETS_FILE, 'r') as f:
-            client_secrets = json.load(f)
-        
-        # Extract client_id and client_secret from the JSON structure
-        if "web" in client_secrets:
-            client_id = client_secrets["web"]["client_id"]
-            client_secret = client_secrets["web"]["client_secret"]
-        elif "installed" in client_secrets:
-            client_id = client_secrets["installed"]["client_id"]
-            client_secret = client_secrets["installed"]["client_secret"]
-        else:
-            # Fallback: assume top-level keys
-            client_id = client_secrets.get("client_id")
-            client_secret = client_secrets.get("client_secret")
-        
-        if not client_id or not client_secret:
-            raise ValueError("Could not extract client_id and client_secret from secrets file")
+        client_id, client_secret = CLIENT_SECRETS.get_client_credentials()
         
         # Return credentials in the format expected by google.oauth2.credentials.Credentials
         creds_dict = {
-            "token": None,  # Access token will be refreshed automatically
+            "token": None,
             "refresh_token": user.refresh_token,
-            "token_uri": "https://oauth2.googleapis.com/token",
+            "token_uri": GOOGLE_TOKEN_URI,
             "client_id": client_id,
             "client_secret": client_secret,
             "scopes": [
@@ -111,6 +178,11 @@ def get_creds_from_db(email: str,) -> dict:
             ]
         }
         
+        token, expiry = access_token_store.get_or_refresh(
+            email, lambda: refresh_access_token(creds_dict)
+        )
+        creds_dict["token"] = token
+        creds_dict["expiry"] = expiry
         return creds_dict
         
     except Exception as e:
@@ -184,8 +256,13 @@ def get_user_preferences(user_id: int) -> dict:
         session.close()
 
 
-def save_thread_context(user_email: str, thread_id: str, thread_context: list, draft_content: str = None) -> bool:
-    """Save email thread context to database for future reference."""
+def save_thread_context(user_email: str, thread_id: str, thread_context: list,
+                        draft_content: str = None, reply_headers: dict = None,
+                        history_id: str = None) -> bool:
+    """
+    Save email thread context (and the reply headers and thread historyId,
+    when known) to database for future reference.
+    """
     session = get_db_session()
     try:
         user = session.query(User).filter(User.email == user_email).first()
@@ -224,6 +301,10 @@ def save_thread_context(user_email: str, thread_id: str, thread_context: list, d
                 draft.subject = subject
             draft.last_updated_at = datetime.now(timezone.utc)
             draft.draft_content = draft_content if draft_content else ""
+            if reply_headers:
+                draft.reply_headers = reply_headers
+            if history_id:
+                draft.thread_history_id = str(history_id)
         else:
             # Create new draft log entry with thread context
             draft = DraftLog(
@@ -233,6 +314,8 @@ def save_thread_context(user_email: str, thread_id: str, thread_context: list, d
                 subject=subject,
                 draft_content= draft_content if draft_content else "",
                 thread_context=thread_context,
+                reply_headers=reply_headers,
+                thread_history_id=str(history_id) if history_id else None,
                 status='DRAFT'
             )
             session.add(draft)
@@ -307,3 +390,649 @@ def get_thread_context(user_email: str, thread_id: str) -> list:
         return []
     finally:
         session.close()
+
+
+def get_draft_reply_headers(user_email: str, thread_id: str) -> dict | None:
+    """Reply headers stored with the open draft of a thread, or None."""
+    session = get_db_session()
+    try:
+        draft = session.query(DraftLog).join(User, DraftLog.user_id == User.id).filter(
+            User.email == user_email,
+            DraftLog.thread_id == thread_id,
+            DraftLog.status == 'DRAFT'
+        ).first()
+        return draft.reply_headers if draft and draft.reply_headers else None
+    except Exception as e:
+        _logger.error(f"Error retrieving reply headers: {str(e)}")
+        return None
+    finally:
+        session.close()
+
+
+def get_gmail_draft_id(user_email: str, thread_id: str) -> str | None:
+    """Id of the Gmail draft already saved for the open draft of a thread, or None."""
+    session = get_db_session()
+    try:
+        draft = session.query(DraftLog).join(User, DraftLog.user_id == User.id).filter(
+            User.email == user_email,
+            DraftLog.thread_id == thread_id,
+            DraftLog.status == 'DRAFT'
+        ).first()
+        return draft.gmail_draft_id if draft else None
+    except Exception as e:
+        _logger.error(f"Error retrieving Gmail draft id: {str(e)}")
+        return None
+    finally:
+        session.close()
+
+
+def save_gmail_draft_id(user_email: str, thread_id: str, gmail_draft_id: str,
+                        draft_content: str = None) -> bool:
+    """
+    Remember the Gmail draft holding a thread's open draft so later saves
+    update it in place.
+    """
+    session = get_db_session()
+    try:
+        draft = session.query(DraftLog).join(User, DraftLog.user_id == User.id).filter(
+            User.email == user_email,
+            DraftLog.thread_id == thread_id,
+            DraftLog.status == 'DRAFT'
+        ).first()
+        if not draft:
+            return False
+        draft.gmail_draft_id = gmail_draft_id
+        if draft_content is not None:
+            draft.draft_content = draft_content
+        session.commit()
+        return True
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error saving Gmail draft id: {str(e)}")
+        return False
+    finally:
+        session.close()
+
+
+def get_open_drafts(user_email: str, thread_ids: list) -> dict:
+    """Gmail draft id and reply headers of several open drafts, in one query."""
+    if not thread_ids:
+        return {}
+    session = get_db_session()
+    try:
+        drafts = session.query(DraftLog).join(User, DraftLog.user_id == User.id).filter(
+            User.email == user_email,
+            DraftLog.thread_id.in_(thread_ids),
+            DraftLog.status == 'DRAFT'
+        ).all()
+        return {draft.thread_id: {"gmail_draft_id": draft.gmail_draft_id,
+                                  "reply_headers": draft.reply_headers}
+                for draft in drafts}
+    except Exception as e:
+        _logger.error(f"Error retrieving open drafts: {str(e)}")
+        return {}
+    finally:
+        session.close()
+
+
+def save_bulk_reply_results(user_email: str, results: list) -> int:
+    """
+    Record the outcome of several delivered replies in one transaction.
+
+    Each result is ``{"thread_id", "draft_only", "gmail_id", "draft_content"}``:
+    a sent reply closes the thread's open draft like ``delete_thread_context``;
+    a saved draft keeps it open with the Gmail draft id like ``save_gmail_draft_id``.
+
+    Returns:
+        int: number of draft rows updated (0 if the transaction failed)
+    """
+    if not results:
+        return 0
+    session = get_db_session()
+    try:
+        drafts = {draft.thread_id: draft for draft in session.query(DraftLog).join(
+            User, DraftLog.user_id == User.id).filter(
+            User.email == user_email,
+            DraftLog.thread_id.in_([result["thread_id"] for result in results]),
+            DraftLog.status == 'DRAFT'
+        ).all()}
+        now = datetime.now(timezone.utc)
+        updated = 0
+        for result in results:
+            draft = drafts.get(result["thread_id"])
+            if draft is None:
+                continue
+            draft.gmail_draft_id = result["gmail_id"]
+            if result["draft_only"]:
+                if result.get("draft_content") is not None:
+                    draft.draft_content = result["draft_content"]
+            else:
+                draft.thread_context = None
+                draft.status = 'SENT'
+                draft.last_updated_at = now
+            updated += 1
+        session.commit()
+        return updated
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error saving bulk reply results: {str(e)}")
+        return 0
+    finally:
+        session.close()
+
+
+def save_speculative_draft(user_email: str, thread_id: str, history_id: str,
+                           user_style: str, thread_context: list,
+                           draft_content: str) -> bool:
+    """Store (or replace) a pre-generated draft for a thread."""
+    session = get_db_session()
+    try:
+        user = session.query(User).filter(User.email == user_email).first()
+        if not user:
+            _logger.error(f"User not found: {user_email[:6]}XXX")
+            return False
+
+        draft = session.query(DraftLog).filter(
+            DraftLog.user_id == user.id,
+            DraftLog.thread_id == thread_id,
+            DraftLog.status == 'SPECULATIVE'
+        ).first()
+        latest = thread_context[0] if thread_context else {}
+        if not draft:
+            draft = DraftLog(user_id=user.id, thread_id=thread_id, status='SPECULATIVE')
+            session.add(draft)
+        draft.recipient_email = latest.get("from", "")
+        draft.subject = latest.get("subject", "")
+        draft.draft_content = draft_content
+        draft.thread_context = thread_context
+        draft.thread_history_id = str(history_id)
+        draft.user_style = user_style
+        session.commit()
+        _logger.info(f"Speculative draft saved for thread {thread_id}")
+        return True
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error saving speculative draft: {str(e)}")
+        return False
+    finally:
+        session.close()
+
+
+def get_drafted_history_ids(user_email: str) -> dict:
+    """
+    Map thread_id -> set of historyIds the user's open drafts were made for.
+
+    Covers stored speculative drafts and drafts the user already opened, so
+    neither is generated again while the thread is unchanged.
+    """
+    session = get_db_session()
+    try:
+        rows = session.query(DraftLog.thread_id, DraftLog.thread_history_id).join(
+            User, User.id == DraftLog.user_id
+        ).filter(
+            User.email == user_email,
+            DraftLog.status.in_(('SPECULATIVE', 'DRAFT')),
+            DraftLog.thread_history_id.isnot(None)
+        ).all()
+        drafted = {}
+        for thread_id, history_id in rows:
+            drafted.setdefault(thread_id, set()).add(history_id)
+        return drafted
+    except Exception as e:
+        _logger.error(f"Error retrieving drafted threads: {str(e)}")
+        return {}
+    finally:
+        session.close()
+
+
+def take_speculative_draft(user_email: str, thread_id: str) -> dict | None:
+    """Remove and return the speculative draft for a thread, or None."""
+    session = get_db_session()
+    try:
+        user = session.query(User).filter(User.email == user_email).first()
+        if not user:
+            return None
+        draft = session.query(DraftLog).filter(
+            DraftLog.user_id == user.id,
+            DraftLog.thread_id == thread_id,
+            DraftLog.status == 'SPECULATIVE'
+        ).first()
+        if not draft:
+            return None
+        result = {
+            "draft_content": draft.draft_content,
+            "history_id": draft.thread_history_id,
+            "user_style": draft.user_style,
+        }
+        # A speculative draft is used at most once; the regular DRAFT row takes over
+        session.delete(draft)
+        session.commit()
+        return result
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error retrieving speculative draft: {str(e)}")
+        return None
+    finally:
+        session.close()
+
+
+def get_sync_cursor(user_email: str) -> dict | None:
+    """Get the stored inbox sync cursor for a user."""
+    session = get_db_session()
+    try:
+        cursor = session.query(SyncCursor).filter(
+            SyncCursor.user_email == user_email).first()
+        if not cursor:
+            return None
+        return {
+            "history_id": cursor.history_id,
+            "messages": cursor.messages or [],
+            "has_more": cursor.has_more,
+        }
+    except Exception as e:
+        _logger.error(f"Error retrieving sync cursor: {str(e)}")
+        return None
+    finally:
+        session.close()
+
+
+def save_sync_cursor(user_email: str, history_id: str, messages: list,
+                     has_more: bool = False) -> bool:
+    """Create or update the inbox sync cursor for a user."""
+    session = get_db_session()
+    try:
+        cursor = session.query(SyncCursor).filter(
+            SyncCursor.user_email == user_email).first()
+        if cursor:
+            cursor.history_id = str(history_id)
+            cursor.messages = messages
+            cursor.has_more = has_more
+        else:
+            session.add(SyncCursor(
+                user_email=user_email,
+                history_id=str(history_id),
+                messages=messages,
+                has_more=has_more
+            ))
+        session.commit()
+        return True
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error saving sync cursor: {str(e)}")
+        return False
+    finally:
+        session.close()
+
+
+def delete_sync_cursor(user_email: str) -> bool:
+    """Remove a user's sync cursor, forcing the next sync to be a full one."""
+    session = get_db_session()
+    try:
+        deleted = session.query(SyncCursor).filter(
+            SyncCursor.user_email == user_email).delete()
+        session.commit()
+        return bool(deleted)
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error deleting sync cursor: {str(e)}")
+        return False
+    finally:
+        session.close()
+
+
+def get_cached_thread(user_email: str, thread_id: str) -> dict | None:
+    """Get the stored parsed thread for a user, or None."""
+    session = get_db_session()
+    try:
+        row = session.query(ThreadCache).filter(
+            ThreadCache.user_email == user_email,
+            ThreadCache.thread_id == thread_id
+        ).first()
+        if not row:
+            return None
+        return {
+            "thread_id": row.thread_id,
+            "history_id": row.history_id,
+            "messages": row.messages or [],
+            "reply_headers": row.reply_headers or {},
+        }
+    except Exception as e:
+        _logger.error(f"Error retrieving cached thread: {str(e)}")
+        return None
+    finally:
+        session.close()
+
+
+def save_cached_thread(user_email: str, thread_id: str, history_id: str,
+                       messages: list, reply_headers: dict,
+                       max_age: float = THREAD_STORE_DB_TTL,
+                       max_rows_per_user: int = THREAD_STORE_DB_MAX_PER_USER) -> bool:
+    """
+    Create or update the stored parsed thread for a user, then drop the
+    user's threads not saved for ``max_age`` seconds and the least recently
+    saved ones beyond ``max_rows_per_user``.
+    """
+    session = get_db_session()
+    try:
+        now = datetime.now(timezone.utc)
+        row = session.query(ThreadCache).filter(
+            ThreadCache.user_email == user_email,
+            ThreadCache.thread_id == thread_id
+        ).first()
+        if row:
+            row.history_id = str(history_id)
+            row.messages = messages
+            row.reply_headers = reply_headers
+            row.updated_at = now
+        else:
+            session.add(ThreadCache(
+                user_email=user_email,
+                thread_id=thread_id,
+                history_id=str(history_id),
+                messages=messages,
+                reply_headers=reply_headers,
+                updated_at=now
+            ))
+        session.flush()
+
+        session.query(ThreadCache).filter(
+            ThreadCache.user_email == user_email,
+            ThreadCache.updated_at < now - timedelta(seconds=max_age)
+        ).delete(synchronize_session=False)
+        stale_ids = [stale_id for (stale_id,) in session.query(ThreadCache.id).filter(
+            ThreadCache.user_email == user_email
+        ).order_by(ThreadCache.updated_at.desc(), ThreadCache.id.desc()
+                   ).offset(max_rows_per_user)]
+        if stale_ids:
+            session.query(ThreadCache).filter(ThreadCache.id.in_(stale_ids)).delete(
+                synchronize_session=False)
+        session.commit()
+        return True
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error saving cached thread: {str(e)}")
+        return False
+    finally:
+        session.close()
+
+
+def get_cached_draft(cache_key: str) -> str | None:
+    """Draft stored under ``cache_key`` unless expired; a hit refreshes its last use."""
+    session = get_db_session()
+    try:
+        now = datetime.now(timezone.utc)
+        row = session.query(DraftCache).filter(
+            DraftCache.cache_key == cache_key).first()
+        if not row or _as_utc(row.expires_at) <= now:
+            return None
+        row.hits += 1
+        row.last_used_at = now
+        session.commit()
+        return row.draft_content
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error retrieving cached draft: {str(e)}")
+        return None
+    finally:
+        session.close()
+
+
+def save_cached_draft(cache_key: str, model: str, draft_content: str, ttl: float,
+                      max_rows: int) -> bool:
+    """
+    Store a generated draft for ``ttl`` seconds, then drop expired rows and
+    the least recently used ones beyond ``max_rows``.
+    """
+    session = get_db_session()
+    try:
+        now = datetime.now(timezone.utc)
+        row = session.query(DraftCache).filter(
+            DraftCache.cache_key == cache_key).first()
+        if row is None:
+            row = DraftCache(cache_key=cache_key, hits=0)
+            session.add(row)
+        row.model = model
+        row.draft_content = draft_content
+        row.last_used_at = now
+        row.expires_at = now + timedelta(seconds=ttl)
+        session.flush()
+
+        session.query(DraftCache).filter(DraftCache.expires_at <= now).delete(
+            synchronize_session=False)
+        stale_ids = [stale_id for (stale_id,) in session.query(DraftCache.id).order_by(
+            DraftCache.last_used_at.desc(), DraftCache.id.desc()).offset(max_rows)]
+        if stale_ids:
+            session.query(DraftCache).filter(DraftCache.id.in_(stale_ids)).delete(
+                synchronize_session=False)
+        session.commit()
+        return True
+    except IntegrityError:
+        # Another worker stored the same prompt first; its draft is as good as ours
+        session.rollback()
+        return True
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error saving cached draft: {str(e)}")
+        return False
+    finally:
+        session.close()
+
+
+OUTBOX_PENDING_STATUSES = ('QUEUED', 'RETRY', 'RUNNING')
+
+
+def _as_utc(value: datetime) -> datetime:
+    """SQLite returns naive datetimes; treat them as the UTC they were stored as."""
+    if value and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _outbox_job_dict(job: OutboxJob) -> dict:
+    return {
+        "job_id": job.job_id,
+        "user_email": job.user_email,
+        "thread_id": job.thread_id,
+        "recipient_email": job.recipient_email,
+        "draft_body": job.draft_body,
+        "draft_only": job.draft_only,
+        "status": job.status,
+        "attempts": job.attempts,
+        "result": job.result,
+        "last_error": job.last_error,
+    }
+
+
+def _replayed_outbox_job(session: Session, user_email: str,
+                         idempotency_key: str) -> dict | None:
+    record = session.query(IdempotencyRecord).filter(
+        IdempotencyRecord.user_email == user_email,
+        IdempotencyRecord.key == idempotency_key
+    ).first()
+    if not record:
+        return None
+    job = session.query(OutboxJob).filter(OutboxJob.job_id == record.job_id).first()
+    if not job:
+        return None
+    return {**_outbox_job_dict(job), "replayed": True,
+            "request_hash": record.request_hash}
+
+
+def enqueue_outbox_job(user_email: str, thread_id: str, recipient_email: str,
+                       draft_body: str, draft_only: bool, idempotency_key: str = None,
+                       request_hash: str = None, key_ttl: int = 86400) -> dict | None:
+    """
+    Store a reply to be saved or sent by the outbox workers.
+
+    With an ``idempotency_key`` the job and its key are stored together; a
+    key already used by the user (and not older than ``key_ttl`` seconds)
+    returns the existing job with ``replayed`` set instead of a new one.
+    """
+    session = get_db_session()
+    try:
+        now = datetime.now(timezone.utc)
+        if idempotency_key:
+            session.query(IdempotencyRecord).filter(
+                IdempotencyRecord.expires_at < now).delete(synchronize_session=False)
+            existing = _replayed_outbox_job(session, user_email, idempotency_key)
+            if existing:
+                session.commit()
+                return existing
+
+        job = OutboxJob(
+            job_id=uuid.uuid4().hex,
+            user_email=user_email,
+            thread_id=thread_id,
+            recipient_email=recipient_email,
+            draft_body=draft_body,
+            draft_only=draft_only,
+            status='QUEUED',
+            attempts=0,
+            next_attempt_at=now
+        )
+        session.add(job)
+        if idempotency_key:
+            session.add(IdempotencyRecord(
+                user_email=user_email,
+                key=idempotency_key,
+                request_hash=request_hash or "",
+                job_id=job.job_id,
+                expires_at=now + timedelta(seconds=key_ttl)
+            ))
+        session.commit()
+        return {**_outbox_job_dict(job), "replayed": False,
+                "request_hash": request_hash}
+    except IntegrityError:
+        # A concurrent request with the same key won the insert: answer with its job
+        session.rollback()
+        return _replayed_outbox_job(session, user_email, idempotency_key)
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error enqueuing outbox job: {str(e)}")
+        return None
+    finally:
+        session.close()
+
+
+def get_outbox_job(job_id: str, user_email: str = None) -> dict | None:
+    """Get an outbox job, optionally only if it belongs to ``user_email``."""
+    session = get_db_session()
+    try:
+        query = session.query(OutboxJob).filter(OutboxJob.job_id == job_id)
+        if user_email is not None:
+            query = query.filter(OutboxJob.user_email == user_email)
+        job = query.first()
+        return _outbox_job_dict(job) if job else None
+    except Exception as e:
+        _logger.error(f"Error retrieving outbox job: {str(e)}")
+        return None
+    finally:
+        session.close()
+
+
+def _lease_expired(job: OutboxJob, now: datetime) -> bool:
+    return job.locked_until is None or _as_utc(job.locked_until) <= now
+
+
+def claim_outbox_jobs(limit: int, lease_seconds: float = OUTBOX_LEASE_SECONDS) -> list:
+    """
+    Mark up to ``limit`` due jobs RUNNING and return them.
+
+    Only the oldest unfinished job of each user is eligible, so a user's
+    replies go out in the order they were queued even with several workers.
+    A claimed job is leased for ``lease_seconds``; a RUNNING job is only
+    taken over once its lease has expired, i.e. its worker has died. The
+    status and lease checks in the UPDATE keep two processes from claiming
+    the same job.
+    """
+    session = get_db_session()
+    try:
+        pending = session.query(OutboxJob).filter(
+            OutboxJob.status.in_(OUTBOX_PENDING_STATUSES)
+        ).order_by(OutboxJob.id).all()
+        heads = {}
+        for job in pending:
+            heads.setdefault(job.user_email, job)
+
+        now = datetime.now(timezone.utc)
+        locked_until = now + timedelta(seconds=lease_seconds)
+        claimed = []
+        for job in heads.values():
+            if len(claimed) >= limit:
+                break
+            if job.status == 'RUNNING':
+                if not _lease_expired(job, now):
+                    continue
+                _logger.warning(f"Outbox job {job.job_id} lease expired, "
+                                "taking it over")
+            elif _as_utc(job.next_attempt_at) > now:
+                continue
+            query = session.query(OutboxJob).filter(OutboxJob.id == job.id,
+                                                    OutboxJob.status == job.status)
+            if job.status == 'RUNNING':
+                query = query.filter(OutboxJob.locked_until.is_(None)
+                                     if job.locked_until is None
+                                     else OutboxJob.locked_until == job.locked_until)
+            updated = query.update({"status": 'RUNNING',
+                                    "attempts": OutboxJob.attempts + 1,
+                                    "locked_until": locked_until},
+                                   synchronize_session=False)
+            if updated:
+                claimed.append({**_outbox_job_dict(job), "status": 'RUNNING',
+                                "attempts": job.attempts + 1})
+        session.commit()
+        return claimed
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error claiming outbox jobs: {str(e)}")
+        return []
+    finally:
+        session.close()
+
+
+def finish_outbox_job(job_id: str, status: str, result: dict = None, error: str = None,
+                      next_attempt_at: datetime = None) -> bool:
+    """Record an attempt: DONE, FAILED, UNKNOWN, or RETRY at ``next_attempt_at``."""
+    session = get_db_session()
+    try:
+        job = session.query(OutboxJob).filter(OutboxJob.job_id == job_id).first()
+        if not job:
+            return False
+        job.status = status
+        job.result = result
+        job.last_error = error
+        job.locked_until = None
+        if next_attempt_at is not None:
+            job.next_attempt_at = next_attempt_at
+        session.commit()
+        return True
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error updating outbox job: {str(e)}")
+        return False
+    finally:
+        session.close()
+
+
+def requeue_running_outbox_jobs() -> int:
+    """
+    Return RUNNING jobs whose lease has expired to the queue (run at startup).
+
+    Jobs still leased belong to a worker that may be sending them right now,
+    in this or another process, and are left alone.
+    """
+    session = get_db_session()
+    try:
+        now = datetime.now(timezone.utc)
+        count = session.query(OutboxJob).filter(
+            OutboxJob.status == 'RUNNING',
+            (OutboxJob.locked_until.is_(None)) | (OutboxJob.locked_until <= now)
+        ).update({"status": 'RETRY', "locked_until": None}, synchronize_session=False)
+        session.commit()
+        return count
+    except Exception as e:
+        session.rollback()
+        _logger.error(f"Error requeuing outbox jobs: {str(e)}")
+        return 0
+    finally:
+        session.close()
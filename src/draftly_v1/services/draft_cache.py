@@ -0,0 +1,101 @@
+"""Generated drafts cached under a hash of the exact prompt, model and temperature"""
+import asyncio
+import hashlib
+import json
+import logging
+from draftly_v1.config import (DRAFT_CACHE_ENABLED, DRAFT_CACHE_MEMORY_SIZE,
+                               DRAFT_CACHE_TTL, DRAFT_CACHE_MAX_ROWS)
+from draftly_v1.services.database import get_cached_draft, save_cached_draft
+from draftly_v1.services.utils.metrics import register_metrics
+from draftly_v1.services.utils.ttl_cache import TTLCache
+
+_logger = logging.getLogger(__name__)
+
+
+def draft_cache_key(prompt: str, model: str, temperature: float) -> str:
+    """sha256 of the formatted prompt, the model and the temperature (one decimal)."""
+    payload = json.dumps([model, round(float(temperature), 1), prompt])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DraftCache:
+    """
+    Two-tier cache of generated drafts.
+
+    The same prompt for the same model and temperature bucket returns the
+    stored draft instead of calling the LLM again. Lookups go to an
+    in-memory LRU first, then to the ``draft_cache`` table (shared by all
+    workers), whose rows expire after ``ttl`` seconds and are trimmed to
+    ``max_rows`` least recently used.
+
+    Args:
+        maxsize (int): drafts kept in memory
+        ttl (float): seconds a draft stays valid in either tier
+        max_rows (int): drafts kept in the database
+        enabled (bool): when False every lookup misses and nothing is stored
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 86400, max_rows: int = 10000,
+                 enabled: bool = True, db_loader=get_cached_draft,
+                 db_saver=save_cached_draft):
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.enabled = enabled
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._db_loader = db_loader
+        self._db_saver = db_saver
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    async def get(self, key: str) -> str | None:
+        """Cached draft for ``key``, or None."""
+        if not self.enabled:
+            return None
+        draft = self._memory.get(key)
+        if draft is not None:
+            self.memory_hits += 1
+            return draft
+        if self._db_loader:
+            draft = await asyncio.to_thread(self._db_loader, key)
+            if draft is not None:
+                self.db_hits += 1
+                self._memory.set(key, draft)
+                return draft
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, model: str, draft: str):
+        """Store a freshly generated draft in both tiers."""
+        if not self.enabled or not draft:
+            return
+        self._memory.set(key, draft)
+        self.stores += 1
+        if self._db_saver:
+            await asyncio.to_thread(self._db_saver, key, model, draft, self.ttl,
+                                    self.max_rows)
+
+    def clear(self):
+        self._memory.clear()
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.db_hits
+        lookups = hits + self.misses
+        return {
+            "memory_size": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+draft_cache = DraftCache(
+    maxsize=DRAFT_CACHE_MEMORY_SIZE,
+    ttl=DRAFT_CACHE_TTL,
+    max_rows=DRAFT_CACHE_MAX_ROWS,
+    enabled=DRAFT_CACHE_ENABLED,
+)
+register_metrics("draft_cache", draft_cache.stats)
@@ -1,85 +1,57 @@
+import asyncio
 import base64
 from email.message import EmailMessage
 import logging
-from draftly_v1.services.gmail_services import get_user_creds
+import httpx
+from draftly_v1.services.database import (get_draft_reply_headers, get_gmail_draft_id,
+                                          get_open_drafts, save_bulk_reply_results)
+from draftly_v1.services.gmail_batch import execute_batch
+from draftly_v1.services.gmail_client import (AsyncGmailClient, GmailApiError,
+                                              create_draft_request,
+                                              update_draft_request,
+                                              send_draft_request,
+                                              send_message_request)
+from draftly_v1.services.gmail_services import get_gmail_client, mark_threads_as_read
+from draftly_v1.services.thread_store import thread_store
 from draftly_v1.services.utils.logger_config import setup_logging
 
 setup_logging(logging.INFO)
 _logger = logging.getLogger(__name__)
 
-def create_gmail_draft(email, toEmail,thread_id, draft_body):
+# Partial responses: callers only need the ids
+DRAFT_FIELDS = "id,message(id,threadId)"
+SENT_MESSAGE_FIELDS = "id,threadId,labelIds"
+
+# Transport errors raised before the request left: the message was certainly not sent
+UNSENT_TRANSPORT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class SendUnconfirmedError(Exception):
+    """A send Gmail did not confirm (5xx or dropped connection); it may have gone out"""
+
+
+def build_reply(to_email: str, thread_id: str, draft_body: str, headers: dict) -> dict:
     """
-    thread_id: str
-    draft_body: str (HTML or plain text content to be sent in the draft)
+    Build the Gmail message resource for a reply in ``thread_id``.
+
+    Args:
+        headers (dict): Subject / Message-ID / References of the message
+            being replied to
+
+    Returns:
+        dict: ``{'threadId', 'raw'}`` usable as a draft message or for send
     """
-    user_creds = get_user_creds(email)
-    
-    # Fetch the original thread to get threading headers
-    thread = user_creds.users().threads().get(userId='me', id=thread_id).execute()
-    messages = thread.get('messages', [])
-    
-    if not messages:
-        raise ValueError(f"No messages found in thread {thread_id}")
-    
-    # Get the latest message for threading headers
-    original_msg = messages[-1]
-    headers = {h['name']: h['value'] for h in original_msg.get('payload', {}).get('headers', [])}
-    
-    # Create an EmailMessage object
     message_obj = EmailMessage()
     message_obj.set_content(draft_body, subtype='html')
-    message_obj['To'] = toEmail
-    
-    # Add threading headers to keep draft in the same thread
-    original_subject = headers.get('Subject', '')
-    if not original_subject.startswith('Re: '):
-        message_obj['Subject'] = f"Re: {original_subject}"
-    else:
-        message_obj['Subject'] = original_subject
-    
-    message_id = headers.get('Message-ID')
-    if message_id:
-        message_obj['In-Reply-To'] = message_id
-        message_obj['References'] = headers.get('References', '') + ' ' + message_id if headers.get('References') else message_id
-    
-    # Convert to base64url string
-    raw_message = base64.urlsafe_b64encode(message_obj.as_bytes()).decode()
-    
-    message = {
-        'message': {
-            'threadId': thread_id,
-            'raw': raw_message
-        }
-    }
-    _logger.info(f"Creating draft for email: {email[:6]+'xxx'}... in thread: {thread_id}")
-    draft_response = user_creds.users().drafts().create(userId='me', body=message).execute()    
-    return draft_response
+    message_obj['To'] = to_email
 
-def send_gmail_draft(email, toEmail, thread_id, draft_body):
-    user_creds = get_user_creds(email)
-
-    # Fetch the original thread to get threading headers
-    thread = user_creds.users().threads().get(userId='me', id=thread_id).execute()
-    messages = thread.get('messages', [])
-    
-    if not messages:
-        raise ValueError(f"No messages found in thread {thread_id}")
-    
-    # Get the latest message for threading headers
-    original_msg = messages[-1]
-    headers = {h['name']: h['value'] for h in original_msg.get('payload', {}).get('headers', [])}
-    
-    message_obj = EmailMessage()
-    message_obj.set_content(draft_body, subtype='html')
-    message_obj['To'] = toEmail
-    
-    # Add threading headers to keep email in the same thread
-    original_subject = headers.get('Subject', '')
+    # Add threading headers to keep the reply in the same thread
+    original_subject = headers.get('Subject') or ''
     if not original_subject.startswith('Re: '):
         message_obj['Subject'] = f"Re: {original_subject}"
     else:
         message_obj['Subject'] = original_subject
-    
+
     message_id = headers.get('Message-ID')
     if message_id:
         message_obj['In-Reply-To'] = message_id
@@ -87,15 +59,192 @@ def send_gmail_draft(email, toEmail, thread_id, draft_body):
 
     # Convert to base64url string - must encode the complete message with headers
     raw_message = base64.urlsafe_b64encode(message_obj.as_bytes()).decode()
+    return {'threadId': thread_id, 'raw': raw_message}
+
+
+async def get_reply_headers(client: AsyncGmailClient, thread_id: str) -> dict:
+    """
+    Threading headers for a reply: the ones stored with the draft when the
+    thread was fetched for drafting, else the thread store (memory or one
+    metadata-only call).
+    """
+    headers = await asyncio.to_thread(get_draft_reply_headers, client.email, thread_id)
+    if headers:
+        return headers
+    return await thread_store.get_reply_headers(client, thread_id)
 
-    _logger.info(f"Sending draft with reply for email: {email[:6]+'xxx'}... in thread: {thread_id}")
-    send_response = user_creds.users().messages().send(
-        userId='me',
-        body={
-            'threadId': thread_id,
-            'raw': raw_message
-        }).execute()
 
-    
+async def create_gmail_draft(email, toEmail,thread_id, draft_body):
+    """
+    Save the reply as a Gmail draft. The thread's existing Gmail draft is
+    updated in place; a new one is created only when there is none (or it
+    was deleted in Gmail).
+
+    thread_id: str
+    draft_body: str (HTML or plain text content to be sent in the draft)
+    """
+    client = get_gmail_client(email)
+    headers = await get_reply_headers(client, thread_id)
+    message = {'message': build_reply(toEmail, thread_id, draft_body, headers)}
+    draft_id = await asyncio.to_thread(get_gmail_draft_id, email, thread_id)
+    if draft_id:
+        try:
+            _logger.info(f"Updating draft for email: {email[:6]+'xxx'}... "
+                         f"in thread: {thread_id}")
+            return await client.update_draft(draft_id, body={'id': draft_id, **message},
+                                             fields=DRAFT_FIELDS)
+        except GmailApiError as e:
+            if e.status_code != 404:
+                raise
+            _logger.info(f"Gmail draft {draft_id} no longer exists, creating a new one")
+    _logger.info(f"Creating draft for email: {email[:6]+'xxx'}... "
+                 f"in thread: {thread_id}")
+    draft_response = await client.create_draft(body=message, fields=DRAFT_FIELDS)
+    return draft_response
+
+async def send_gmail_draft(email, toEmail, thread_id, draft_body):
+    """
+    Send the reply. A saved Gmail draft of the thread is sent (with this
+    content) instead of being left behind.
+    """
+    client = get_gmail_client(email)
+    headers = await get_reply_headers(client, thread_id)
+    message = build_reply(toEmail, thread_id, draft_body, headers)
+    draft_id = await asyncio.to_thread(get_gmail_draft_id, email, thread_id)
+    if draft_id:
+        try:
+            _logger.info(f"Sending saved draft for email: {email[:6]+'xxx'}... "
+                         f"in thread: {thread_id}")
+            body = {'id': draft_id, 'message': message}
+            return await _confirmed_send(
+                client.send_draft(body=body, fields=SENT_MESSAGE_FIELDS))
+        except GmailApiError as e:
+            if e.status_code != 404:
+                raise
+            _logger.info(f"Gmail draft {draft_id} no longer exists, "
+                         "sending as a new message")
+    _logger.info(f"Sending draft with reply for email: {email[:6]+'xxx'}... "
+                 f"in thread: {thread_id}")
+    send_response = await _confirmed_send(
+        client.send_message(body=message, fields=SENT_MESSAGE_FIELDS))
     return send_response
 
+
+async def _confirmed_send(call):
+    """
+    Await a Gmail send call.
+
+    Raises:
+        SendUnconfirmedError: After a 5xx or a transport error once the
+            request was on its way, as the message may have been sent
+        GmailApiError: When Gmail refused the send (4xx, rate limits)
+    """
+    try:
+        return await call
+    except GmailApiError as e:
+        if e.status_code >= 500:
+            raise SendUnconfirmedError(str(e)) from e
+        raise
+    except UNSENT_TRANSPORT_ERRORS:
+        raise
+    except httpx.TransportError as e:
+        raise SendUnconfirmedError(f"Connection lost while sending: {e!r}") from e
+
+
+def _reply_request(item: dict, message: dict, draft_id: str = None):
+    """Gmail call saving or sending one bulk item, via its saved draft if any"""
+    if item["draft_only"]:
+        if draft_id:
+            return update_draft_request(draft_id,
+                                        body={'id': draft_id, 'message': message},
+                                        fields=DRAFT_FIELDS)
+        return create_draft_request(body={'message': message}, fields=DRAFT_FIELDS)
+    if draft_id:
+        return send_draft_request(body={'id': draft_id, 'message': message},
+                                  fields=SENT_MESSAGE_FIELDS)
+    return send_message_request(body=message, fields=SENT_MESSAGE_FIELDS)
+
+
+async def deliver_replies_bulk(email: str, items: list) -> list:
+    """
+    Save or send many replies at once with batched Gmail calls.
+
+    Reply headers missing from the database are read in one batch, the
+    drafts and sends go out in one batch (plus one more for saved drafts
+    that were deleted in Gmail), the delivered threads are marked read in
+    one batched modify, and the draft rows are updated in one transaction.
+
+    Args:
+        email (str): user the replies belong to
+        items (list): dicts with ``thread_id``, ``toEmail``, ``draft_body``
+            and ``draft_only``; thread ids must be unique
+
+    Returns:
+        list: per item, in order, ``{'thread_id', 'draft_only', 'status',
+        'result', 'error'}`` with status ``DONE``, ``FAILED``, or
+        ``UNKNOWN`` for a send Gmail did not confirm (5xx or dropped
+        connection); those are not retried as the message may have gone out
+    """
+    client = get_gmail_client(email)
+    outcomes = {item["thread_id"]: {"thread_id": item["thread_id"],
+                                    "draft_only": item["draft_only"],
+                                    "status": "FAILED", "result": None, "error": None}
+                for item in items}
+    open_drafts = await asyncio.to_thread(get_open_drafts, email, list(outcomes))
+
+    headers = {t_id: draft["reply_headers"] for t_id, draft in open_drafts.items()
+               if draft["reply_headers"]}
+    missing = [t_id for t_id in outcomes if t_id not in headers]
+    if missing:
+        headers.update(await thread_store.get_reply_headers_many(client, missing))
+
+    messages, requests, draft_ids = {}, {}, {}
+    for item in items:
+        t_id = item["thread_id"]
+        if isinstance(headers.get(t_id), Exception):
+            outcomes[t_id]["error"] = str(headers[t_id])
+            continue
+        messages[t_id] = build_reply(item["toEmail"], t_id, item["draft_body"],
+                                     headers.get(t_id) or {})
+        draft_ids[t_id] = (open_drafts.get(t_id) or {}).get("gmail_draft_id")
+        requests[t_id] = _reply_request(item, messages[t_id], draft_ids[t_id])
+    responses = await execute_batch(client, requests) if requests else {}
+
+    # Saved drafts deleted in Gmail: create the draft / send the message instead
+    items_by_thread = {item["thread_id"]: item for item in items}
+    gone = [t_id for t_id, response in responses.items()
+            if not response.ok and draft_ids[t_id] and response.status_code == 404]
+    if gone:
+        _logger.info(f"{len(gone)} saved Gmail draft(s) no longer exist, "
+                     "recreating them")
+        responses.update(await execute_batch(client, {
+            t_id: _reply_request(items_by_thread[t_id], messages[t_id]) for t_id in gone
+        }))
+
+    delivered = []
+    for t_id, response in responses.items():
+        outcome = outcomes[t_id]
+        if not response.ok:
+            outcome["error"] = str(response.error)
+            if not outcome["draft_only"] and response.status_code >= 500:
+                outcome["status"] = "UNKNOWN"
+            continue
+        gmail_id = (response.data or {}).get("id")
+        outcome["status"] = "DONE"
+        outcome["result"] = ({"draft_id": gmail_id} if outcome["draft_only"]
+                             else {"message_id": gmail_id})
+        delivered.append({"thread_id": t_id, "draft_only": outcome["draft_only"],
+                          "gmail_id": gmail_id,
+                          "draft_content": items_by_thread[t_id]["draft_body"]})
+
+    # Gmail has the replies now: bookkeeping failures are logged, not reported
+    # as failed items
+    if delivered:
+        await mark_threads_as_read(email, [result["thread_id"] for result in delivered])
+        updated = await asyncio.to_thread(save_bulk_reply_results, email, delivered)
+        if updated < len(delivered):
+            _logger.warning(f"{len(delivered) - updated} bulk replies had no open "
+                            "draft context to update")
+    _logger.info(f"Bulk delivery for {email[:6]}XXX: "
+                 f"{len(delivered)}/{len(items)} replies delivered")
+    return [outcomes[item["thread_id"]] for item in items]
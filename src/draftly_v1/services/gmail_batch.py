@@ -0,0 +1,155 @@
+"""Chunked, concurrent Gmail batch execution with per-item retry"""
+import asyncio
+import logging
+import random
+import httpx
+from draftly_v1.config import (GMAIL_BATCH_SIZE, GMAIL_BATCH_CONCURRENCY,
+                               GMAIL_BATCH_MAX_RETRIES, GMAIL_BATCH_BACKOFF_BASE)
+from draftly_v1.services.gmail_client import (AsyncGmailClient, GmailApiError,
+                                              GmailBatchResponse, GmailRequest,
+                                              MAX_BATCH_SIZE, is_rate_limit_error)
+from draftly_v1.services.utils.metrics import register_metrics
+
+_logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error: GmailApiError) -> bool:
+    """Whether a failed call is worth repeating (rate limits, transient 5xx)."""
+    return error.status_code in RETRYABLE_STATUS_CODES or is_rate_limit_error(error)
+
+
+def should_retry(request: GmailRequest, error: GmailApiError) -> bool:
+    """
+    Whether to repeat ``request`` after ``error``.
+
+    Sends are only repeated when rate limited: Gmail refused them before
+    doing anything. After a 5xx or a dropped connection the message may
+    have gone out, and sending it again would deliver a duplicate.
+    """
+    if request.idempotent:
+        return is_retryable(error)
+    return is_rate_limit_error(error)
+
+
+class GmailBatchExecutor:
+    """
+    Run any number of Gmail requests as multipart batches.
+
+    Requests are split into chunks of ``chunk_size`` (at most Gmail's limit
+    of 100) and up to ``max_concurrency`` chunks are in flight at once. After
+    each round only the sub-requests that failed with a retryable error are
+    sent again (sends only when rate limited, see ``should_retry``), after
+    an exponential backoff with jitter that also honours ``Retry-After``.
+
+    Args:
+        chunk_size (int): requests per batch HTTP call
+        max_concurrency (int): batch calls in flight at once
+        max_retries (int): extra attempts for a failed sub-request
+        backoff_base (float): delay in seconds before the first retry
+        backoff_max (float): upper bound for a single delay
+    """
+
+    def __init__(self, chunk_size: int = 50, max_concurrency: int = 4,
+                 max_retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 16):
+        self.chunk_size = max(1, min(chunk_size, MAX_BATCH_SIZE))
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.batches = 0
+        self.items = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _backoff(self, attempt: int, retry_after: float) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return max(retry_after, random.uniform(delay / 2, delay))
+
+    async def _run_chunk(self, client: AsyncGmailClient, chunk: dict,
+                         semaphore: asyncio.Semaphore) -> dict:
+        async with semaphore:
+            self.batches += 1
+            try:
+                responses = await client.batch(chunk)
+            except GmailApiError as e:
+                # The whole batch call failed: every item in it failed the same way
+                return {request_id: GmailBatchResponse(e.status_code, error=e)
+                        for request_id in chunk}
+            except httpx.HTTPError as e:
+                error = GmailApiError(503, f"Batch request failed: {str(e)}")
+                return {request_id: GmailBatchResponse(503, error=error)
+                        for request_id in chunk}
+        missing = GmailApiError(502, "Missing batch response part")
+        return {request_id: (responses.get(request_id)
+                             or GmailBatchResponse(502, error=missing))
+                for request_id in chunk}
+
+    async def run(self, client: AsyncGmailClient, requests: dict) -> dict:
+        """
+        Execute ``requests`` and return one result per request.
+
+        Args:
+            client (AsyncGmailClient): client for the user
+            requests (dict): request_id -> GmailRequest
+
+        Returns:
+            dict: request_id -> GmailBatchResponse in request order; failed
+            items carry the last error and ``attempts`` made
+        """
+        results = {}
+        pending = list(requests)
+        attempt = 0
+        self.items += len(requests)
+        while pending:
+            attempt += 1
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            chunks = [{request_id: requests[request_id]
+                       for request_id in pending[i:i + self.chunk_size]}
+                      for i in range(0, len(pending), self.chunk_size)]
+            rounds = await asyncio.gather(
+                *(self._run_chunk(client, chunk, semaphore) for chunk in chunks))
+
+            pending, retry_after = [], 0.0
+            for chunk_results in rounds:
+                for request_id, item in chunk_results.items():
+                    item.attempts = attempt
+                    results[request_id] = item
+                    if (not item.ok and attempt <= self.max_retries
+                            and should_retry(requests[request_id], item.error)):
+                        pending.append(request_id)
+                        retry_after = max(retry_after, item.error.retry_after or 0.0)
+            if pending:
+                self.retries += len(pending)
+                delay = self._backoff(attempt, retry_after)
+                _logger.warning(f"Retrying {len(pending)} Gmail batch item(s) for "
+                                f"{client.email[:6]}XXX in {delay:.2f}s "
+                                f"(attempt {attempt + 1})")
+                await asyncio.sleep(delay)
+
+        self.failures += sum(1 for item in results.values() if not item.ok)
+        return {request_id: results[request_id] for request_id in requests}
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "retries": self.retries,
+            "failures": self.failures,
+        }
+
+
+gmail_batch_executor = GmailBatchExecutor(
+    chunk_size=GMAIL_BATCH_SIZE,
+    max_concurrency=GMAIL_BATCH_CONCURRENCY,
+    max_retries=GMAIL_BATCH_MAX_RETRIES,
+    backoff_base=GMAIL_BATCH_BACKOFF_BASE,
+)
+register_metrics("gmail_batch", gmail_batch_executor.stats)
+
+
+async def execute_batch(client: AsyncGmailClient, requests: dict) -> dict:
+    """Run ``requests`` (request_id -> GmailRequest) through the shared executor."""
+    return await gmail_batch_executor.run(client, requests)
@@ -0,0 +1,481 @@
+"""Asyncio-native Gmail REST client built on a pooled httpx.AsyncClient"""
+import json
+import logging
+import uuid
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+import httpx
+from draftly_v1.config import (GMAIL_HTTP_MAX_CONNECTIONS, GMAIL_HTTP_MAX_KEEPALIVE,
+                               GMAIL_HTTP_KEEPALIVE_EXPIRY, GMAIL_HTTP_TIMEOUT,
+                               GMAIL_HTTP2_ENABLED, GMAIL_RATE_LIMIT_ENABLED,
+                               GMAIL_USER_QUOTA_PER_SECOND,
+                               GMAIL_PROJECT_QUOTA_PER_SECOND)
+from draftly_v1.services.google_http import DEFAULT_HEADERS
+from draftly_v1.services.utils.metrics import register_metrics
+from draftly_v1.services.utils.rate_limiter import QuotaLimiter
+
+try:
+    import h2  # noqa: F401  httpx negotiates HTTP/2 only when h2 is installed
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_logger = logging.getLogger(__name__)
+
+GMAIL_API_ROOT = "https://gmail.googleapis.com"
+GMAIL_USER_PATH = "/gmail/v1/users/me"
+GMAIL_BATCH_PATH = "/batch/gmail/v1"
+MAX_BATCH_SIZE = 100  # Gmail rejects batches with more calls than this
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+# Gmail quota units charged per method (batch sub-requests are charged individually)
+QUOTA_UNITS = {
+    "drafts.create": 10,
+    "drafts.send": 100,
+    "drafts.update": 15,
+    "history.list": 2,
+    "messages.get": 5,
+    "messages.list": 5,
+    "messages.send": 100,
+    "threads.get": 10,
+    "threads.modify": 10,
+    "users.getProfile": 1,
+    "users.watch": 100,
+}
+
+_http_client = None
+_response_stats = {}  # endpoint label -> {"requests", "response_bytes"}
+_pool_stats = {"requests": 0, "connections_opened": 0, "http2_responses": 0}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide keep-alive connection pool for Gmail calls."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            base_url=GMAIL_API_ROOT,
+            timeout=GMAIL_HTTP_TIMEOUT,
+            http2=GMAIL_HTTP2_ENABLED and HTTP2_AVAILABLE,
+            headers=DEFAULT_HEADERS,
+            limits=httpx.Limits(
+                max_connections=GMAIL_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=GMAIL_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=GMAIL_HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _http_client
+
+
+def _endpoint_label(method: str, url: str) -> str:
+    """Coarse endpoint name for metrics, e.g. ``GET threads`` or ``POST batch``."""
+    if url.startswith(GMAIL_BATCH_PATH):
+        return f"{method} batch"
+    resource = url[len(GMAIL_USER_PATH):].lstrip("/").split("/", 1)[0].split("?", 1)[0]
+    return f"{method} {resource or 'user'}"
+
+
+def record_response(method: str, url: str, size: int):
+    """Count one Gmail response of ``size`` bytes against its endpoint."""
+    stats = _response_stats.setdefault(_endpoint_label(method, url),
+                                       {"requests": 0, "response_bytes": 0})
+    stats["requests"] += 1
+    stats["response_bytes"] += size
+
+
+def get_response_stats() -> dict:
+    """Requests, response bytes and bytes per request, per endpoint and in total."""
+    totals = {"requests": 0, "response_bytes": 0}
+    report = {}
+    for label, stats in _response_stats.items():
+        totals["requests"] += stats["requests"]
+        totals["response_bytes"] += stats["response_bytes"]
+        per_request = stats["response_bytes"] // stats["requests"]
+        report[label] = {**stats, "bytes_per_request": per_request}
+    per_request = totals["response_bytes"] // max(totals["requests"], 1)
+    report["total"] = {**totals, "bytes_per_request": per_request}
+    return report
+
+
+def reset_response_stats():
+    _response_stats.clear()
+
+
+async def _trace_connections(event_name: str, info: dict):
+    # httpcore only emits connect events when the pool has no idle connection to reuse
+    if event_name == "connection.connect_tcp.complete":
+        _pool_stats["connections_opened"] += 1
+
+
+async def _pooled_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Send one request on the shared pool, counting new connections and HTTP/2 use."""
+    _pool_stats["requests"] += 1
+    response = await get_http_client().request(
+        method, url, extensions={"trace": _trace_connections}, **kwargs)
+    if response.extensions.get("http_version") == b"HTTP/2":
+        _pool_stats["http2_responses"] += 1
+    return response
+
+
+def get_pool_stats() -> dict:
+    """Requests sent, connections opened and the share of requests reusing one."""
+    requests_sent = _pool_stats["requests"]
+    reuse = (1 - _pool_stats["connections_opened"] / requests_sent
+             if requests_sent else 0.0)
+    return {**_pool_stats, "http2_enabled": GMAIL_HTTP2_ENABLED and HTTP2_AVAILABLE,
+            "reuse_ratio": round(reuse, 3)}
+
+
+register_metrics("gmail_http", get_response_stats)
+register_metrics("gmail_http_pool", get_pool_stats)
+
+
+async def close_http_client():
+    """Close the shared connection pool (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class GmailApiError(Exception):
+    """Error response returned by the Gmail API"""
+
+    def __init__(self, status_code: int, message: str, reason: str = None,
+                 retry_after: float = None):
+        self.status_code = status_code
+        self.message = message
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"Gmail API error {status_code}: {message}")
+
+
+@dataclass
+class GmailRequest:
+    """A single Gmail API call, usable on its own or as part of a batch"""
+    method: str
+    path: str
+    params: dict = field(default_factory=dict)
+    body: dict = None
+    units: int = 5  # Gmail quota cost, see QUOTA_UNITS
+    # False for sends: a 5xx does not prove the message was not sent
+    idempotent: bool = True
+
+
+@dataclass
+class GmailBatchResponse:
+    """Result of one sub-request of a multipart batch"""
+    status_code: int
+    data: dict = None
+    error: GmailApiError = None
+    attempts: int = 1
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _params(**kwargs) -> dict:
+    return {key: value for key, value in kwargs.items() if value is not None}
+
+
+def list_messages_request(q: str = None, max_results: int = None,
+                          page_token: str = None, label_ids: list = None,
+                          fields: str = None) -> GmailRequest:
+    return GmailRequest("GET", "/messages", _params(
+        q=q, maxResults=max_results, pageToken=page_token, labelIds=label_ids,
+        fields=fields), units=QUOTA_UNITS["messages.list"])
+
+
+def get_message_request(message_id: str, format: str = "full",
+                        metadata_headers: list = None,
+                        fields: str = None) -> GmailRequest:
+    return GmailRequest("GET", f"/messages/{message_id}", _params(
+        format=format, metadataHeaders=metadata_headers, fields=fields),
+        units=QUOTA_UNITS["messages.get"])
+
+
+def send_message_request(body: dict, fields: str = None) -> GmailRequest:
+    return GmailRequest("POST", "/messages/send", _params(fields=fields), body=body,
+                        units=QUOTA_UNITS["messages.send"], idempotent=False)
+
+
+def get_thread_request(thread_id: str, format: str = "full",
+                       metadata_headers: list = None,
+                       fields: str = None) -> GmailRequest:
+    return GmailRequest("GET", f"/threads/{thread_id}", _params(
+        format=format, metadataHeaders=metadata_headers, fields=fields),
+        units=QUOTA_UNITS["threads.get"])
+
+
+def modify_thread_request(thread_id: str, body: dict,
+                          fields: str = None) -> GmailRequest:
+    return GmailRequest("POST", f"/threads/{thread_id}/modify", _params(fields=fields),
+                        body=body, units=QUOTA_UNITS["threads.modify"])
+
+
+def create_draft_request(body: dict, fields: str = None) -> GmailRequest:
+    return GmailRequest("POST", "/drafts", _params(fields=fields), body=body,
+                        units=QUOTA_UNITS["drafts.create"])
+
+
+def update_draft_request(draft_id: str, body: dict, fields: str = None) -> GmailRequest:
+    return GmailRequest("PUT", f"/drafts/{draft_id}", _params(fields=fields), body=body,
+                        units=QUOTA_UNITS["drafts.update"])
+
+
+def send_draft_request(body: dict, fields: str = None) -> GmailRequest:
+    return GmailRequest("POST", "/drafts/send", _params(fields=fields), body=body,
+                        units=QUOTA_UNITS["drafts.send"], idempotent=False)
+
+
+def get_profile_request(fields: str = None) -> GmailRequest:
+    return GmailRequest("GET", "/profile", _params(fields=fields),
+                        units=QUOTA_UNITS["users.getProfile"])
+
+
+def list_history_request(start_history_id: str, history_types: list = None,
+                         label_id: str = None, page_token: str = None,
+                         max_results: int = None, fields: str = None) -> GmailRequest:
+    return GmailRequest("GET", "/history", _params(
+        startHistoryId=start_history_id, historyTypes=history_types, labelId=label_id,
+        pageToken=page_token, maxResults=max_results, fields=fields),
+        units=QUOTA_UNITS["history.list"])
+
+
+def watch_request(body: dict) -> GmailRequest:
+    return GmailRequest("POST", "/watch", body=body, units=QUOTA_UNITS["users.watch"])
+
+
+def _error_from_response(status_code: int, headers, content: bytes) -> GmailApiError:
+    message, reason = "", None
+    try:
+        error = json.loads(content or b"{}").get("error", {})
+        if isinstance(error, dict):
+            message = error.get("message", "")
+            reason = next((e.get("reason") for e in error.get("errors", [])
+                           if e.get("reason")), None)
+        else:
+            message = str(error)
+    except ValueError:
+        message = (content or b"").decode("utf-8", errors="replace")[:200]
+    retry_after = headers.get("Retry-After") if headers else None
+    try:
+        retry_after = float(retry_after) if retry_after is not None else None
+    except ValueError:
+        retry_after = None
+    return GmailApiError(status_code, message or "Unknown error", reason=reason,
+                         retry_after=retry_after)
+
+
+def _split_head(block: str):
+    """Split an HTTP-like block into (header lines, body)."""
+    head, _, body = block.partition("\r\n\r\n")
+    return head.split("\r\n"), body
+
+
+def _parse_headers(lines) -> dict:
+    headers = {}
+    for line in lines:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def build_batch_body(requests: list, boundary: str) -> bytes:
+    """Encode ``requests`` as a multipart/mixed Gmail batch payload."""
+    parts = []
+    for index, request in enumerate(requests):
+        url = GMAIL_USER_PATH + request.path
+        if request.params:
+            url += "?" + urlencode(request.params, doseq=True)
+        inner = f"{request.method} {url} HTTP/1.1\r\n"
+        if request.body is not None:
+            inner += "Content-Type: application/json\r\n\r\n" + json.dumps(request.body)
+        else:
+            inner += "\r\n"
+        parts.append(
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            f"Content-ID: <item{index}>\r\n\r\n"
+            f"{inner}\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n")
+    return "".join(parts).encode("utf-8")
+
+
+def parse_batch_response(content_type: str, content: bytes, count: int) -> list:
+    """Decode a multipart/mixed batch response into ``count`` GmailBatchResponse."""
+    boundary = next((p.split("=", 1)[1].strip('"') for p in content_type.split(";")
+                     if p.strip().startswith("boundary=")), None)
+    if not boundary:
+        raise GmailApiError(502, f"Batch response without boundary: {content_type}")
+
+    missing = GmailApiError(502, "Missing batch response part")
+    results = [GmailBatchResponse(502, error=missing) for _ in range(count)]
+    text = content.decode("utf-8").replace("\r\n", "\n").replace("\n", "\r\n")
+    for part in text.split(f"--{boundary}"):
+        part = part.strip("\r\n")
+        if not part or part == "--":
+            continue
+        outer_lines, inner = _split_head(part)
+        content_id = _parse_headers(outer_lines).get("content-id", "")
+        index = content_id.strip("<>").rsplit("item", 1)[-1]
+        if not index.isdigit() or int(index) >= count:
+            continue
+        inner_lines, body = _split_head(inner)
+        try:
+            status_code = int(inner_lines[0].split(" ")[1])
+        except (IndexError, ValueError):
+            status_code = 502
+        body_bytes = body.strip().encode("utf-8")
+        if 200 <= status_code < 300:
+            data = json.loads(body_bytes) if body_bytes else {}
+            results[int(index)] = GmailBatchResponse(status_code, data=data)
+        else:
+            error = _error_from_response(status_code, _parse_headers(inner_lines[1:]),
+                                         body_bytes)
+            results[int(index)] = GmailBatchResponse(status_code, error=error)
+    return results
+
+
+def is_rate_limit_error(error: GmailApiError) -> bool:
+    return error.status_code == 429 or (error.status_code == 403
+                                        and error.reason in RATE_LIMIT_REASONS)
+
+
+# Process-wide quota buckets shared by every client; None when disabled
+gmail_rate_limiter = QuotaLimiter(
+    user_rate=GMAIL_USER_QUOTA_PER_SECOND,
+    project_rate=GMAIL_PROJECT_QUOTA_PER_SECOND,
+) if GMAIL_RATE_LIMIT_ENABLED else None
+if gmail_rate_limiter:
+    register_metrics("gmail_quota", gmail_rate_limiter.stats)
+
+
+class AsyncGmailClient:
+    """
+    Gmail REST client for one user.
+
+    Args:
+        email (str): the user the client acts for
+        token_provider (callable): ``async (force_refresh: bool) -> str``
+            returning an OAuth access token for the user
+        rate_limiter (QuotaLimiter): quota buckets consulted before every
+            call; defaults to the shared ``gmail_rate_limiter``
+    """
+
+    def __init__(self, email: str, token_provider, rate_limiter: QuotaLimiter = None):
+        self.email = email
+        self._token_provider = token_provider
+        self._rate_limiter = rate_limiter or gmail_rate_limiter
+
+    def _report_rate_limited(self, retry_after: float = None):
+        if self._rate_limiter:
+            self._rate_limiter.rate_limited_by_server(self.email, retry_after)
+
+    async def _send(self, method: str, url: str, units: int = 0,
+                    **kwargs) -> httpx.Response:
+        if self._rate_limiter and units:
+            await self._rate_limiter.acquire(self.email, units)
+        token = await self._token_provider(False)
+        headers = {"Authorization": f"Bearer {token}", **kwargs.pop("headers", {})}
+        response = await _pooled_request(method, url, headers=headers, **kwargs)
+        if response.status_code == 401:
+            # Access token revoked or expired early: refresh once and retry
+            token = await self._token_provider(True)
+            headers["Authorization"] = f"Bearer {token}"
+            response = await _pooled_request(method, url, headers=headers, **kwargs)
+        record_response(method, url, len(response.content))
+        if response.status_code in (403, 429):
+            error = _error_from_response(response.status_code, response.headers,
+                                         response.content)
+            if is_rate_limit_error(error):
+                self._report_rate_limited(error.retry_after)
+        return response
+
+    async def execute(self, request: GmailRequest) -> dict:
+        """Run a single request and return its decoded JSON body."""
+        response = await self._send(
+            request.method,
+            GMAIL_USER_PATH + request.path,
+            units=request.units,
+            params=request.params or None,
+            json=request.body,
+        )
+        if response.status_code >= 400:
+            raise _error_from_response(response.status_code, response.headers,
+                                       response.content)
+        return response.json() if response.content else {}
+
+    async def batch(self, requests: dict) -> dict:
+        """
+        Run several requests in one multipart HTTP call.
+
+        Use ``gmail_batch.execute_batch`` for more than ``MAX_BATCH_SIZE``
+        requests or when failed items should be retried.
+
+        Args:
+            requests (dict): request_id -> GmailRequest
+
+        Returns:
+            dict: request_id -> GmailBatchResponse, in the same order
+        """
+        if not requests:
+            return {}
+        if len(requests) > MAX_BATCH_SIZE:
+            raise ValueError(f"A Gmail batch holds at most {MAX_BATCH_SIZE} requests, "
+                             f"got {len(requests)}")
+        request_ids = list(requests)
+        boundary = f"batch_{uuid.uuid4().hex}"
+        response = await self._send(
+            "POST",
+            GMAIL_BATCH_PATH,
+            units=sum(requests[r].units for r in request_ids),
+            content=build_batch_body([requests[r] for r in request_ids], boundary),
+            headers={"Content-Type": f"multipart/mixed; boundary={boundary}"},
+        )
+        if response.status_code >= 400:
+            raise _error_from_response(response.status_code, response.headers,
+                                       response.content)
+        items = parse_batch_response(response.headers.get("content-type", ""),
+                                     response.content, len(request_ids))
+        limited = [item.error for item in items
+                   if not item.ok and is_rate_limit_error(item.error)]
+        if limited:
+            self._report_rate_limited(
+                max((e.retry_after or 0 for e in limited), default=0) or None)
+        return dict(zip(request_ids, items))
+
+    async def get_profile(self, **kwargs) -> dict:
+        return await self.execute(get_profile_request(**kwargs))
+
+    async def list_history(self, start_history_id: str, **kwargs) -> dict:
+        return await self.execute(list_history_request(start_history_id, **kwargs))
+
+    async def watch(self, body: dict) -> dict:
+        return await self.execute(watch_request(body))
+
+    async def list_messages(self, **kwargs) -> dict:
+        return await self.execute(list_messages_request(**kwargs))
+
+    async def get_message(self, message_id: str, **kwargs) -> dict:
+        return await self.execute(get_message_request(message_id, **kwargs))
+
+    async def send_message(self, body: dict, **kwargs) -> dict:
+        return await self.execute(send_message_request(body, **kwargs))
+
+    async def get_thread(self, thread_id: str, **kwargs) -> dict:
+        return await self.execute(get_thread_request(thread_id, **kwargs))
+
+    async def modify_thread(self, thread_id: str, body: dict, **kwargs) -> dict:
+        return await self.execute(modify_thread_request(thread_id, body, **kwargs))
+
+    async def create_draft(self, body: dict, **kwargs) -> dict:
+        return await self.execute(create_draft_request(body, **kwargs))
+
+    async def update_draft(self, draft_id: str, body: dict, **kwargs) -> dict:
+        return await self.execute(update_draft_request(draft_id, body, **kwargs))
+
+    async def send_draft(self, body: dict, **kwargs) -> dict:
+        return await self.execute(send_draft_request(body, **kwargs))
@@ -1,11 +1,16 @@
+import asyncio
+import json
 import logging
-import re
-import base64
-from fastapi import HTTPException
-from googleapiclient.discovery import build 
-from google.oauth2.credentials import Credentials
 from google.auth.exceptions import RefreshError
-from draftly_v1.services.database import get_creds_from_db
+from draftly_v1.services.database import get_creds_from_db, access_token_store
+from draftly_v1.services.gmail_batch import execute_batch
+from draftly_v1.services.gmail_client import (AsyncGmailClient, get_message_request,
+                                              get_thread_request, modify_thread_request)
+from draftly_v1.services.prefetch_services import schedule_thread_prefetch
+from draftly_v1.services.speculative_services import schedule_speculative_drafts
+from draftly_v1.services.sync_services import (sync_inbox, iter_inbox_page,
+                                              decode_page_cursor)
+from draftly_v1.services.thread_store import thread_store
 from draftly_v1.services.utils.logger_config import setup_logging
 from fastapi import HTTPException, status
 
@@ -14,146 +19,97 @@ from fastapi import HTTPException, status
 setup_logging(logging.INFO)
 _logger = logging.getLogger(__name__)
 
-
-def get_gmail_service(user_credentials_dict):
-    creds = Credentials(**user_credentials_dict) 
-    return build('gmail', 'v1', credentials=creds)
-
-def get_user_creds(email: str):
-    user_creds = get_creds_from_db(email) 
-    try:
-        service = get_gmail_service(user_creds)
-    except Exception as e:
-        _logger.error(f"Error getting Gmail service for {email}: {str(e)}")
-        raise
-    return service
-
-async def get_subjects_batch(service, message_ids):
+# Partial response for full threads: message content without attachment metadata
+THREAD_MESSAGES_FIELDS = (
+    "messages(id,threadId,labelIds,snippet,internalDate,"
+    "payload(mimeType,filename,headers,body/data,parts))"
+)
+
+
+async def _get_access_token(email: str, force_refresh: bool = False) -> str:
+    """Return an access token for ``email`` without blocking the event loop."""
+    if force_refresh:
+        access_token_store.invalidate(email)
+    else:
+        cached = access_token_store.get(email)
+        if cached:
+            return cached[0]
+    # Cache miss: DB lookup and OAuth refresh run in a worker thread
+    creds = await asyncio.to_thread(get_creds_from_db, email)
+    return creds["token"]
+
+def get_gmail_client(email: str) -> AsyncGmailClient:
+    """Return an asyncio Gmail client for ``email`` on the process-wide HTTP pool."""
+    return AsyncGmailClient(
+        email, lambda force_refresh: _get_access_token(email, force_refresh))
+
+async def get_subjects_batch(client: AsyncGmailClient, message_ids):
     subjects = {}
-
-    #callback function to process each response in the batch
-    def callback(request_id, response, exception):
-        if exception is not None:
-            _logger.error(f"Error for {request_id}: {exception}")
-        else:
-            # Extract Subject from headers
-            headers = response.get('payload', {}).get('headers', [])
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "No Subject")
-            subjects[request_id] = subject
-
-    batch = service.new_batch_http_request(callback=callback) # batch request GmailAPI
-
-    for msg_id in message_ids:
-        batch.add(service.users().messages().get(
-            userId='me', 
-            id=msg_id, 
-            format='metadata', 
-            metadataHeaders=['Subject']
-        ), request_id=msg_id)
-
-    batch.execute()
-    
+    responses = await execute_batch(client, {
+        msg_id: get_message_request(msg_id, format='metadata',
+                                    metadata_headers=['Subject'],
+                                    fields='id,payload/headers')
+        for msg_id in message_ids
+    })
+    for request_id, item in responses.items():
+        if not item.ok:
+            _logger.error(f"Error for {request_id}: {item.error}")
+            continue
+        # Extract Subject from headers
+        headers = item.data.get('payload', {}).get('headers', [])
+        subjects[request_id] = next(
+            (h['value'] for h in headers if h['name'] == 'Subject'), "No Subject")
     return subjects
 
-def get_threads_batch(service, thread_ids):
+async def get_threads_batch(client: AsyncGmailClient, thread_ids):
     threads_results = {}
-    #callback function to process each response in the batch
-    def callback(request_id, response, exception):
-        if exception:
-            _logger.error(f"Error fetching thread {request_id}: {exception}")
-        else:
-            # response is the full Thread resource containing all messages
-            threads_results[request_id] = response.get('messages', [])
-
-    batch = service.new_batch_http_request(callback=callback)
-
-    # 3. Add each threadId to the batch
-    for t_id in thread_ids:
-        # We request the 'threads.get' method for each ID
-        batch.add(
-            service.users().threads().get(userId='me', id=t_id),
-            request_id=t_id
-        )
-
-    # 4. Execute the batch
-    batch.execute()
-
+    # One 'threads.get' per ID, sent as chunked batches
+    responses = await execute_batch(client, {
+        t_id: get_thread_request(t_id, fields=THREAD_MESSAGES_FIELDS)
+        for t_id in thread_ids
+    })
+    for request_id, item in responses.items():
+        if not item.ok:
+            _logger.error(f"Error fetching thread {request_id}: {item.error}")
+            continue
+        # response is the full Thread resource containing all messages
+        threads_results[request_id] = item.data.get('messages', [])
     return threads_results
 
-async def get_snippets_batch(user_creds, message_ids):
+async def get_snippets_batch(client: AsyncGmailClient, message_ids):
     snippet_results = {}
-    def callback(request_id, response, exception):
-        if exception:
-            _logger.error(f"Error fetching snippet for {request_id}: {exception}")
-        else:
-            snippet = response.get('snippet', '')
-            snippet_results[request_id] = snippet
-        
-    batch = user_creds.new_batch_http_request(callback=callback)    
-    for msg_id in message_ids:
-        batch.add(user_creds.users().messages().get(
-            userId='me',
-            id=msg_id,
-            format='minimal'  # minimal to get snippet
-        ), request_id=msg_id)           
-    batch.execute()
+    responses = await execute_batch(client, {
+        # minimal to get snippet
+        msg_id: get_message_request(msg_id, format='minimal', fields='id,snippet')
+        for msg_id in message_ids
+    })
+    for request_id, item in responses.items():
+        if not item.ok:
+            _logger.error(f"Error fetching snippet for {request_id}: {item.error}")
+            continue
+        snippet_results[request_id] = item.data.get('snippet', '')
     return snippet_results
 
 async def fetch_latest_email(email: str):
     _logger.info(f"Fetching latest email for user: {email[:6]}XXX")
     
-    query = "in:inbox is:unread -category:{promotions social updates forums}" #category:primary is:unread
     try:
-        user_creds = get_user_creds(email)
-        # Fetch message IDs first
-        results = user_creds.users().messages().list(userId='me', q=query, maxResults=10).execute()
-        messages = results.get('messages', [])
+        # Incremental sync: only history since the stored cursor is fetched
+        client = get_gmail_client(email)
+        records = await sync_inbox(client)
         
-        if not messages:
+        if not records:
             return {"message": "No new unread emails found."}
-        
-        # Batch fetch all message details
-        message_details = {}
-        
-        def callback(request_id, response, exception):
-            if exception:
-                _logger.error(f"Error fetching message {request_id}: {exception}")
-            else:
-                headers = response.get('payload', {}).get('headers', [])
-                message_details[request_id] = {
-                    'id': response['id'],
-                    'threadId': response['threadId'],
-                    'from': next((h['value'] for h in headers if h['name'] == 'From'), "Unknown"),
-                    'to': next((h['value'] for h in headers if h['name'] == 'To'), "Unknown"),
-                    'subject': next((h['value'] for h in headers if h['name'] == 'Subject'), "No Subject"),
-                    'snippet': response.get('snippet', '')
-                }
-        
-        batch = user_creds.new_batch_http_request(callback=callback)
-        for msg in messages:
-            batch.add(
-            user_creds.users().messages().get(
-                userId='me',
-                id=msg['id'],
-                format='metadata',
-                metadataHeaders=['From', 'To', 'Subject']
-            ),
-            request_id=msg['id']
-            )
-        batch.execute()
-
-         # Use a set avoid duplicates
-        unique_threads = set()
-        for msg in messages:
-            unique_threads.add(msg['threadId'])
-        # Sort and filter to only keep first occurrence of each thread
+
+        # Keep only the newest message of each thread
+        seen_threads = set()
         sorted_message_details = {}
-        for msg_id in message_details.keys():
-            t_id = message_details[msg_id]['threadId']
-            _logger.info(f"Processing message {msg_id} in thread {t_id}")
-            if t_id in unique_threads:
-                sorted_message_details[msg_id] = message_details[msg_id]
-                unique_threads.remove(t_id)
+        for record in records:
+            t_id = record['threadId']
+            _logger.info(f"Processing message {record['id']} in thread {t_id}")
+            if t_id not in seen_threads:
+                sorted_message_details[record['id']] = record
+                seen_threads.add(t_id)
 
         msg_thread_ids = {
             'msgId': list(sorted_message_details.keys()),
@@ -163,6 +119,9 @@ async def fetch_latest_email(email: str):
             'snippet': [m['snippet'] for m in sorted_message_details.values()],
             'toEmail': [m['to'] for m in sorted_message_details.values()]   
         }
+        # The user usually opens one of these next: warm the thread store early
+        schedule_thread_prefetch(client, msg_thread_ids['threadId'])
+        schedule_speculative_drafts(client, msg_thread_ids['threadId'])
         
         return {"messages": msg_thread_ids}
     except RefreshError:
@@ -175,80 +134,88 @@ async def fetch_latest_email(email: str):
         _logger.error(f"Error fetching latest emails for {email[:6]}XXX: {str(e)}")
         raise
 
+async def stream_inbox_page(email: str, page_size: int, cursor: str = None):
+    """
+    Stream one page of the unread inbox as NDJSON lines.
+
+    Each line is a compact message record; the last line carries
+    ``next_cursor`` for the following page (null when there is none). An
+    error after streaming started is reported as a final ``error`` line.
+
+    Raises:
+        InvalidCursorError: If ``cursor`` cannot be decoded (checked before
+            anything is streamed)
+    """
+    _logger.info(f"Streaming inbox page for user: {email[:6]}XXX")
+    decode_page_cursor(cursor)
+    client = get_gmail_client(email)
+
+    async def lines():
+        try:
+            async for item in iter_inbox_page(client, page_size, cursor):
+                yield json.dumps(item) + "\n"
+        except Exception as e:
+            _logger.error(f"Error streaming inbox page for {email[:6]}XXX: {str(e)}")
+            yield json.dumps({"error": "Error fetching emails"}) + "\n"
+
+    return lines()
+
 async def fetch_email_thread_by_id(email: str, thread_id: str):
     _logger.info(f"Fetching email thread for user: {email[:6]}XXX, Thread ID: {thread_id}")
-    user_creds = get_user_creds(email)
+    client = get_gmail_client(email)
     try:
-        # Use format='full' to get complete message data without marking as read
-        thread = user_creds.users().threads().get(
-            userId='me', 
-            id=thread_id,
-            format='full'
-        ).execute()
+        # Served from the thread store unless the thread's historyId changed
+        thread = await thread_store.get(client, thread_id)
     except Exception as e:
         _logger.error(f"Error fetching email thread {thread_id} for {email[:6]}XXX: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching email thread: {str(e)}")
-    
-    messages = thread.get('messages', [])
 
-    llm_context = []
-    
-
-    for idx, msg in enumerate(messages):
-        parts = msg.get('payload', {}).get('parts', [])
-        body = ""
-        if parts:
-            for part in parts:
-                
-                    if part.get('mimeType') == 'text/html':
-                        data = part.get('body', {}).get('data', '')
-                        if data:
-                            if idx == len(messages) - 1: 
-                                # keep only the data before gmail_quote
-                                cleaned_data = re.split(r'<div class="gmail_quote', base64.urlsafe_b64decode(data).decode('utf-8'))[0]
-                                cleaned_data = re.sub(r'[\r\n\t]+', ' ', cleaned_data).strip()
-                                body += cleaned_data
-                                
-                            else:
-                                body += base64.urlsafe_b64decode(data).decode('utf-8')
-                                body = re.sub(r'[\r\n\t]+', ' ', body).strip()
-                    else:
-                        pass
-        else:
-            data = msg.get('payload', {}).get('body', {}).get('data', '')
-            if data:
-                body += base64.urlsafe_b64decode(data).decode('utf-8')
-                body = re.sub(r'[\r\n\t]+', ' ', body).strip()
-        
-        llm_context.append({
-                "message_id": msg['id'],
-                "from": next((h['value'] for h in msg.get('payload', {}).get('headers', []) if h['name'] == 'From'), "Unknown Sender"),
-                "to": next((h['value'] for h in msg.get('payload', {}).get('headers', []) if h['name'] == 'To'), "Unknown Recipient"),
-                "date": next((h['value'] for h in msg.get('payload', {}).get('headers', []) if h['name'] == 'Date'), "Unknown Date"),
-                "subject": next((h['value'] for h in msg.get('payload', {}).get('headers', []) if h['name'] == 'Subject'), "No Subject"),
-                "body": body
-        })
-    
     # Reverse the order so LLM reads oldest to newest
-    llm_context.reverse()
-    
+    llm_context = list(reversed(thread["messages"]))
+
     _logger.info(f"Fetched messages in thread {thread_id} for user {email[:6]}XXX")
     _logger.debug(f"Fetched {llm_context} messages in thread {thread_id} for user {email[:6]}XXX")
 
-    return {"thread_id": thread_id, "llm_context": llm_context}
+    return {"thread_id": thread_id, "history_id": thread["history_id"],
+            "llm_context": llm_context, "reply_headers": thread["reply_headers"]}
 
-def mark_thread_as_read(email: str, thread_id: str) -> bool:
+async def mark_thread_as_read(email: str, thread_id: str) -> bool:
     """Removes the 'UNREAD' label from all messages in the thread."""
-    user_cred = get_user_creds(email)
+    client = get_gmail_client(email)
     try:
-        user_cred.users().threads().modify(
-            userId='me',
-            id=thread_id,
+        await client.modify_thread(
+            thread_id,
             body={
                 'removeLabelIds': ['UNREAD']  #mark as read
-            }
-        ).execute()
+            },
+            fields='id'
+        )
         return True
     except Exception as e:
         _logger.error(f"Failed to mark thread as read: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+async def mark_threads_as_read(email: str, thread_ids: list) -> dict:
+    """
+    Removes the 'UNREAD' label from several threads with batched modify calls.
+
+    Returns a dict mapping thread_id -> success.
+    """
+    if not thread_ids:
+        return {}
+    client = get_gmail_client(email)
+    try:
+        responses = await execute_batch(client, {
+            thread_id: modify_thread_request(thread_id,
+                                             body={'removeLabelIds': ['UNREAD']},
+                                             fields='id')
+            for thread_id in dict.fromkeys(thread_ids)
+        })
+    except Exception as e:
+        _logger.error(f"Failed to mark threads as read: {e}")
+        return {thread_id: False for thread_id in thread_ids}
+    for thread_id, item in responses.items():
+        if not item.ok:
+            _logger.error(f"Failed to mark thread {thread_id} as read: {item.error}")
+    return {thread_id: item.ok for thread_id, item in responses.items()}
@@ -0,0 +1,138 @@
+"""Process-wide pooled HTTP transport for the blocking Google clients"""
+import logging
+import threading
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth.transport.requests import Request as GoogleAuthRequest
+from google_auth_httplib2 import AuthorizedHttp
+from draftly_v1.config import (GOOGLE_HTTP_POOL_CONNECTIONS, GOOGLE_HTTP_POOL_MAXSIZE,
+                               GOOGLE_HTTP_TIMEOUT)
+from draftly_v1.services.utils.metrics import register_metrics
+
+_logger = logging.getLogger(__name__)
+
+# Google only compresses responses for clients whose User-Agent contains "gzip"
+USER_AGENT = "draftly-v1 (gzip)"
+DEFAULT_HEADERS = {"Accept-Encoding": "gzip", "User-Agent": USER_AGENT}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Return the shared keep-alive ``requests`` session for blocking Google calls."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=GOOGLE_HTTP_POOL_CONNECTIONS,
+                                      pool_maxsize=GOOGLE_HTTP_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(DEFAULT_HEADERS)
+                _session = session
+    return _session
+
+
+def close_http_session():
+    """Close the pooled connections (called on application shutdown)."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+class PooledHttp:
+    """
+    ``httplib2.Http`` look-alike backed by the shared ``requests`` session.
+
+    ``googleapiclient`` and ``google_auth_httplib2`` only need ``request()``
+    returning ``(httplib2.Response, bytes)``. Unlike ``httplib2.Http`` the
+    session is safe to share between threads and keeps a pool of keep-alive
+    connections per host, so building a service no longer means a new TLS
+    handshake on every request.
+    """
+
+    redirect_codes = httplib2.Http().redirect_codes
+    follow_redirects = True
+    connections = {}
+
+    def __init__(self, timeout: float = GOOGLE_HTTP_TIMEOUT):
+        self.timeout = timeout
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5,
+                connection_type=None):
+        response = get_http_session().request(method, uri, data=body, headers=headers,
+                                              timeout=self.timeout,
+                                              allow_redirects=redirections > 0)
+        # requests already decoded gzip; the lengths and encoding no longer
+        # describe the content
+        info = {k: v for k, v in response.headers.items()
+                if k.lower() not in ("content-encoding", "content-length")}
+        info["status"] = str(response.status_code)
+        return httplib2.Response(info), response.content
+
+    def add_certificate(self, key, cert, domain, password=None):
+        """
+        Present a client certificate, like ``httplib2.Http.add_certificate``.
+
+        The certificate is set on the shared session, so unlike httplib2 it
+        is sent to every host, whatever ``domain`` says.
+
+        Raises:
+            ValueError: If ``password`` is given; requests cannot load
+                encrypted keys, so decrypt the key file first
+        """
+        if password is not None:
+            raise ValueError("Password-protected client keys are not supported; "
+                             "pass a decrypted key file")
+        get_http_session().cert = (cert, key)
+
+    def close(self):
+        """Connections belong to the shared pool and are kept open."""
+
+
+_pooled_http = PooledHttp()
+
+
+def get_pooled_http() -> PooledHttp:
+    return _pooled_http
+
+
+def authorized_http(credentials) -> AuthorizedHttp:
+    """Authorized transport for ``googleapiclient`` builds on the shared pool."""
+    return AuthorizedHttp(credentials, http=_pooled_http)
+
+
+def google_auth_request() -> GoogleAuthRequest:
+    """google-auth transport (token refresh, id tokens) over the shared pool."""
+    return GoogleAuthRequest(session=get_http_session())
+
+
+def get_transport_stats() -> dict:
+    """
+    Requests and connections opened per host; reuse is the share of requests
+    sent on an existing connection.
+    """
+    report = {}
+    if _session is None:
+        return report
+    for adapter in {id(a): a for a in _session.adapters.values()}.values():
+        for key in adapter.poolmanager.pools.keys():
+            pool = adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            requests_made = pool.num_requests
+            report[f"{pool.scheme}://{pool.host}"] = {
+                "requests": requests_made,
+                "connections_opened": pool.num_connections,
+                "reuse_ratio": (round(1 - pool.num_connections / requests_made, 3)
+                                if requests_made else 0.0),
+            }
+    return report
+
+
+register_metrics("google_http", get_transport_stats)
@@ -1,12 +1,23 @@
+import hashlib
 import html
 import logging
 import os
 import re
+import threading
+import httpx
 from dotenv import load_dotenv
-from draftly_v1.services.database import get_db_session
+from draftly_v1.config import (GROQ_MODEL_NAME, LLM_TEMPERATURE, LLM_MAX_TOKENS,
+                               LLM_HTTP_POOL_MAXSIZE, LLM_HTTP_TIMEOUT,
+                               LLM_MAX_CONCURRENCY, LLM_MAX_PER_USER,
+                               CLEAN_HTML_CACHE_MAX_BYTES)
+from draftly_v1.services.context_builder import context_builder
+from draftly_v1.services.draft_cache import draft_cache, draft_cache_key
 from draftly_v1.services.utils.logger_config import setup_logging
-from langchain_groq import ChatGroq  
-from langchain_core.prompts import PromptTemplate 
+from draftly_v1.services.utils.metrics import register_metrics
+from draftly_v1.services.utils.scheduler import FairScheduler, PRIORITY_INTERACTIVE
+from draftly_v1.services.utils.ttl_cache import TTLCache
+from langchain_groq import ChatGroq
+from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
 load_dotenv()
@@ -15,18 +26,9 @@ setup_logging(logging.INFO)
 _logger = logging.getLogger(__name__)
 
 api_key = os.getenv("GROQ_API_KEY")
-llm_model = os.getenv("GROQ_MODEL_NAME", "insta")
 
-llm = ChatGroq(model=llm_model,
-            temperature=0.7,
-            max_tokens=512,
-            api_key=api_key) 
-
-def generate_draft(email_context, user_style: str, sender_name: str = None) -> str:
-    _logger.debug(f"Generating draft with context: {email_context} and style: {user_style}")
-    llm = ChatGroq(model="llama-3.3-70b-versatile")
-    
-    prompt = PromptTemplate.from_template("""
+# Parsed once at import; chains built from it are cached per LLM client
+DRAFT_PROMPT = PromptTemplate.from_template("""
     You are an AI assistant helping a user draft an email reply.
     
     User's preferred style: {user_style}
@@ -53,21 +55,217 @@ def generate_draft(email_context, user_style: str, sender_name: str = None) -> s
 
     Generate the email draft now:
     """)
-    
-    chain = prompt | llm | StrOutputParser() # chain composition using pipe operator
-    response = chain.invoke({
-        "user_style": user_style, 
-        "email_context": formatted_context(email_context), 
+
+
+class LLMClientRegistry:
+    """
+    Process-wide ChatGroq clients, one per ``(model, temperature, max_tokens)``.
+
+    Every client shares one keep-alive ``httpx`` pool (sync and async), so
+    drafts reuse open TLS connections to the LLM API instead of paying a
+    handshake per call, and the client and its chains are built once.
+
+    Args:
+        pool_maxsize (int): keep-alive connections kept to the LLM API
+        timeout (float): request timeout in seconds
+    """
+
+    def __init__(self, pool_maxsize: int = 20, timeout: float = 60):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self._clients = {}
+        self._chains = {}
+        self._http = None
+        self._async_http = None
+        self._lock = threading.Lock()
+        self.created = 0
+        self.hits = 0
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(max_connections=self.pool_maxsize,
+                            max_keepalive_connections=self.pool_maxsize)
+
+    def _http_clients(self):
+        if self._http is None:
+            self._http = httpx.Client(limits=self._limits(), timeout=self.timeout)
+            self._async_http = httpx.AsyncClient(limits=self._limits(),
+                                                 timeout=self.timeout)
+        return self._http, self._async_http
+
+    def get(self, model: str = None, temperature: float = None,
+            max_tokens: int = None) -> ChatGroq:
+        """Shared client for the given parameters (defaults: GROQ_MODEL_NAME, LLM_*)."""
+        key = (model or GROQ_MODEL_NAME,
+               LLM_TEMPERATURE if temperature is None else temperature,
+               LLM_MAX_TOKENS if max_tokens is None else max_tokens)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.hits += 1
+                return client
+            http_client, async_http_client = self._http_clients()
+            client = ChatGroq(model=key[0],
+                              temperature=key[1],
+                              max_tokens=key[2],
+                              api_key=api_key,
+                              http_client=http_client,
+                              http_async_client=async_http_client)
+            self._clients[key] = client
+            self.created += 1
+            _logger.info(f"Created LLM client for model {key[0]}")
+            return client
+
+    def chain(self, prompt: PromptTemplate, **params):
+        """``prompt | llm | StrOutputParser()`` composed once per prompt and client."""
+        llm = self.get(**params)
+        key = (id(prompt), id(llm))
+        chain = self._chains.get(key)
+        if chain is None:
+            chain = prompt | llm | StrOutputParser()
+            self._chains[key] = chain
+        return chain
+
+    def clear(self):
+        """Forget the clients and chains (the HTTP pool is kept)."""
+        with self._lock:
+            self._clients.clear()
+            self._chains.clear()
+
+    async def close(self):
+        """Release the pooled connections."""
+        self.clear()
+        http_client, async_http_client = self._http, self._async_http
+        self._http = self._async_http = None
+        if http_client is not None:
+            http_client.close()
+            await async_http_client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "chains": len(self._chains),
+            "created": self.created,
+            "hits": self.hits,
+        }
+
+
+llm_clients = LLMClientRegistry(pool_maxsize=LLM_HTTP_POOL_MAXSIZE,
+                                timeout=LLM_HTTP_TIMEOUT)
+register_metrics("llm_clients", llm_clients.stats)
+
+
+def get_draft_chain():
+    """The draft chain for the configured model, built on first use and then shared."""
+    return llm_clients.chain(DRAFT_PROMPT)
+
+
+# Every LLM call of the app goes through this: interactive drafts run ahead of
+# background work
+llm_scheduler = FairScheduler(max_concurrency=LLM_MAX_CONCURRENCY,
+                              max_per_user=LLM_MAX_PER_USER)
+register_metrics("llm_scheduler", llm_scheduler.stats)
+
+
+def _draft_variables(email_context, user_style: str, sender_name: str = None) -> dict:
+    return {
+        "user_style": user_style,
+        "email_context": formatted_context(email_context),
         "sender_name": sender_name or "User"
-    })
-    return response
+    }
+
+
+def _cache_key(variables: dict) -> str:
+    """Draft cache key of the prompt the configured model would receive."""
+    return draft_cache_key(DRAFT_PROMPT.format(**variables), GROQ_MODEL_NAME,
+                           LLM_TEMPERATURE)
+
+
+def generate_draft(email_context, user_style: str, sender_name: str = None) -> str:
+    """Blocking draft generation for scripts; handlers use ``agenerate_draft``."""
+    _logger.debug(f"Generating draft with context: {email_context} "
+                  f"and style: {user_style}")
+    return get_draft_chain().invoke(
+        _draft_variables(email_context, user_style, sender_name))
+
+
+async def agenerate_draft(email_context, user_style: str, sender_name: str = None,
+                          user: str = None, priority: int = PRIORITY_INTERACTIVE,
+                          force_fresh: bool = False) -> str:
+    """
+    Generate a draft without blocking the event loop, after waiting for an
+    ``llm_scheduler`` slot. An identical earlier prompt is answered from
+    ``draft_cache`` unless ``force_fresh`` is set.
+
+    Args:
+        user (str): whose request this is, for per-user fairness
+            (defaults to ``sender_name``)
+        priority (int): PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND
+        force_fresh (bool): always call the LLM (a real regeneration)
+    """
+    _logger.debug(f"Generating draft with context: {email_context} "
+                  f"and style: {user_style}")
+    variables = _draft_variables(email_context, user_style, sender_name)
+    key = _cache_key(variables)
+    if not force_fresh:
+        cached = await draft_cache.get(key)
+        if cached is not None:
+            return cached
+    async with llm_scheduler.slot(user or sender_name or "", priority):
+        draft = await get_draft_chain().ainvoke(variables)
+    await draft_cache.set(key, GROQ_MODEL_NAME, draft)
+    return draft
+
+
+async def stream_draft(email_context, user_style: str, sender_name: str = None,
+                       user: str = None, priority: int = PRIORITY_INTERACTIVE,
+                       force_fresh: bool = False):
+    """
+    Async generator yielding the draft in chunks as the model produces them.
+
+    A cached draft for the same prompt is yielded as one chunk unless
+    ``force_fresh`` is set; a completed generation is cached. The
+    ``llm_scheduler`` slot is held until the stream ends. Closing the
+    generator (e.g. when the browser disconnects) closes the underlying
+    HTTP stream, which stops the generation and frees the slot.
+    """
+    _logger.debug(f"Streaming draft with context: {email_context} "
+                  f"and style: {user_style}")
+    variables = _draft_variables(email_context, user_style, sender_name)
+    key = _cache_key(variables)
+    if not force_fresh:
+        cached = await draft_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    async with llm_scheduler.slot(user or sender_name or "", priority):
+        async for chunk in get_draft_chain().astream(variables):
+            if chunk:
+                parts.append(chunk)
+                yield chunk
+    await draft_cache.set(key, GROQ_MODEL_NAME, "".join(parts))
+
+
+# Bodies cleaned during thread prefetch are free when the draft is generated.
+# Keyed by a digest of the body and bounded in bytes, so large threads cannot
+# pin memory.
+_cleaned_html = TTLCache(maxsize=4096, ttl=3600, max_bytes=CLEAN_HTML_CACHE_MAX_BYTES)
+register_metrics("clean_html_cache", _cleaned_html.stats)
 
 
 def clean_html_for_llm(html_content: str) -> str:
     """Convert HTML content to clean text for LLM processing"""
     if not html_content or not isinstance(html_content, str):
         return html_content
-    
+    key = hashlib.sha256(html_content.encode("utf-8", "surrogatepass")).digest()
+    text = _cleaned_html.get(key)
+    if text is None:
+        text = _clean_html(html_content)
+        _cleaned_html.set(key, text)
+    return text
+
+
+def _clean_html(html_content: str) -> str:
     # Remove HTML tags
     text = re.sub(r'<script[^>]*>.*?</script>', '', html_content, flags=re.DOTALL | re.IGNORECASE)
     text = re.sub(r'<style[^>]*>.*?</style>', '', text, flags=re.DOTALL | re.IGNORECASE)
@@ -83,40 +281,30 @@ def clean_html_for_llm(html_content: str) -> str:
     return text
 
  # Format email thread context for better LLM understanding
-def formatted_context(email_context) -> str:
-    """Format email thread context for better LLM understanding"""
+def _render_message(msg: dict, body: str) -> str:
+    return (f"From: {msg.get('from', 'Unknown')}\n"
+            f"To: {msg.get('to', 'Unknown')}\n"
+            f"Date: {msg.get('date', 'Unknown')}\n"
+            f"Subject: {msg.get('subject', 'No Subject')}\n"
+            f"Content: {body}\n")
+
+
+def formatted_context(email_context, record: bool = True) -> str:
+    """
+    Format email thread context for better LLM understanding.
+
+    Threads are fitted to LLM_CONTEXT_TOKEN_BUDGET by ``context_builder``:
+    the latest email is kept in full, older ones are shortened or dropped.
+    """
     _logger.debug(f"Formatting context: {type(email_context)}")
-    formatted_text = ""
     
     # Handle different input types
     if isinstance(email_context, str):
-        return formatted_context(clean_html_for_llm(email_context))
-    elif isinstance(email_context, list) and len(email_context) > 0:
-        # Check if list contains dictionaries or strings
-        if isinstance(email_context[0], dict):
-            # Process previous emails in the thread (if any)
-            if len(email_context) > 1:
-                formatted_text += "=== PREVIOUS EMAIL THREAD (for context only) ===\n\n"
-                for idx, msg in enumerate(email_context[1:]):
-                    formatted_text += f"Email #{idx + 1}:\n"
-                    formatted_text += f"From: {msg.get('from', 'Unknown')}\n"
-                    formatted_text += f"To: {msg.get('to', 'Unknown')}\n"
-                    formatted_text += f"Date: {msg.get('date', 'Unknown')}\n"
-                    formatted_text += f"Subject: {msg.get('subject', 'No Subject')}\n"
-                    formatted_text += f"Content: {clean_html_for_llm(msg.get('body', ''))}\n\n"
-            
-            # Process the latest email that needs a response
-            latest_msg = email_context[0]
-            formatted_text += "=== LATEST EMAIL (Reply to this) ===\n\n"
-            formatted_text += f"From: {latest_msg.get('from', 'Unknown')}\n"
-            formatted_text += f"To: {latest_msg.get('to', 'Unknown')}\n"
-            formatted_text += f"Date: {latest_msg.get('date', 'Unknown')}\n"
-            formatted_text += f"Subject: {latest_msg.get('subject', 'No Subject')}\n"
-            formatted_text += f"Content: {clean_html_for_llm(latest_msg.get('body', ''))}\n"
-        else:
-            # List contains strings or other types
-            formatted_text = str(email_context)
-    else:
-        formatted_text = str(email_context)
-    
-    return formatted_text
\ No newline at end of file
+        return clean_html_for_llm(email_context)
+    if (isinstance(email_context, list) and len(email_context) > 0
+            and isinstance(email_context[0], dict)):
+        text, _ = context_builder.build(email_context, _render_message,
+                                        clean_html_for_llm, record=record)
+        return text
+    # List contains strings or other types
+    return str(email_context)
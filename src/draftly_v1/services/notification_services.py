@@ -0,0 +1,183 @@
+"""Gmail push notifications: decode, coalesce into per-user syncs, fan out to SSE"""
+import asyncio
+import base64
+import json
+import logging
+import time
+from draftly_v1.config import GMAIL_PUBSUB_TOPIC, NOTIFY_COALESCE_SECONDS
+from draftly_v1.services.gmail_services import fetch_latest_email, get_gmail_client
+from draftly_v1.services.utils.logger_config import setup_logging
+from draftly_v1.services.utils.metrics import register_metrics
+
+setup_logging(logging.INFO)
+_logger = logging.getLogger(__name__)
+
+WATCH_RENEW_SECONDS = 24 * 3600  # Gmail watches expire after 7 days; renew daily
+SUBSCRIBER_QUEUE_SIZE = 10
+
+
+def decode_push_notification(envelope: dict):
+    """
+    Decode a Pub/Sub push envelope carrying a Gmail notification.
+
+    Returns:
+        tuple: (email_address, history_id)
+
+    Raises:
+        ValueError: If the envelope is not a Gmail push notification
+    """
+    try:
+        data = envelope["message"]["data"]
+        payload = json.loads(base64.b64decode(data).decode("utf-8"))
+        return payload["emailAddress"], str(payload["historyId"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid push notification: {str(e)}")
+
+
+def build_push_envelope(email: str, history_id, message_id: str = "local-1") -> dict:
+    """Build a Pub/Sub push envelope the way Google delivers Gmail notifications."""
+    data = json.dumps({"emailAddress": email, "historyId": int(history_id)})
+    return {
+        "message": {
+            "data": base64.b64encode(data.encode("utf-8")).decode("ascii"),
+            "messageId": message_id,
+            "publishTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "subscription": "projects/local/subscriptions/draftly-local",
+    }
+
+
+class LocalPushPublisher:
+    """
+    Stand-in for Pub/Sub that posts Gmail-style notifications to the webhook.
+
+    Args:
+        http_client: any client with a ``post(url, json=...)`` method, e.g.
+            fastapi.testclient.TestClient or httpx.Client
+        endpoint (str): webhook path or URL
+        token (str): the webhook's PUBSUB_VERIFICATION_TOKEN
+    """
+
+    def __init__(self, http_client, endpoint: str = "/notifications/gmail",
+                 token: str = None):
+        self.http_client = http_client
+        self.endpoint = endpoint
+        self.token = token
+        self._sequence = 0
+
+    def publish(self, email: str, history_id):
+        self._sequence += 1
+        envelope = build_push_envelope(email, history_id,
+                                       message_id=f"local-{self._sequence}")
+        params = {"token": self.token} if self.token else None
+        return self.http_client.post(self.endpoint, json=envelope, params=params)
+
+
+class InboxNotifier:
+    """
+    Turn push notifications into at most one in-flight sync per user and
+    fan the result out to that user's connected browsers.
+
+    Notifications arriving within ``coalesce_window`` seconds of each other
+    share one sync; notifications that arrive while a sync is running cause
+    exactly one follow-up sync.
+
+    Args:
+        sync_fn (callable): ``async (email) -> dict`` producing the payload
+            pushed to subscribers
+        coalesce_window (float): seconds to wait for more notifications
+    """
+
+    def __init__(self, sync_fn, coalesce_window: float = 2.0):
+        self._sync_fn = sync_fn
+        self.coalesce_window = coalesce_window
+        self._subscribers = {}
+        self._pending = {}
+        self._dirty = set()
+        self.notifications = 0
+        self.syncs = 0
+
+    def subscribe(self, email: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(email, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, email: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(email)
+        if queues:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[email]
+
+    def has_subscribers(self, email: str) -> bool:
+        return bool(self._subscribers.get(email))
+
+    def publish(self, email: str, payload: dict):
+        for queue in list(self._subscribers.get(email, ())):
+            if queue.full():
+                # A slow client only needs the latest inbox state
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+    def notify(self, email: str, history_id: str = None):
+        """Schedule a coalesced sync for ``email``."""
+        self.notifications += 1
+        if not self.has_subscribers(email):
+            _logger.debug(f"No open streams for {email[:6]}XXX, skipping push sync")
+            return
+        if email in self._pending:
+            self._dirty.add(email)
+            return
+        self._pending[email] = asyncio.create_task(self._run(email))
+
+    async def _run(self, email: str):
+        try:
+            while True:
+                await asyncio.sleep(self.coalesce_window)
+                self._dirty.discard(email)
+                try:
+                    payload = await self._sync_fn(email)
+                    self.syncs += 1
+                    self.publish(email, payload)
+                except Exception as e:
+                    _logger.error(f"Push sync failed for {email[:6]}XXX: {str(e)}")
+                if email not in self._dirty:
+                    break
+        finally:
+            self._pending.pop(email, None)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": sum(len(q) for q in self._subscribers.values()),
+            "pending_syncs": len(self._pending),
+            "notifications": self.notifications,
+            "syncs": self.syncs,
+        }
+
+
+inbox_notifier = InboxNotifier(fetch_latest_email,
+                               coalesce_window=NOTIFY_COALESCE_SECONDS)
+register_metrics("inbox_notifier", inbox_notifier.stats)
+
+_watch_renewed_at = {}
+
+
+async def ensure_inbox_watch(email: str) -> bool:
+    """Register (or renew) the Gmail push watch for ``email`` if a topic is set."""
+    if not GMAIL_PUBSUB_TOPIC:
+        return False
+    renewed_at = _watch_renewed_at.get(email, float("-inf"))
+    if time.monotonic() - renewed_at < WATCH_RENEW_SECONDS:
+        return True
+    try:
+        await get_gmail_client(email).watch({
+            "topicName": GMAIL_PUBSUB_TOPIC,
+            "labelIds": ["INBOX"],
+            "labelFilterBehavior": "include",
+        })
+        _watch_renewed_at[email] = time.monotonic()
+        _logger.info(f"Gmail watch registered for {email[:6]}XXX")
+        return True
+    except Exception as e:
+        _logger.error(f"Failed to register Gmail watch for {email[:6]}XXX: {str(e)}")
+        return False
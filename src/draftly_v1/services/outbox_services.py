@@ -0,0 +1,280 @@
+"""Durable outbox: replies queued by /email/send, saved or sent by background workers"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from google.auth.exceptions import RefreshError
+from draftly_v1.config import (OUTBOX_WORKERS, OUTBOX_MAX_ATTEMPTS, OUTBOX_BACKOFF_BASE,
+                               OUTBOX_BACKOFF_MAX, OUTBOX_POLL_SECONDS,
+                               IDEMPOTENCY_KEY_TTL)
+from draftly_v1.services.database import (enqueue_outbox_job, claim_outbox_jobs,
+                                          finish_outbox_job,
+                                          requeue_running_outbox_jobs,
+                                          delete_thread_context, save_gmail_draft_id)
+from draftly_v1.services.email_services import (create_gmail_draft, send_gmail_draft,
+                                                SendUnconfirmedError)
+from draftly_v1.services.gmail_batch import is_retryable
+from draftly_v1.services.gmail_client import GmailApiError
+from draftly_v1.services.gmail_services import mark_thread_as_read
+from draftly_v1.services.utils.logger_config import setup_logging
+from draftly_v1.services.utils.metrics import register_metrics
+
+setup_logging(logging.INFO)
+_logger = logging.getLogger(__name__)
+
+# UNKNOWN: a send Gmail did not confirm, never retried as the message may have gone out
+OUTBOX_FINAL_STATUSES = {"DONE", "FAILED", "UNKNOWN"}
+
+
+class IdempotencyKeyReuseError(ValueError):
+    """An Idempotency-Key was sent again with a different request"""
+
+
+def request_fingerprint(thread_id: str, recipient_email: str, draft_body: str,
+                        draft_only: bool) -> str:
+    """Hash of what a queued reply would do, compared when a key is reused."""
+    payload = json.dumps([thread_id, recipient_email, draft_body, bool(draft_only)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """Whether a retry cannot help (revoked auth, bad request, empty thread)."""
+    if isinstance(error, RefreshError):
+        return True
+    if isinstance(error, GmailApiError):
+        return not is_retryable(error)
+    if isinstance(error, HTTPException):
+        return error.status_code < 500
+    return isinstance(error, ValueError)
+
+
+async def deliver_reply(job: dict) -> dict:
+    """Save or send one queued reply; returns the ids Gmail assigned."""
+    email, thread_id = job["user_email"], job["thread_id"]
+    if job["draft_only"]:
+        response = await create_gmail_draft(email, job["recipient_email"], thread_id,
+                                            job["draft_body"])
+        result = {"draft_id": response.get("id")}
+    else:
+        response = await send_gmail_draft(email, job["recipient_email"], thread_id,
+                                          job["draft_body"])
+        result = {"message_id": response.get("id")}
+
+    # Gmail has the reply now: bookkeeping failures must not make the job retry
+    # (and send twice)
+    await mark_thread_as_read(email, thread_id)
+    if job["draft_only"]:
+        # Keep the draft open so the next save updates this Gmail draft instead
+        # of adding one
+        saved = await asyncio.to_thread(save_gmail_draft_id, email, thread_id,
+                                        response.get('id'), job["draft_body"])
+    else:
+        saved = await asyncio.to_thread(delete_thread_context, email, thread_id,
+                                        response.get('id'))
+    if not saved:
+        _logger.warning(f"No open draft context to update for thread {thread_id}")
+    return result
+
+
+class OutboxDispatcher:
+    """
+    Pool of asyncio workers draining the ``outbox_jobs`` table.
+
+    Jobs are claimed from the database, so queued replies survive restarts
+    and several processes can share the table. Only the oldest unfinished job
+    of a user is claimable, which keeps each user's replies in order. Failed
+    attempts are retried with jittered exponential backoff (honouring
+    ``Retry-After``) until ``max_attempts``; errors that cannot succeed on a
+    retry fail the job at once. A send Gmail did not confirm ends as
+    ``UNKNOWN`` instead of being retried into a duplicate.
+
+    Args:
+        workers (int): jobs processed concurrently
+        max_attempts (int): attempts per job, including the first
+        backoff_base (float): delay in seconds before the first retry
+        backoff_max (float): upper bound for a single delay
+        poll_interval (float): idle workers re-check the table this often,
+            picking up jobs queued by other processes
+        deliver (callable): ``async (job) -> dict`` performing one attempt
+    """
+
+    def __init__(self, workers: int = 4, max_attempts: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 60,
+                 poll_interval: float = 5, deliver=None):
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self._deliver = deliver or deliver_reply
+        self._tasks = []
+        self._wakeup = None
+        self._changed = None
+        self.enqueued = 0
+        self.replayed = 0
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self.unconfirmed = 0
+
+    def _signals(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+            self._changed = asyncio.Condition()
+        return self._wakeup, self._changed
+
+    def _wake(self):
+        self._signals()[0].set()
+
+    async def _notify_changed(self):
+        changed = self._signals()[1]
+        async with changed:
+            changed.notify_all()
+
+    async def enqueue(self, email: str, thread_id: str, recipient_email: str,
+                      draft_body: str, draft_only: bool,
+                      idempotency_key: str = None) -> dict:
+        """
+        Queue a reply and wake a worker.
+
+        A repeated ``idempotency_key`` returns the job created by the first
+        request (``replayed`` is True) without queuing anything, whether that
+        job is still in flight or already finished.
+
+        Raises:
+            RuntimeError: If the job could not be stored
+            IdempotencyKeyReuseError: If the key was used for a different reply
+        """
+        fingerprint = request_fingerprint(thread_id, recipient_email, draft_body,
+                                          draft_only)
+        job = await asyncio.to_thread(enqueue_outbox_job, email, thread_id,
+                                      recipient_email, draft_body, draft_only,
+                                      idempotency_key, fingerprint, IDEMPOTENCY_KEY_TTL)
+        if job is None:
+            raise RuntimeError("Could not queue the reply")
+        if job["replayed"]:
+            if job["request_hash"] != fingerprint:
+                raise IdempotencyKeyReuseError(
+                    "Idempotency-Key was already used for a different request")
+            self.replayed += 1
+            _logger.info(f"Idempotent replay of outbox job {job['job_id']} "
+                         f"for {email[:6]}XXX")
+            return job
+        self.enqueued += 1
+        self._wake()
+        await self._notify_changed()
+        return job
+
+    def _backoff(self, attempt: int, retry_after: float) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        return max(retry_after, random.uniform(delay / 2, delay))
+
+    async def process(self, job: dict) -> str:
+        """Run one claimed attempt and record its outcome; returns the new status."""
+        job_id, attempt = job["job_id"], job["attempts"]
+        try:
+            result = await self._deliver(job)
+        except SendUnconfirmedError as e:
+            self.unconfirmed += 1
+            status = "UNKNOWN"
+            _logger.error(f"Outbox job {job_id} for {job['user_email'][:6]}XXX not "
+                          f"confirmed by Gmail, not retrying: {str(e)}")
+            await asyncio.to_thread(finish_outbox_job, job_id, status, error=str(e))
+        except Exception as e:
+            if is_permanent_failure(e) or attempt >= self.max_attempts:
+                self.failed += 1
+                status = "FAILED"
+                _logger.error(f"Outbox job {job_id} for {job['user_email'][:6]}XXX "
+                              f"failed after {attempt} attempt(s): {str(e)}")
+                await asyncio.to_thread(finish_outbox_job, job_id, status, error=str(e))
+            else:
+                self.retried += 1
+                status = "RETRY"
+                delay = self._backoff(attempt, getattr(e, "retry_after", None) or 0.0)
+                _logger.warning(f"Outbox job {job_id} attempt {attempt} failed, "
+                                f"retrying in {delay:.1f}s: {str(e)}")
+                next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+                await asyncio.to_thread(finish_outbox_job, job_id, status, error=str(e),
+                                        next_attempt_at=next_attempt_at)
+                asyncio.get_running_loop().call_later(delay, self._wake)
+        else:
+            self.delivered += 1
+            status = "DONE"
+            await asyncio.to_thread(finish_outbox_job, job_id, status, result=result)
+            _logger.info(f"Outbox job {job_id} done for {job['user_email'][:6]}XXX")
+        await self._notify_changed()
+        # The user's next queued reply may be claimable now
+        self._wake()
+        return status
+
+    async def run_once(self) -> bool:
+        """Claim and process one job; returns False when nothing was due."""
+        jobs = await asyncio.to_thread(claim_outbox_jobs, 1)
+        if not jobs:
+            return False
+        await self.process(jobs[0])
+        return True
+
+    async def _worker(self):
+        wakeup = self._signals()[0]
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+            except Exception as e:
+                _logger.error(f"Outbox worker error: {str(e)}")
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+
+    async def start(self):
+        """Requeue jobs interrupted by a previous shutdown and start the workers."""
+        if self._tasks:
+            return
+        self._wakeup = self._changed = None
+        requeued = await asyncio.to_thread(requeue_running_outbox_jobs)
+        if requeued:
+            _logger.info(f"Requeued {requeued} interrupted outbox job(s)")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def shutdown(self):
+        """Stop the workers; a job cut off mid-attempt is retried after its lease."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def wait_for_update(self, timeout: float):
+        """Wait until any job changes state in this process, or ``timeout`` seconds."""
+        changed = self._signals()[1]
+        async with changed:
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "enqueued": self.enqueued,
+            "replayed": self.replayed,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "failed": self.failed,
+            "unconfirmed": self.unconfirmed,
+        }
+
+
+outbox_dispatcher = OutboxDispatcher(
+    workers=OUTBOX_WORKERS,
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+    backoff_base=OUTBOX_BACKOFF_BASE,
+    backoff_max=OUTBOX_BACKOFF_MAX,
+    poll_interval=OUTBOX_POLL_SECONDS,
+)
+register_metrics("outbox", outbox_dispatcher.stats)
@@ -0,0 +1,43 @@
+"""Background prefetch of inbox threads so opening one only pays for the LLM call"""
+import logging
+from draftly_v1.config import (THREAD_PREFETCH_ENABLED, THREAD_PREFETCH_MAX_THREADS,
+                               THREAD_PREFETCH_CONCURRENCY)
+from draftly_v1.services.gmail_client import AsyncGmailClient
+from draftly_v1.services.llm_services import clean_html_for_llm
+from draftly_v1.services.thread_store import thread_store
+from draftly_v1.services.utils.background import UserTaskRegistry
+from draftly_v1.services.utils.logger_config import setup_logging
+from draftly_v1.services.utils.metrics import register_metrics
+
+setup_logging(logging.INFO)
+_logger = logging.getLogger(__name__)
+
+prefetch_tasks = UserTaskRegistry(max_per_user=THREAD_PREFETCH_CONCURRENCY)
+register_metrics("thread_prefetch", prefetch_tasks.stats)
+
+
+async def prefetch_threads(client: AsyncGmailClient, thread_ids: list) -> int:
+    """
+    Fetch, parse and pre-clean ``thread_ids`` into the thread store; returns
+    how many were fetched.
+    """
+    entries = await thread_store.prefetch(client,
+                                          thread_ids[:THREAD_PREFETCH_MAX_THREADS])
+    for entry in entries:
+        for message in entry["messages"]:
+            clean_html_for_llm(message["body"])
+    if entries:
+        _logger.info(f"Prefetched {len(entries)} thread(s) for {client.email[:6]}XXX")
+    return len(entries)
+
+
+def schedule_thread_prefetch(client: AsyncGmailClient, thread_ids: list):
+    """Start a background prefetch unless disabled or the user's budget is in use."""
+    if not THREAD_PREFETCH_ENABLED or not thread_ids:
+        return None
+    return prefetch_tasks.spawn(client.email, prefetch_threads(client, thread_ids))
+
+
+def cancel_prefetch(email: str) -> int:
+    """Stop any prefetch running for ``email`` (called on logout)."""
+    return prefetch_tasks.cancel_user(email)
@@ -0,0 +1,159 @@
+"""Speculative drafts: pre-generate replies for the top unread threads after a sync"""
+import asyncio
+import logging
+import re
+from draftly_v1.config import (SPECULATIVE_DRAFTS_ENABLED, SPECULATIVE_DRAFTS_TOP_N,
+                               SPECULATIVE_TOKEN_BUDGET_PER_HOUR,
+                               SPECULATIVE_MAX_CONCURRENCY, LLM_MAX_TOKENS)
+from draftly_v1.services.context_builder import count_tokens
+from draftly_v1.services.database import (get_user_by_email, get_drafted_history_ids,
+                                          save_speculative_draft,
+                                          take_speculative_draft)
+from draftly_v1.services.gmail_client import AsyncGmailClient
+from draftly_v1.services.llm_services import agenerate_draft, formatted_context
+from draftly_v1.services.thread_store import thread_store
+from draftly_v1.services.utils.background import UserTaskRegistry
+from draftly_v1.services.utils.logger_config import setup_logging
+from draftly_v1.services.utils.metrics import register_metrics
+from draftly_v1.services.utils.rate_limiter import TokenBucket
+from draftly_v1.services.utils.scheduler import PRIORITY_BACKGROUND
+from draftly_v1.services.utils.ttl_cache import TTLCache
+
+setup_logging(logging.INFO)
+_logger = logging.getLogger(__name__)
+
+DEFAULT_STYLE = "Professional"
+PROMPT_OVERHEAD_TOKENS = 300  # instructions around the thread in the draft prompt
+
+
+def estimate_draft_tokens(llm_context: list) -> int:
+    """Token cost of one draft: the budgeted thread plus prompt and completion."""
+    prompt_tokens = count_tokens(formatted_context(llm_context, record=False))
+    return prompt_tokens + PROMPT_OVERHEAD_TOKENS + LLM_MAX_TOKENS
+
+
+class SpeculativeDrafter:
+    """
+    Pre-generate drafts in the background at low priority.
+
+    At most ``max_concurrency`` speculative generations run at once across
+    all users, and they wait in the LLM scheduler's background class, so
+    they never crowd out drafts a user is waiting for. Each user spends at
+    most ``token_budget_per_hour`` LLM tokens on them.
+
+    Args:
+        top_n (int): unread threads considered after each sync
+        token_budget_per_hour (int): LLM tokens per user per hour
+        max_concurrency (int): speculative generations in flight process-wide
+    """
+
+    def __init__(self, top_n: int = 3, token_budget_per_hour: int = 20000,
+                 max_concurrency: int = 1):
+        self.top_n = top_n
+        self.token_budget_per_hour = token_budget_per_hour
+        self.max_concurrency = max_concurrency
+        self.tasks = UserTaskRegistry(max_per_user=1)
+        self._budgets = TTLCache(maxsize=10000, ttl=3600)
+        self._semaphore = None
+        self.generated = 0
+        self.tokens_spent = 0
+        self.skipped_budget = 0
+        self.hits = 0
+        self.discarded = 0
+
+    def _budget(self, email: str) -> TokenBucket:
+        bucket = self._budgets.get(email)
+        if bucket is None:
+            bucket = TokenBucket(self.token_budget_per_hour / 3600,
+                                 capacity=self.token_budget_per_hour)
+            self._budgets.set(email, bucket)
+        return bucket
+
+    async def run(self, client: AsyncGmailClient, thread_ids: list) -> int:
+        """
+        Generate drafts for the first ``top_n`` threads that have neither a
+        speculative nor an opened draft for their current state; returns how
+        many.
+        """
+        email = client.email
+        thread_ids = list(dict.fromkeys(thread_ids))[:self.top_n]
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        user = await asyncio.to_thread(get_user_by_email, email)
+        if not user:
+            return 0
+        style = user.style_profile or DEFAULT_STYLE
+        drafted = await asyncio.to_thread(get_drafted_history_ids, email)
+        await thread_store.prefetch(client, thread_ids)
+
+        generated = 0
+        for thread_id in thread_ids:
+            thread = await thread_store.get(client, thread_id)
+            if str(thread["history_id"]) in drafted.get(thread_id, ()):
+                continue
+            llm_context = list(reversed(thread["messages"]))
+            cost = estimate_draft_tokens(llm_context)
+            if not self._budget(email).try_take(cost):
+                self.skipped_budget += 1
+                _logger.info(f"Speculative token budget used up for {email[:6]}XXX")
+                break
+            async with self._semaphore:
+                draft = await agenerate_draft(llm_context, style, email, user=email,
+                                              priority=PRIORITY_BACKGROUND)
+            draft = re.sub(r'[\r\n\t]+', ' ', draft).strip()
+            await asyncio.to_thread(save_speculative_draft, email, thread_id,
+                                    thread["history_id"], style, llm_context, draft)
+            self.tokens_spent += cost
+            generated += 1
+        self.generated += generated
+        return generated
+
+    def schedule(self, client: AsyncGmailClient, thread_ids: list):
+        """Start pre-generation for the user in the background unless it is running."""
+        if not thread_ids:
+            return None
+        return self.tasks.spawn(client.email, self.run(client, thread_ids))
+
+    async def take(self, email: str, thread_id: str, history_id: str,
+                   user_style: str) -> str | None:
+        """
+        Return the pre-generated draft for a thread if it was generated for
+        the thread's current ``history_id`` and ``user_style``. A stored
+        draft that does not match is discarded.
+        """
+        speculative = await asyncio.to_thread(take_speculative_draft, email, thread_id)
+        if not speculative:
+            return None
+        if (speculative["history_id"] == str(history_id)
+                and speculative["user_style"] == user_style):
+            self.hits += 1
+            return speculative["draft_content"]
+        self.discarded += 1
+        _logger.info(f"Discarded stale speculative draft for thread {thread_id}")
+        return None
+
+    def stats(self) -> dict:
+        return {
+            **self.tasks.stats(),
+            "generated": self.generated,
+            "tokens_spent": self.tokens_spent,
+            "skipped_budget": self.skipped_budget,
+            "hits": self.hits,
+            "discarded": self.discarded,
+        }
+
+
+speculative_drafter = SpeculativeDrafter(
+    top_n=SPECULATIVE_DRAFTS_TOP_N,
+    token_budget_per_hour=SPECULATIVE_TOKEN_BUDGET_PER_HOUR,
+    max_concurrency=SPECULATIVE_MAX_CONCURRENCY,
+)
+register_metrics("speculative_drafts", speculative_drafter.stats)
+
+
+def schedule_speculative_drafts(client: AsyncGmailClient, thread_ids: list):
+    """Pre-generate drafts after a sync when SPECULATIVE_DRAFTS_ENABLED is set."""
+    if not SPECULATIVE_DRAFTS_ENABLED:
+        return None
+    return speculative_drafter.schedule(client, thread_ids)
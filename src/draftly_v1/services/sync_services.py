@@ -0,0 +1,255 @@
+"""Incremental inbox sync driven by Gmail history IDs"""
+import asyncio
+import base64
+import binascii
+import json
+import logging
+from draftly_v1.config import INBOX_PAGE_CHUNK
+from draftly_v1.services.database import get_sync_cursor, save_sync_cursor
+from draftly_v1.services.gmail_batch import execute_batch
+from draftly_v1.services.gmail_client import (AsyncGmailClient, GmailApiError,
+                                              get_message_request)
+from draftly_v1.services.thread_store import thread_store
+from draftly_v1.services.utils.logger_config import setup_logging
+
+setup_logging(logging.INFO)
+_logger = logging.getLogger(__name__)
+
+# category:primary is:unread
+INBOX_QUERY = "in:inbox is:unread -category:{promotions social updates forums}"
+INBOX_MAX_RESULTS = 10
+# Labels equivalent to the -category:{...} part of INBOX_QUERY
+EXCLUDED_CATEGORY_LABELS = {"CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL",
+                            "CATEGORY_UPDATES", "CATEGORY_FORUMS"}
+HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+METADATA_HEADERS = ["From", "To", "Subject"]
+# Partial responses: only the fields message_record and the cursor logic read
+LIST_FIELDS = "messages(id,threadId),nextPageToken"
+METADATA_FIELDS = "id,threadId,labelIds,snippet,internalDate,payload/headers"
+HISTORY_FIELDS = ("historyId,nextPageToken,"
+                  "history(messagesAdded/message(id,threadId,labelIds),"
+                  "labelsAdded/message(id,threadId,labelIds),"
+                  "labelsRemoved/message(id,threadId,labelIds),"
+                  "messagesDeleted/message(id,threadId))")
+
+
+class HistoryExpiredError(Exception):
+    """The stored historyId is too old for users.history.list; a full sync is needed"""
+
+
+class InvalidCursorError(ValueError):
+    """A page cursor sent by the client could not be decoded"""
+
+
+def matches_inbox_query(label_ids) -> bool:
+    """Label-based equivalent of INBOX_QUERY, used for messages seen in history."""
+    labels = set(label_ids or [])
+    return ("INBOX" in labels and "UNREAD" in labels
+            and not labels & EXCLUDED_CATEGORY_LABELS)
+
+
+def message_record(response: dict) -> dict:
+    """Compact record for a message fetched with format='metadata'."""
+    headers = response.get('payload', {}).get('headers', [])
+    return {
+        'id': response['id'],
+        'threadId': response['threadId'],
+        'from': next((h['value'] for h in headers if h['name'] == 'From'), "Unknown"),
+        'to': next((h['value'] for h in headers if h['name'] == 'To'), "Unknown"),
+        'subject': next((h['value'] for h in headers if h['name'] == 'Subject'),
+                        "No Subject"),
+        'snippet': response.get('snippet', ''),
+        'internalDate': int(response.get('internalDate', 0) or 0),
+        'labelIds': response.get('labelIds', []),
+    }
+
+
+async def fetch_message_records(client: AsyncGmailClient, message_ids: list) -> dict:
+    """Batch fetch metadata for ``message_ids``; returns id -> record per success."""
+    responses = await execute_batch(client, {
+        msg_id: get_message_request(msg_id, format='metadata',
+                                    metadata_headers=METADATA_HEADERS,
+                                    fields=METADATA_FIELDS)
+        for msg_id in message_ids
+    })
+    records = {}
+    for request_id, item in responses.items():
+        if not item.ok:
+            _logger.error(f"Error fetching message {request_id}: {item.error}")
+            continue
+        records[request_id] = message_record(item.data)
+    return records
+
+
+async def full_sync(client: AsyncGmailClient):
+    """
+    List the inbox from scratch.
+
+    Returns:
+        tuple: (history_id, records newest first, has_more)
+    """
+    # Read the historyId first so changes made during the listing are replayed
+    # next time
+    profile = await client.get_profile(fields='historyId')
+    results = await client.list_messages(q=INBOX_QUERY, max_results=INBOX_MAX_RESULTS,
+                                         fields=LIST_FIELDS)
+    messages = results.get('messages', [])
+    records = (await fetch_message_records(client, [m['id'] for m in messages])
+               if messages else {})
+    ordered = [records[m['id']] for m in messages if m['id'] in records]
+    return profile['historyId'], ordered, bool(results.get('nextPageToken'))
+
+
+async def delta_sync(client: AsyncGmailClient, cursor: dict):
+    """
+    Apply Gmail history since ``cursor['history_id']`` to the stored snapshot.
+
+    Only messages that were added or whose labels changed are inspected, and
+    metadata is fetched only for messages not already in the snapshot.
+
+    Raises:
+        HistoryExpiredError: If Gmail no longer has history for the cursor
+    """
+    latest_labels = {}  # message id -> labelIds after the last change
+    deleted = set()
+    changed_threads = set()
+    page_token = None
+    history_id = cursor["history_id"]
+    while True:
+        try:
+            page = await client.list_history(
+                cursor["history_id"], history_types=HISTORY_TYPES,
+                page_token=page_token, fields=HISTORY_FIELDS)
+        except GmailApiError as e:
+            if e.status_code == 404:
+                raise HistoryExpiredError(str(e))
+            raise
+        history_id = page.get('historyId', history_id)
+        for entry in page.get('history', []):
+            for key in ('messagesAdded', 'labelsAdded', 'labelsRemoved'):
+                for change in entry.get(key, []):
+                    message = change.get('message', {})
+                    latest_labels[message['id']] = message.get('labelIds', [])
+                    changed_threads.add(message.get('threadId'))
+            for change in entry.get('messagesDeleted', []):
+                deleted.add(change['message']['id'])
+                changed_threads.add(change['message'].get('threadId'))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            break
+
+    # Cached parsed threads touched by these changes must be revalidated before reuse
+    for thread_id in changed_threads - {None}:
+        thread_store.mark_stale(client.email, thread_id)
+
+    if not latest_labels and not deleted:
+        return history_id, cursor["messages"], cursor["has_more"]
+
+    records = {r['id']: r for r in cursor["messages"]}
+    to_fetch = []
+    for msg_id, label_ids in latest_labels.items():
+        if msg_id in deleted or not matches_inbox_query(label_ids):
+            records.pop(msg_id, None)
+        elif msg_id in records:
+            records[msg_id]['labelIds'] = label_ids
+        else:
+            to_fetch.append(msg_id)
+    for msg_id in deleted:
+        records.pop(msg_id, None)
+
+    if to_fetch:
+        records.update(await fetch_message_records(client, to_fetch))
+
+    ordered = sorted(records.values(), key=lambda r: r.get('internalDate', 0),
+                     reverse=True)
+    has_more = cursor["has_more"] or len(ordered) > INBOX_MAX_RESULTS
+    return history_id, ordered[:INBOX_MAX_RESULTS], has_more
+
+
+async def sync_inbox(client: AsyncGmailClient) -> list:
+    """
+    Return the user's unread inbox records, newest first.
+
+    Uses the stored history cursor when there is one and falls back to a full
+    listing when there is none, when it has expired, or when removals left the
+    snapshot short while older unread mail exists.
+    """
+    email = client.email
+    cursor = await asyncio.to_thread(get_sync_cursor, email)
+    result = None
+    if cursor:
+        try:
+            result = await delta_sync(client, cursor)
+            if result[2] and len(result[1]) < INBOX_MAX_RESULTS:
+                _logger.info(f"Snapshot for {email[:6]}XXX fell short, "
+                             "running full sync")
+                result = None
+        except HistoryExpiredError:
+            _logger.info(f"History cursor expired for {email[:6]}XXX, "
+                         "running full sync")
+            result = None
+
+    if result is None:
+        result = await full_sync(client)
+        _logger.info(f"Full inbox sync for {email[:6]}XXX")
+
+    history_id, records, has_more = result
+    if (not cursor or str(history_id) != cursor["history_id"]
+            or records != cursor["messages"]):
+        await asyncio.to_thread(save_sync_cursor, email, history_id, records, has_more)
+    return records
+
+
+def encode_page_cursor(page_token: str) -> str | None:
+    """Wrap a Gmail ``nextPageToken`` in an opaque, URL-safe cursor."""
+    if not page_token:
+        return None
+    raw = json.dumps({"q": INBOX_QUERY, "t": page_token},
+                     separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_page_cursor(cursor: str) -> str | None:
+    """
+    Return the Gmail page token inside ``cursor`` (None for the first page).
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed or was issued for another query
+    """
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        page_token, query = data["t"], data["q"]
+    except (binascii.Error, ValueError, TypeError, KeyError) as e:
+        raise InvalidCursorError(f"Invalid page cursor: {str(e)}")
+    if query != INBOX_QUERY or not isinstance(page_token, str):
+        raise InvalidCursorError("Page cursor does not belong to this listing")
+    return page_token
+
+
+async def iter_inbox_page(client: AsyncGmailClient, page_size: int, cursor: str = None,
+                          chunk_size: int = INBOX_PAGE_CHUNK):
+    """
+    Lazily yield one page of the unread inbox as compact message records.
+
+    Only ids are listed up front; metadata is fetched ``chunk_size`` messages
+    at a time and each chunk is yielded before the next one is requested, so
+    a consumer that streams the records holds at most one chunk in memory.
+    The last item yielded is ``{"next_cursor": ...}``, None on the last page.
+
+    Raises:
+        InvalidCursorError: If ``cursor`` cannot be decoded
+    """
+    page_token = decode_page_cursor(cursor)
+    chunk_size = max(1, chunk_size)
+    results = await client.list_messages(q=INBOX_QUERY, max_results=page_size,
+                                         page_token=page_token, fields=LIST_FIELDS)
+    ids = [m['id'] for m in results.get('messages', [])]
+    for i in range(0, len(ids), chunk_size):
+        chunk = ids[i:i + chunk_size]
+        records = await fetch_message_records(client, chunk)
+        for msg_id in chunk:
+            if msg_id in records:
+                yield records[msg_id]
+    yield {"next_cursor": encode_page_cursor(results.get('nextPageToken'))}
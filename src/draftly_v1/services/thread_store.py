@@ -0,0 +1,321 @@
+"""Parsed Gmail threads cached in memory and SQL, validated against the historyId"""
+import asyncio
+import html
+import logging
+import time
+from draftly_v1.config import (THREAD_STORE_CACHE_SIZE, THREAD_STORE_CACHE_TTL,
+                               THREAD_STORE_REVALIDATE_SECONDS, THREAD_BODY_MESSAGES)
+from draftly_v1.services.database import get_cached_thread, save_cached_thread
+from draftly_v1.services.gmail_batch import execute_batch
+from draftly_v1.services.gmail_client import (AsyncGmailClient, get_message_request,
+                                              get_thread_request)
+from draftly_v1.services.utils.metrics import register_metrics
+from draftly_v1.services.utils.mime_parser import extract_body
+from draftly_v1.services.utils.ttl_cache import TTLCache
+
+_logger = logging.getLogger(__name__)
+
+REPLY_HEADERS = ("Subject", "Message-ID", "References")
+# Tier 1: headers and snippets of every message; tier 2: bodies of the newest ones
+THREAD_METADATA_HEADERS = ["From", "To", "Date", *REPLY_HEADERS]
+THREAD_METADATA_FIELDS = "id,historyId,messages(id,snippet,payload/headers)"
+MESSAGE_BODY_FIELDS = "id,payload(mimeType,filename,body/data,parts)"
+REPLY_HEADER_FIELDS = "messages/payload/headers"
+
+
+def _header(headers: list, name: str, default=None):
+    name = name.lower()
+    return next((h['value'] for h in headers if h['name'].lower() == name), default)
+
+
+def parse_thread(thread: dict, bodies: dict = None) -> dict:
+    """
+    Reduce a thread to what drafting needs.
+
+    Args:
+        thread (dict): a ``format='full'`` thread, or a ``format='metadata'``
+            thread when ``bodies`` is given
+        bodies (dict): optional message id -> ``format='full'`` payload;
+            messages without one fall back to their snippet
+
+    Returns:
+        dict: thread_id, history_id, messages (oldest first) and the
+        reply_headers of the latest message
+    """
+    messages = thread.get('messages', [])
+    parsed = []
+    for idx, msg in enumerate(messages):
+        headers = msg.get('payload', {}).get('headers', [])
+        is_latest = idx == len(messages) - 1
+        if bodies is None:
+            body = extract_body(msg.get('payload', {}), strip_quoted=is_latest)
+        elif msg['id'] in bodies:
+            body = extract_body(bodies[msg['id']], strip_quoted=is_latest)
+        else:
+            body = html.unescape(msg.get('snippet', ''))
+        parsed.append({
+            "message_id": msg['id'],
+            "from": _header(headers, 'From', "Unknown Sender"),
+            "to": _header(headers, 'To', "Unknown Recipient"),
+            "date": _header(headers, 'Date', "Unknown Date"),
+            "subject": _header(headers, 'Subject', "No Subject"),
+            "body": body,
+        })
+
+    latest_headers = (messages[-1].get('payload', {}).get('headers', [])
+                      if messages else [])
+    return {
+        "thread_id": thread.get('id'),
+        "history_id": str(thread.get('historyId', '')),
+        "messages": parsed,
+        "reply_headers": {name: _header(latest_headers, name)
+                          for name in REPLY_HEADERS},
+    }
+
+
+class ThreadStore:
+    """
+    Two-tier cache of parsed threads keyed by ``(email, thread_id)``.
+
+    An entry checked within the last ``revalidate_after`` seconds is served
+    without calling Gmail. Older entries, and entries loaded from SQL, are
+    validated with a ``threads.get`` limited to ``historyId``; only when the
+    thread changed is it downloaded again. Downloads are tiered: headers and
+    snippets for every message, then full bodies for the newest
+    ``body_messages`` only, all with ``fields`` masks.
+
+    Args:
+        maxsize (int): maximum number of threads held in memory
+        ttl (float): seconds a thread stays in memory
+        revalidate_after (float): seconds an entry is trusted without a
+            Gmail call
+        body_messages (int): newest messages whose full body is fetched
+        db_loader (callable): optional ``(email, thread_id) -> dict | None``
+        db_saver (callable): optional ``(email, thread_id, history_id,
+            messages, reply_headers) -> None``
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 3600,
+                 revalidate_after: float = 30, body_messages: int = 5,
+                 db_loader=None, db_saver=None):
+        self.revalidate_after = revalidate_after
+        self.body_messages = body_messages
+        self._db_loader = db_loader
+        self._db_saver = db_saver
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)  # key -> (entry, checked_at)
+        self.hits = 0
+        self.db_hits = 0
+        self.validations = 0
+        self.fetches = 0
+        self.prefetched = 0
+
+    def _is_fresh(self, cached) -> bool:
+        return (cached is not None
+                and time.monotonic() - cached[1] < self.revalidate_after)
+
+    async def get(self, client: AsyncGmailClient, thread_id: str) -> dict:
+        """Return the parsed thread, calling Gmail only when the cache can't vouch."""
+        key = (client.email, thread_id)
+        cached = self._cache.get(key)
+        if cached is None and self._db_loader:
+            entry = await asyncio.to_thread(self._db_loader, client.email, thread_id)
+            if entry:
+                self.db_hits += 1
+                cached = (entry, float("-inf"))
+
+        if cached is not None:
+            entry = cached[0]
+            if self._is_fresh(cached):
+                self.hits += 1
+                return entry
+            current = await client.get_thread(thread_id, format='minimal',
+                                              fields='historyId')
+            self.validations += 1
+            if str(current.get('historyId')) == entry["history_id"]:
+                self.hits += 1
+                self._cache.set(key, (entry, time.monotonic()))
+                return entry
+            _logger.info(f"Thread {thread_id} changed for {client.email[:6]}XXX, "
+                         "refetching")
+
+        entry = await self._fetch(client, thread_id)
+        self._cache.set(key, (entry, time.monotonic()))
+        if self._db_saver:
+            await asyncio.to_thread(self._db_saver, client.email, thread_id,
+                                    entry["history_id"], entry["messages"],
+                                    entry["reply_headers"])
+        return entry
+
+    async def _fetch_bodies(self, client: AsyncGmailClient, threads: list) -> dict:
+        """Full payloads of each thread's newest ``body_messages`` messages, batched."""
+        if self.body_messages <= 0:
+            return {}
+        newest = [m['id'] for thread in threads
+                  for m in thread.get('messages', [])[-self.body_messages:]]
+        if not newest:
+            return {}
+        responses = await execute_batch(client, {
+            msg_id: get_message_request(msg_id, format='full',
+                                        fields=MESSAGE_BODY_FIELDS)
+            for msg_id in newest
+        })
+        bodies = {}
+        for msg_id, item in responses.items():
+            if item.ok:
+                bodies[msg_id] = item.data.get('payload', {})
+            else:
+                _logger.error(f"Error fetching body of message {msg_id}, "
+                              f"using snippet: {item.error}")
+        return bodies
+
+    async def _fetch(self, client: AsyncGmailClient, thread_id: str) -> dict:
+        thread = await client.get_thread(thread_id, format='metadata',
+                                         metadata_headers=THREAD_METADATA_HEADERS,
+                                         fields=THREAD_METADATA_FIELDS)
+        bodies = await self._fetch_bodies(client, [thread])
+        self.fetches += 1
+        entry = parse_thread(thread, bodies)
+        entry["thread_id"] = thread_id
+        return entry
+
+    async def prefetch(self, client: AsyncGmailClient, thread_ids: list) -> list:
+        """
+        Download and parse every thread in ``thread_ids`` that is not fresh
+        in memory, tiered like ``get``: one batched metadata ``threads.get``
+        for all of them, then one batch for the newest message bodies.
+
+        Returns:
+            list: the parsed entries that were stored
+        """
+        missing = [t_id for t_id in dict.fromkeys(thread_ids)
+                   if not self._is_fresh(self._cache.get((client.email, t_id)))]
+        if not missing:
+            return []
+        responses = await execute_batch(client, {
+            t_id: get_thread_request(t_id, format='metadata',
+                                     metadata_headers=THREAD_METADATA_HEADERS,
+                                     fields=THREAD_METADATA_FIELDS)
+            for t_id in missing
+        })
+        threads = {}
+        for t_id, item in responses.items():
+            if item.ok:
+                threads[t_id] = item.data
+            else:
+                _logger.error(f"Error prefetching thread {t_id}: {item.error}")
+        bodies = await self._fetch_bodies(client, list(threads.values()))
+
+        entries = []
+        for t_id, thread in threads.items():
+            entry = parse_thread(thread, bodies)
+            entry["thread_id"] = t_id
+            self._cache.set((client.email, t_id), (entry, time.monotonic()))
+            if self._db_saver:
+                await asyncio.to_thread(self._db_saver, client.email, t_id,
+                                        entry["history_id"], entry["messages"],
+                                        entry["reply_headers"])
+            entries.append(entry)
+        self.prefetched += len(entries)
+        return entries
+
+    async def get_reply_headers(self, client: AsyncGmailClient, thread_id: str) -> dict:
+        """
+        Threading headers of the thread's latest message.
+
+        Served from the store when the thread is cached; otherwise fetched
+        with ``format='metadata'`` limited to the reply headers.
+
+        Raises:
+            ValueError: If the thread has no messages
+        """
+        if self._cache.get((client.email, thread_id)) is not None:
+            entry = await self.get(client, thread_id)
+            if not entry["messages"]:
+                raise ValueError(f"No messages found in thread {thread_id}")
+            return entry["reply_headers"]
+
+        thread = await client.get_thread(thread_id, format='metadata',
+                                         metadata_headers=list(REPLY_HEADERS),
+                                         fields=REPLY_HEADER_FIELDS)
+        messages = thread.get('messages', [])
+        if not messages:
+            raise ValueError(f"No messages found in thread {thread_id}")
+        headers = messages[-1].get('payload', {}).get('headers', [])
+        return {name: _header(headers, name) for name in REPLY_HEADERS}
+
+    async def get_reply_headers_many(self, client: AsyncGmailClient,
+                                     thread_ids: list) -> dict:
+        """
+        Threading headers of several threads: cached threads from the store,
+        the rest with one batched metadata-only ``threads.get``.
+
+        Returns:
+            dict: thread_id -> headers dict, or the exception for a thread
+            whose headers could not be read
+        """
+        results, missing = {}, []
+        for t_id in dict.fromkeys(thread_ids):
+            if self._cache.get((client.email, t_id)) is not None:
+                try:
+                    results[t_id] = await self.get_reply_headers(client, t_id)
+                except Exception as e:
+                    results[t_id] = e
+            else:
+                missing.append(t_id)
+        if not missing:
+            return results
+
+        responses = await execute_batch(client, {
+            t_id: get_thread_request(t_id, format='metadata',
+                                     metadata_headers=list(REPLY_HEADERS),
+                                     fields=REPLY_HEADER_FIELDS)
+            for t_id in missing
+        })
+        for t_id, item in responses.items():
+            messages = item.data.get('messages', []) if item.ok else []
+            if not item.ok:
+                results[t_id] = item.error
+            elif not messages:
+                results[t_id] = ValueError(f"No messages found in thread {t_id}")
+            else:
+                headers = messages[-1].get('payload', {}).get('headers', [])
+                results[t_id] = {name: _header(headers, name) for name in REPLY_HEADERS}
+        return results
+
+    def mark_stale(self, email: str, thread_id: str):
+        """Force the next read of a thread to be validated against Gmail."""
+        cached = self._cache.get((email, thread_id))
+        if cached is not None:
+            self._cache.set((email, thread_id), (cached[0], float("-inf")))
+
+    def invalidate(self, email: str, thread_id: str = None):
+        """Drop one thread, or every thread of ``email``, from memory."""
+        if thread_id is not None:
+            self._cache.pop((email, thread_id))
+            return
+        for key in [k for k in self._cache.keys() if k[0] == email]:
+            self._cache.pop(key)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "validations": self.validations,
+            "fetches": self.fetches,
+            "prefetched": self.prefetched,
+        }
+
+
+thread_store = ThreadStore(
+    maxsize=THREAD_STORE_CACHE_SIZE,
+    ttl=THREAD_STORE_CACHE_TTL,
+    revalidate_after=THREAD_STORE_REVALIDATE_SECONDS,
+    body_messages=THREAD_BODY_MESSAGES,
+    db_loader=get_cached_thread,
+    db_saver=save_cached_thread,
+)
+register_metrics("thread_store", thread_store.stats)
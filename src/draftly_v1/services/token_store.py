@@ -0,0 +1,153 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from google.oauth2.credentials import Credentials
+from draftly_v1.services.google_http import google_auth_request
+
+_logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime:
+    """Naive UTC now, matching the expiry format used by google-auth."""
+    return datetime.utcnow()
+
+
+def refresh_access_token(creds_dict: dict):
+    """
+    Exchange the refresh token in ``creds_dict`` for a new access token.
+
+    Returns:
+        tuple: (access_token, expiry) where expiry is a naive UTC datetime
+    """
+    creds = Credentials(
+        token=None,
+        refresh_token=creds_dict["refresh_token"],
+        token_uri=creds_dict["token_uri"],
+        client_id=creds_dict["client_id"],
+        client_secret=creds_dict["client_secret"],
+        scopes=creds_dict.get("scopes"),
+    )
+    creds.refresh(google_auth_request())
+    return creds.token, creds.expiry
+
+
+class TokenStore:
+    """
+    Per-user access token cache with single-flight refresh.
+
+    Tokens are served from memory until ``refresh_margin`` seconds before they
+    expire. When a refresh is needed only one caller per user performs it;
+    concurrent callers block on the same lock and pick up the stored result.
+
+    Args:
+        refresh_margin (int): seconds before expiry at which a token is
+            treated as stale and refreshed
+        db_loader (callable): optional ``email -> (token, expiry) | None``
+            used as a second tier shared between worker processes
+        db_saver (callable): optional ``(email, token, expiry) -> None``
+            persisting refreshed tokens to the second tier
+    """
+
+    def __init__(self, refresh_margin: int = 300, db_loader=None, db_saver=None):
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self._db_loader = db_loader
+        self._db_saver = db_saver
+        self._tokens = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+        self.hits = 0
+        self.db_hits = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def _is_fresh(self, expiry) -> bool:
+        return expiry is not None and expiry - self.refresh_margin > _utcnow()
+
+    def _user_lock(self, email: str) -> threading.Lock:
+        with self._guard:
+            lock = self._locks.get(email)
+            if lock is None:
+                lock = self._locks[email] = threading.Lock()
+            return lock
+
+    def get(self, email: str):
+        """Return a cached ``(token, expiry)`` pair if it is still fresh."""
+        entry = self._tokens.get(email)
+        if entry and self._is_fresh(entry[1]):
+            return entry
+        return None
+
+    def put(self, email: str, token: str, expiry: datetime):
+        """Store an access token obtained elsewhere (e.g. the OAuth callback)."""
+        if not token or not isinstance(expiry, datetime):
+            return
+        self._tokens[email] = (token, expiry)
+        if self._db_saver:
+            try:
+                self._db_saver(email, token, expiry)
+            except Exception as e:
+                _logger.error(f"Error persisting access token for {email[:6]}XXX: "
+                              f"{str(e)}")
+
+    def invalidate(self, email: str):
+        """Forget the cached token for a user, forcing the next call to refresh."""
+        self._tokens.pop(email, None)
+
+    def clear(self):
+        """Forget every cached token."""
+        self._tokens.clear()
+
+    def get_or_refresh(self, email: str, refresh_fn):
+        """
+        Return a fresh ``(token, expiry)`` pair, refreshing it at most once
+        per user at a time.
+
+        Args:
+            email (str): the user whose token is requested
+            refresh_fn (callable): performs the OAuth refresh and returns
+                ``(token, expiry)``
+        """
+        entry = self.get(email)
+        if entry:
+            self.hits += 1
+            return entry
+
+        with self._user_lock(email):
+            # Another caller may have refreshed while we waited for the lock
+            entry = self.get(email)
+            if entry:
+                self.hits += 1
+                return entry
+
+            if self._db_loader:
+                try:
+                    stored = self._db_loader(email)
+                except Exception as e:
+                    _logger.error(f"Error loading access token for {email[:6]}XXX: "
+                                  f"{str(e)}")
+                    stored = None
+                if stored and self._is_fresh(stored[1]):
+                    self._tokens[email] = stored
+                    self.db_hits += 1
+                    return stored
+
+            try:
+                token, expiry = refresh_fn()
+            except Exception:
+                self.refresh_errors += 1
+                self.invalidate(email)
+                raise
+            self.refreshes += 1
+            _logger.info(f"Access token refreshed for {email[:6]}XXX")
+            self.put(email, token, expiry)
+            return token, expiry
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {
+            "size": len(self._tokens),
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+        }
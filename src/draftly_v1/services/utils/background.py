@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class UserTaskRegistry:
+    """Background asyncio tasks grouped by user, with a per-user concurrency budget.
+
+    Tasks beyond a user's budget are not started, and every task of a user
+    can be cancelled at once (e.g. on logout).
+
+    Args:
+        max_per_user (int): tasks allowed to run at the same time per user
+    """
+
+    def __init__(self, max_per_user: int = 1):
+        self.max_per_user = max_per_user
+        self._tasks = {}
+        self.started = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def running(self, email: str) -> int:
+        return len(self._tasks.get(email, ()))
+
+    def spawn(self, email: str, coro):
+        """
+        Run ``coro`` in the background for ``email``.
+
+        Returns:
+            asyncio.Task | None: the task, or None when the user's budget is used up
+        """
+        if self.running(email) >= self.max_per_user:
+            coro.close()
+            self.rejected += 1
+            return None
+        task = asyncio.create_task(coro)
+        self._tasks.setdefault(email, set()).add(task)
+        task.add_done_callback(lambda t: self._finished(email, t))
+        self.started += 1
+        return task
+
+    def _finished(self, email: str, task: asyncio.Task):
+        tasks = self._tasks.get(email)
+        if tasks is not None:
+            tasks.discard(task)
+            if not tasks:
+                del self._tasks[email]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.failed += 1
+            _logger.error(f"Background task for {email[:6]}XXX failed: "
+                          f"{str(task.exception())}")
+
+    def cancel_user(self, email: str) -> int:
+        """Cancel every background task of ``email``; returns how many there were."""
+        tasks = list(self._tasks.get(email, ()))
+        for task in tasks:
+            task.cancel()
+        self.cancelled += len(tasks)
+        if tasks:
+            _logger.info(f"Cancelled {len(tasks)} background task(s) "
+                         f"for {email[:6]}XXX")
+        return len(tasks)
+
+    async def shutdown(self):
+        """Cancel all tasks and wait for them to finish (application shutdown)."""
+        tasks = [task for tasks in self._tasks.values() for task in tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "running": sum(len(tasks) for tasks in self._tasks.values()),
+            "users": len(self._tasks),
+            "started": self.started,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+        }
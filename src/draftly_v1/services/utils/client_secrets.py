@@ -0,0 +1,103 @@
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+_logger = logging.getLogger(__name__)
+
+
+class ClientSecretsProvider:
+    """Locate, parse and cache the OAuth ``client_secret*.json`` file.
+
+    The file is parsed on first use and kept in memory. It is re-parsed only
+    when its mtime changes, and the mtime itself is checked at most once
+    every ``check_interval`` seconds, so request handlers normally never
+    touch the filesystem.
+
+    Args:
+        resources_dir (Path): directory containing the client secrets file
+        pattern (str): glob used to find the file inside ``resources_dir``
+        check_interval (float): minimum seconds between mtime checks
+    """
+
+    def __init__(self, resources_dir: Path, pattern: str = "client_secret*.json",
+                 check_interval: float = 30):
+        self.resources_dir = Path(resources_dir)
+        self.pattern = pattern
+        self.check_interval = check_interval
+        self._path = None
+        self._secrets = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        """Path of the client secrets file, resolved once."""
+        if self._path is None:
+            self._path = self._find_file()
+        return self._path
+
+    def _find_file(self) -> Path:
+        if not self.resources_dir.exists():
+            raise FileNotFoundError(
+                f"Resources directory not found: {self.resources_dir}")
+
+        secret_files = sorted(self.resources_dir.glob(self.pattern))
+        if not secret_files:
+            raise FileNotFoundError(
+                f"No {self.pattern} file found in {self.resources_dir}. "
+                "Please download your OAuth credentials from Google Cloud Console."
+            )
+        if len(secret_files) > 1:
+            _logger.warning(f"Multiple client secret files found. "
+                            f"Using: {secret_files[0].name}")
+        return secret_files[0]
+
+    def load(self) -> dict:
+        """Return the parsed client secrets, reloading only if the file changed."""
+        now = time.monotonic()
+        if (self._secrets is not None
+                and now - self._checked_at < self.check_interval):
+            return self._secrets
+
+        with self._lock:
+            if (self._secrets is not None
+                    and now - self._checked_at < self.check_interval):
+                return self._secrets
+            path = self.path
+            if not path.exists():
+                raise FileNotFoundError(f"Client secrets file not found at: {path}")
+            mtime = path.stat().st_mtime
+            if self._secrets is None or mtime != self._mtime:
+                with open(path, 'r') as f:
+                    self._secrets = json.load(f)
+                self._mtime = mtime
+                _logger.info(f"Loaded client secrets from {path.name}")
+            self._checked_at = now
+            return self._secrets
+
+    def get_client_credentials(self) -> tuple:
+        """
+        Extract ``(client_id, client_secret)`` from the secrets file.
+
+        Raises:
+            ValueError: If the file does not contain a client id and secret
+        """
+        client_secrets = self.load()
+        # Extract client_id and client_secret from the JSON structure
+        if "web" in client_secrets:
+            section = client_secrets["web"]
+        elif "installed" in client_secrets:
+            section = client_secrets["installed"]
+        else:
+            # Fallback: assume top-level keys
+            section = client_secrets
+
+        client_id = section.get("client_id")
+        client_secret = section.get("client_secret")
+        if not client_id or not client_secret:
+            raise ValueError(
+                "Could not extract client_id and client_secret from secrets file")
+        return client_id, client_secret
@@ -0,0 +1,23 @@
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# name -> zero-argument callable returning a JSON-serialisable dict
+_providers = {}
+
+
+def register_metrics(name: str, provider):
+    """Register a callable that reports metrics under ``name`` on /metrics."""
+    _providers[name] = provider
+
+
+def collect_metrics() -> dict:
+    """Collect a snapshot from every registered metrics provider."""
+    snapshot = {}
+    for name, provider in list(_providers.items()):
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            _logger.error(f"Error collecting metrics for {name}: {str(e)}")
+            snapshot[name] = {"error": str(e)}
+    return snapshot
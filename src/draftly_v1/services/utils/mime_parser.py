@@ -0,0 +1,69 @@
+import base64
+import re
+
+_WHITESPACE = re.compile(r'[\r\n\t]+')
+# Quoted history appended by mail clients below the latest reply
+_HTML_QUOTE = re.compile(r'<div class="gmail_quote')
+_PLAIN_QUOTE = re.compile(r'^\s*On .{1,300}wrote:\s*$|^>', re.MULTILINE)
+
+
+def decode_body_data(data: str) -> str:
+    """Decode a Gmail base64url body, tolerating missing padding."""
+    raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    return raw.decode('utf-8', errors='replace')
+
+
+def _collect_text_parts(part: dict, plain: list, html: list):
+    """Walk the MIME tree once, recording (still encoded) text bodies in order."""
+    mime_type = part.get('mimeType', '')
+    children = part.get('parts')
+    if children:
+        for child in children:
+            _collect_text_parts(child, plain, html)
+        return
+    if part.get('filename'):
+        return  # attachment
+    data = part.get('body', {}).get('data')
+    if not data:
+        return
+    if mime_type == 'text/html':
+        html.append(data)
+    elif mime_type.startswith('text/') or not mime_type:
+        plain.append(data)
+
+
+def extract_body(payload: dict, strip_quoted: bool = False,
+                 prefer_plain: bool = True) -> str:
+    """
+    Extract the readable body of a Gmail ``format='full'`` message payload.
+
+    Nested multiparts are walked recursively. When the message has a
+    non-empty ``text/plain`` body it is used and the HTML alternative is
+    never decoded; otherwise the HTML parts are used. Every selected part is
+    decoded exactly once and whitespace is normalized in a single pass over
+    the joined result.
+
+    Args:
+        payload (dict): the message ``payload``
+        strip_quoted (bool): drop quoted history below the latest reply
+        prefer_plain (bool): use ``text/plain`` when available
+
+    Returns:
+        str: the body text, or an empty string
+    """
+    plain, html = [], []
+    _collect_text_parts(payload or {}, plain, html)
+
+    body, is_html = "", False
+    if prefer_plain and plain:
+        body = "\n".join(decode_body_data(data) for data in plain)
+    if not body.strip() and html:
+        body, is_html = "\n".join(decode_body_data(data) for data in html), True
+    if not body.strip() and plain and not prefer_plain:
+        body = "\n".join(decode_body_data(data) for data in plain)
+
+    if strip_quoted:
+        quote = (_HTML_QUOTE if is_html else _PLAIN_QUOTE).search(body)
+        if quote:
+            body = body[:quote.start()]
+    return _WHITESPACE.sub(' ', body).strip()
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import threading
+import time
+from draftly_v1.services.utils.ttl_cache import TTLCache
+
+_logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` units per second up to ``capacity``.
+
+    Callers reserve units up front; a reservation may take the bucket below
+    zero, in which case the caller is told how long to wait before using
+    them. Reservations are granted in call order, so waiting callers are
+    served first come, first served.
+
+    Args:
+        rate (float): units added per second
+        capacity (float): maximum burst size
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, units: float) -> float:
+        """Take ``units`` from the bucket; returns the seconds to wait before use."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= units
+            deficit_wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(deficit_wait, self.blocked_until - now, 0.0)
+
+    def try_take(self, units: float) -> bool:
+        """Take ``units`` only if they are available now; never queues."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self.blocked_until or self.tokens < units:
+                return False
+            self.tokens -= units
+            return True
+
+    def block(self, seconds: float):
+        """Hold all reservations for ``seconds`` (e.g. a server ``Retry-After``)."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min(self.tokens, 0.0)
+            self.blocked_until = max(self.blocked_until, now + seconds)
+
+    def level(self) -> float:
+        """Units currently available (negative while callers are queued)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return round(self.tokens, 2)
+
+
+class QuotaLimiter:
+    """
+    Per-user and per-project token buckets for a quota-metered API.
+
+    Every call reserves its unit cost from the caller's user bucket and from
+    the shared project bucket, then sleeps for the longer of the two waits.
+    A rate-limit response blocks the user's bucket for the ``Retry-After``
+    period so queued calls back off together instead of producing more 429s.
+
+    Args:
+        user_rate (float): units per second allowed per user
+        project_rate (float): units per second allowed for the whole process
+        max_users (int): user buckets kept; idle users are forgotten
+        default_retry_after (float): block used when a 429 carries no
+            ``Retry-After``
+    """
+
+    def __init__(self, user_rate: float, project_rate: float, max_users: int = 10000,
+                 default_retry_after: float = 1.0):
+        self.user_rate = user_rate
+        self.project = TokenBucket(project_rate)
+        # A bucket idle for an hour is full again, so dropping it loses nothing
+        self._users = TTLCache(maxsize=max_users, ttl=3600)
+        self._guard = threading.Lock()
+        self.default_retry_after = default_retry_after
+        self.calls = 0
+        self.delayed_calls = 0
+        self.wait_seconds = 0.0
+        self.rate_limited = 0
+
+    def _user_bucket(self, key: str) -> TokenBucket:
+        with self._guard:
+            bucket = self._users.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.user_rate)
+            # Re-store on every use so active users keep their bucket
+            self._users.set(key, bucket)
+            return bucket
+
+    async def acquire(self, key: str, units: float) -> float:
+        """Wait until ``key`` may spend ``units``; returns the seconds waited."""
+        wait = max(self._user_bucket(key).reserve(units), self.project.reserve(units))
+        self.calls += 1
+        if wait > 0:
+            self.delayed_calls += 1
+            self.wait_seconds += wait
+            if wait > 5:
+                _logger.warning(f"Quota limiter delaying call for {key[:6]}XXX "
+                                f"by {wait:.1f}s")
+            await asyncio.sleep(wait)
+        return wait
+
+    def rate_limited_by_server(self, key: str, retry_after: float = None):
+        """Record a 429 / rate-limit error and hold the user's bucket."""
+        self.rate_limited += 1
+        self._user_bucket(key).block(retry_after or self.default_retry_after)
+
+    def stats(self) -> dict:
+        """Bucket levels and throttling counters for monitoring."""
+        users = {key[:6] + "XXX": bucket.level() for key in self._users.keys()
+                 if (bucket := self._users.get(key)) is not None}
+        return {
+            "project_level": self.project.level(),
+            "project_capacity": self.project.capacity,
+            "user_capacity": self.user_rate,
+            "users": users,
+            "calls": self.calls,
+            "delayed_calls": self.delayed_calls,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "rate_limited": self.rate_limited,
+        }
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+_logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0  # a user is waiting for the result
+PRIORITY_BACKGROUND = 1  # prefetching, speculative work
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive",
+                  PRIORITY_BACKGROUND: "background"}
+
+
+class FairScheduler:
+    """
+    Concurrency slots handed out by priority class, round-robin across users.
+
+    At most ``max_concurrency`` holders run at once, and at most
+    ``max_per_user`` of them for the same user. When a slot frees up, the
+    lowest priority number with a waiting caller wins; within a class, users
+    take turns so one user's burst cannot starve the others. Each user's own
+    requests are served in arrival order.
+
+    Args:
+        max_concurrency (int): slots across all users
+        max_per_user (int): slots a single user may hold at once
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_per_user: int = 2):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_per_user = max(1, max_per_user)
+        # priority -> OrderedDict(key -> deque of (future, enqueued_at))
+        self._queues = {}
+        self._active = 0
+        self._active_per_user = {}
+        self.granted = {}
+        self.wait_seconds = {}
+        self.max_wait_seconds = {}
+        self.cancelled = 0
+
+    def _queue_for(self, priority: int) -> OrderedDict:
+        return self._queues.setdefault(priority, OrderedDict())
+
+    def _record_wait(self, priority: int, waited: float):
+        self.granted[priority] = self.granted.get(priority, 0) + 1
+        self.wait_seconds[priority] = self.wait_seconds.get(priority, 0.0) + waited
+        self.max_wait_seconds[priority] = max(self.max_wait_seconds.get(priority, 0.0),
+                                              waited)
+
+    def _take(self, key: str):
+        self._active += 1
+        self._active_per_user[key] = self._active_per_user.get(key, 0) + 1
+
+    def _dispatch(self):
+        """Hand free slots to waiting callers, highest priority class first."""
+        while self._active < self.max_concurrency:
+            granted = False
+            for priority in sorted(self._queues):
+                users = self._queues[priority]
+                for key in list(users):
+                    if self._active_per_user.get(key, 0) >= self.max_per_user:
+                        continue
+                    waiters = users.pop(key)
+                    future, enqueued_at = waiters.popleft()
+                    if waiters:
+                        users[key] = waiters  # back of the line behind the other users
+                    if future.done():
+                        # Cancelled while queued; its task has not run to dequeue it yet
+                        granted = True
+                        break
+                    self._take(key)
+                    self._record_wait(priority, time.monotonic() - enqueued_at)
+                    future.set_result(None)
+                    granted = True
+                    break
+                if granted:
+                    break
+            if not granted:
+                return
+
+    def _waiting(self) -> bool:
+        return any(users for users in self._queues.values())
+
+    async def acquire(self, key: str, priority: int = PRIORITY_INTERACTIVE):
+        """Wait for a slot for ``key``; pair every call with ``release(key)``."""
+        if (not self._waiting() and self._active < self.max_concurrency
+                and self._active_per_user.get(key, 0) < self.max_per_user):
+            self._take(key)
+            self._record_wait(priority, 0.0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queue_for(priority).setdefault(key, deque()).append(
+            (future, time.monotonic()))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller gave up: hand the slot on
+                self.release(key)
+            else:
+                self._remove(priority, key, future)
+            self.cancelled += 1
+            raise
+
+    def _remove(self, priority: int, key: str, future):
+        users = self._queues.get(priority, {})
+        waiters = users.get(key)
+        if waiters is None:
+            return
+        for item in list(waiters):
+            if item[0] is future:
+                waiters.remove(item)
+        if not waiters:
+            del users[key]
+
+    def release(self, key: str):
+        self._active -= 1
+        remaining = self._active_per_user.get(key, 0) - 1
+        if remaining > 0:
+            self._active_per_user[key] = remaining
+        else:
+            self._active_per_user.pop(key, None)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, key: str, priority: int = PRIORITY_INTERACTIVE):
+        """``async with scheduler.slot(email, priority):`` runs the body in a slot."""
+        await self.acquire(key, priority)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def stats(self) -> dict:
+        """Queue depth and wait times per priority class for monitoring."""
+        classes = {}
+        for priority in sorted(set(self._queues) | set(self.granted)):
+            granted = self.granted.get(priority, 0)
+            waited = self.wait_seconds.get(priority, 0.0)
+            classes[PRIORITY_NAMES.get(priority, str(priority))] = {
+                "queued": sum(len(waiters)
+                              for waiters in self._queues.get(priority, {}).values()),
+                "granted": granted,
+                "avg_wait_seconds": round(waited / granted, 3) if granted else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds.get(priority, 0.0), 3),
+            }
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "users_active": len(self._active_per_user),
+            "cancelled": self.cancelled,
+            "priorities": classes,
+        }
@@ -0,0 +1,13 @@
+import json
+
+
+def format_sse(data, event: str = None) -> str:
+    """Encode ``data`` as one Server-Sent Events message."""
+    payload = data if isinstance(data, str) else json.dumps(data)
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in payload.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+# Comment line that keeps idle connections open through proxies
+SSE_KEEPALIVE = ": keep-alive\n\n"
@@ -0,0 +1,110 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded, thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    Args:
+        maxsize (int): maximum number of entries kept; the least recently used
+            entry is evicted when the cache is full
+        ttl (float): seconds an entry stays valid after it was stored
+        max_bytes (int): optional bound on the summed ``sizeof`` of the
+            values; values larger than this on their own are not stored
+        sizeof (callable): size of a value in bytes, ``sys.getsizeof`` by default
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 600, max_bytes: int = None,
+                 sizeof=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or sys.getsizeof
+        self._bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for ``key`` or ``default`` if missing/expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._bytes -= size
+                self.evictions += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """Store ``value`` under ``key``, evicting the oldest entries if full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Remove ``key`` from the cache and return its value."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry:
+                self._bytes -= entry[2]
+        return entry[0] if entry else default
+
+    def keys(self) -> list:
+        """Return a snapshot of the cached keys (expired ones included)."""
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Return size and hit/miss counters for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > time.monotonic()
@@ -19,11 +19,17 @@ sys.path.insert(0, str(src_path))
 @pytest.fixture(autouse=True)
 def mock_chatgroq():
     """Mock ChatGroq LLM client to avoid API calls during tests"""
+    from draftly_v1.services.llm_services import llm_clients
+    from draftly_v1.services.draft_cache import draft_cache
+    llm_clients.clear()
+    draft_cache.clear()
     with patch('draftly_v1.services.llm_services.ChatGroq') as mock_groq:
         mock_instance = MagicMock()
         mock_instance.invoke.return_value.content = 'Test AI generated draft response'
         mock_groq.return_value = mock_instance
         yield mock_instance
+    # Shared clients built during the test hold the mock
+    llm_clients.clear()
 
 
 @pytest.fixture(autouse=True)
@@ -39,9 +45,12 @@ def reset_test_environment():
     yield
     
     # Close all database connections
-    from draftly_v1.services.database import engine
+    from draftly_v1.services.database import engine, access_token_store
     if engine:
         engine.dispose()
+    access_token_store.clear()
+    from draftly_v1.services.thread_store import thread_store
+    thread_store.clear()
     
     # Cleanup test database if it exists
     import time
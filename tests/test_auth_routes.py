@@ -1,7 +1,8 @@
 """Tests for authentication routes"""
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch, MagicMock
+from fastapi import HTTPException
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 from draftly_v1.app import app
 
 client = TestClient(app)
@@ -48,6 +49,41 @@ class TestAuthRoutes:
         response = client.post('/auth/logout')
         assert response.status_code == 200
         assert response.json()['message'] == 'Logged out successfully'
+
+    @patch('draftly_v1.routes.auth_routes.speculative_drafter')
+    @patch('draftly_v1.routes.auth_routes.cancel_prefetch')
+    @patch('draftly_v1.routes.auth_routes.validate_session', new_callable=AsyncMock)
+    def test_logout_cancels_tasks_of_validated_user(self, mock_validate, mock_cancel,
+                                                    mock_drafter):
+        """Test logout stops background work only for the user of a valid session"""
+        mock_validate.return_value = 'test@example.com'
+        client.cookies.set('user_email', 'other@example.com')
+        try:
+            response = client.post('/auth/logout')
+        finally:
+            client.cookies.clear()
+
+        assert response.status_code == 200
+        mock_cancel.assert_called_once_with('test@example.com')
+        mock_drafter.tasks.cancel_user.assert_called_once_with('test@example.com')
+
+    @patch('draftly_v1.routes.auth_routes.speculative_drafter')
+    @patch('draftly_v1.routes.auth_routes.cancel_prefetch')
+    @patch('draftly_v1.routes.auth_routes.validate_session', new_callable=AsyncMock)
+    def test_logout_without_session_cancels_nothing(self, mock_validate, mock_cancel,
+                                                    mock_drafter):
+        """Test a user_email cookie without a valid session cancels no one's tasks"""
+        mock_validate.side_effect = HTTPException(status_code=401,
+                                                  detail='Invalid session')
+        client.cookies.set('user_email', 'victim@example.com')
+        try:
+            response = client.post('/auth/logout')
+        finally:
+            client.cookies.clear()
+
+        assert response.status_code == 200
+        mock_cancel.assert_not_called()
+        mock_drafter.tasks.cancel_user.assert_not_called()
     
     def test_login_redirect(self, mock_flow):
         """Test login redirects to OAuth provider"""
@@ -55,7 +91,7 @@ class TestAuthRoutes:
         assert response.status_code in [302, 307]  # Redirect status codes
         mock_flow.from_client_secrets_file.assert_called_once()
     
-    @patch('draftly_v1.routes.auth_routes.build')
+    @patch('draftly_v1.routes.auth_routes.build_from_document')
     @patch('draftly_v1.routes.auth_routes.store_user')
     @patch('draftly_v1.routes.auth_routes.create_user_session')
     def test_auth_callback(self, mock_create_session, mock_store_user, mock_build, mock_flow):
@@ -0,0 +1,99 @@
+"""Tests for debounced draft autosave"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from draftly_v1.services.autosave_services import DraftAutosaver, queue_draft_save
+
+
+class TestDraftAutosaver:
+    """Test coalescing of autosaves"""
+
+    @pytest.mark.asyncio
+    async def test_only_latest_version_is_saved(self):
+        """Test a burst of autosaves uploads just the last content"""
+        save = AsyncMock()
+        autosaver = DraftAutosaver(debounce_seconds=0.05, max_delay=5, save_fn=save)
+
+        for version in range(5):
+            autosaver.submit('user@example.com', 'thread_1', 'to@example.com', f'v{version}')
+        await asyncio.sleep(0.15)
+
+        save.assert_awaited_once_with('user@example.com', 'thread_1', 'to@example.com', 'v4')
+        assert autosaver.stats()['coalesced'] == 4
+
+    @pytest.mark.asyncio
+    async def test_threads_are_saved_separately(self):
+        """Test autosaves of different threads do not replace each other"""
+        save = AsyncMock()
+        autosaver = DraftAutosaver(debounce_seconds=0.01, save_fn=save)
+
+        autosaver.submit('user@example.com', 'thread_1', 'to@example.com', 'a')
+        autosaver.submit('user@example.com', 'thread_2', 'to@example.com', 'b')
+        await asyncio.sleep(0.1)
+
+        assert sorted(call.args[1] for call in save.await_args_list) == ['thread_1', 'thread_2']
+
+    @pytest.mark.asyncio
+    async def test_max_delay_bounds_continuous_typing(self):
+        """Test a draft is saved after max_delay even while edits keep arriving"""
+        save = AsyncMock()
+        autosaver = DraftAutosaver(debounce_seconds=0.05, max_delay=0.1, save_fn=save)
+
+        for version in range(8):
+            autosaver.submit('user@example.com', 'thread_1', 'to@example.com', f'v{version}')
+            await asyncio.sleep(0.03)
+
+        assert save.await_count >= 1
+        await autosaver.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_discard_and_shutdown(self):
+        """Test a discarded autosave is never saved and shutdown flushes the rest"""
+        save = AsyncMock()
+        autosaver = DraftAutosaver(debounce_seconds=60, save_fn=save)
+        autosaver.submit('user@example.com', 'thread_1', 'to@example.com', 'sent instead')
+        autosaver.submit('user@example.com', 'thread_2', 'to@example.com', 'keep')
+
+        assert await autosaver.discard('user@example.com', 'thread_1') is True
+        await autosaver.shutdown()
+
+        save.assert_awaited_once_with('user@example.com', 'thread_2', 'to@example.com', 'keep')
+
+    @pytest.mark.asyncio
+    async def test_discard_waits_for_save_in_progress(self):
+        """Test a send discarding the autosave is not overtaken by a running save"""
+        events = []
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def save(*args):
+            started.set()
+            await release.wait()
+            events.append('autosave queued')
+
+        autosaver = DraftAutosaver(debounce_seconds=0, save_fn=save)
+        autosaver.submit('user@example.com', 'thread_1', 'to@example.com', 'typing')
+        await started.wait()
+
+        async def send():
+            assert await autosaver.discard('user@example.com', 'thread_1') is False
+            events.append('send queued')
+
+        sending = asyncio.create_task(send())
+        await asyncio.sleep(0.01)
+        assert events == []
+        release.set()
+        await sending
+
+        assert events == ['autosave queued', 'send queued']
+
+    @pytest.mark.asyncio
+    async def test_closed_draft_is_not_saved(self):
+        """Test an autosave flushed after the reply was sent creates no Gmail draft"""
+        module = 'draftly_v1.services.autosave_services'
+        with patch(f'{module}.get_open_drafts', return_value={}), \
+                patch(f'{module}.outbox_dispatcher') as dispatcher:
+            dispatcher.enqueue = AsyncMock()
+            await queue_draft_save('user@example.com', 'thread_1', 'to@example.com',
+                                   'late')
+
+        dispatcher.enqueue.assert_not_called()
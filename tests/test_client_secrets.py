@@ -0,0 +1,48 @@
+"""Tests for the cached client secrets provider"""
+import json
+import os
+import pytest
+from unittest.mock import patch
+from draftly_v1.services.utils.client_secrets import ClientSecretsProvider
+
+
+def _write_secrets(path, client_id, mtime):
+    path.write_text(json.dumps({"web": {"client_id": client_id, "client_secret": "secret"}}))
+    os.utime(path, (mtime, mtime))
+
+
+class TestClientSecretsProvider:
+    """Test ClientSecretsProvider caching"""
+
+    def test_missing_resources_dir(self, tmp_path):
+        """Test a clear error when the resources directory is missing"""
+        provider = ClientSecretsProvider(tmp_path / "missing")
+        with pytest.raises(FileNotFoundError, match='Resources directory not found'):
+            provider.path
+
+    def test_parses_file_once(self, tmp_path):
+        """Test repeated lookups do not re-read the file"""
+        _write_secrets(tmp_path / "client_secret.json", "id_1", 1000)
+        provider = ClientSecretsProvider(tmp_path, check_interval=0)
+
+        assert provider.get_client_credentials() == ("id_1", "secret")
+        with patch('builtins.open') as mock_open:
+            assert provider.get_client_credentials() == ("id_1", "secret")
+        mock_open.assert_not_called()
+
+    def test_reloads_when_mtime_changes(self, tmp_path):
+        """Test an updated file is picked up"""
+        secrets_file = tmp_path / "client_secret.json"
+        _write_secrets(secrets_file, "id_1", 1000)
+        provider = ClientSecretsProvider(tmp_path, check_interval=0)
+        assert provider.get_client_credentials()[0] == "id_1"
+
+        _write_secrets(secrets_file, "id_2", 2000)
+        assert provider.get_client_credentials()[0] == "id_2"
+
+    def test_missing_keys(self, tmp_path):
+        """Test a secrets file without client id/secret is rejected"""
+        (tmp_path / "client_secret.json").write_text(json.dumps({"other": {}}))
+        provider = ClientSecretsProvider(tmp_path)
+        with pytest.raises(ValueError, match='Could not extract'):
+            provider.get_client_credentials()
@@ -0,0 +1,73 @@
+"""Tests for the token-budgeted thread context"""
+import pytest
+from draftly_v1.services.context_builder import ContextBuilder, count_tokens, first_paragraph
+from draftly_v1.services.llm_services import _render_message, clean_html_for_llm
+
+
+def _message(index: int, paragraphs: int = 1) -> dict:
+    body = ''.join(f'<p>Message {index} paragraph {p}. ' + 'Lots of detail here. ' * 20 + '</p>'
+                   for p in range(paragraphs))
+    return {'from': f'sender{index}@example.com', 'to': 'me@example.com', 'date': 'Mon',
+            'subject': 'Project', 'body': body}
+
+
+def _build(builder, messages):
+    return builder.build(messages, _render_message, clean_html_for_llm)
+
+
+class TestContextBuilder:
+    """Test shortening and dropping of older emails"""
+
+    def test_thread_within_budget_is_unchanged(self):
+        """Test a thread that fits is rendered in full with nothing saved"""
+        builder = ContextBuilder(budget=100000)
+        text, report = _build(builder, [_message(0), _message(1)])
+
+        assert 'Email #1:' in text and '=== LATEST EMAIL (Reply to this) ===' in text
+        assert report.tokens_saved == 0
+        assert (report.shortened, report.dropped) == (0, 0)
+        assert builder.stats()['trimmed_requests'] == 0
+
+    def test_older_emails_shortened_oldest_first(self):
+        """Test the oldest emails are cut to their first paragraph before newer ones"""
+        messages = [_message(i, paragraphs=4) for i in range(6)]
+        full_text, full = _build(ContextBuilder(budget=100000), messages)
+        builder = ContextBuilder(budget=full.tokens - 300)
+
+        text, report = _build(builder, messages)
+
+        assert report.shortened >= 1 and report.dropped == 0
+        assert 'Message 5 paragraph 0' in text and 'Message 5 paragraph 1' not in text
+        assert 'Message 1 paragraph 3' in text  # the newest older email is still complete
+        assert report.tokens < full.tokens
+        assert report.tokens_saved == full.tokens - report.tokens
+
+    def test_latest_email_always_kept_in_full(self):
+        """Test a tight budget drops older emails but never trims the latest one"""
+        messages = [_message(i, paragraphs=4) for i in range(40)]
+        builder = ContextBuilder(budget=count_tokens(clean_html_for_llm(messages[0]['body'])) + 200)
+
+        text, report = _build(builder, messages)
+
+        assert clean_html_for_llm(messages[0]['body']) in text
+        assert report.dropped > 0
+        assert 'earlier emails omitted' in text
+        assert builder.stats()['tokens_saved'] == report.tokens_saved > 0
+
+
+class TestHelpers:
+    """Test token counting and paragraph extraction"""
+
+    def test_first_paragraph(self):
+        """Test the first non-empty paragraph is used"""
+        body = '<p></p><p>Hello <b>there</b>.</p><p>Second</p>'
+        assert first_paragraph(body, clean_html_for_llm) == 'Hello there .'
+
+    def test_plain_text_paragraphs(self):
+        """Test blank lines separate paragraphs in plain-text bodies"""
+        assert first_paragraph('First line\nstill first\n\nSecond', clean_html_for_llm) == 'First line still first'
+
+    def test_count_tokens(self):
+        """Test token counts grow with the text"""
+        assert count_tokens('') == 0
+        assert 0 < count_tokens('hello world') < count_tokens('hello world ' * 50)
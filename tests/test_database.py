@@ -1,11 +1,14 @@
 """Tests for database operations"""
 import pytest
+from datetime import datetime, timedelta
 from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import Session
 from draftly_v1.services.database import (
     get_db_session,
     get_creds_from_db,
-    store_user
+    store_user,
+    add_missing_columns
 )
 from draftly_v1.model.User import User
 
@@ -28,10 +31,8 @@ class TestDatabase:
         assert session is not None
     
     @patch('draftly_v1.services.database.User')
-    @patch('json.load')
-    @patch('builtins.open')
-    @patch('pathlib.Path.exists')
-    def test_get_creds_from_db_success(self, mock_exists, mock_open, mock_json_load, mock_user_class, mock_session):
+    @patch('draftly_v1.services.database.CLIENT_SECRETS')
+    def test_get_creds_from_db_success(self, mock_client_secrets, mock_user_class, mock_session):
         """Test retrieving user credentials from database"""
         # Mock user instance
         mock_user = MagicMock()
@@ -45,16 +46,13 @@ class TestDatabase:
         mock_query.filter.return_value = mock_filter
         mock_session.query.return_value = mock_query
         
-        # Mock client secrets file
-        mock_exists.return_value = True
-        mock_json_load.return_value = {
-            "web": {
-                "client_id": "test_client_id",
-                "client_secret": "test_client_secret"
-            }
-        }
+        # Mock cached client secrets
+        mock_client_secrets.get_client_credentials.return_value = ('test_client_id', 'test_client_secret')
         
-        with patch('draftly_v1.services.database.get_db_session', return_value=mock_session):
+        expiry = datetime.utcnow() + timedelta(hours=1)
+        with patch('draftly_v1.services.database.get_db_session', return_value=mock_session), \
+             patch('draftly_v1.services.database.refresh_access_token',
+                   return_value=('test_access_token', expiry)):
             creds = get_creds_from_db('test@example.com')
         
         # Verify credentials dictionary structure
@@ -64,6 +62,8 @@ class TestDatabase:
         assert creds['client_id'] == 'test_client_id'
         assert creds['client_secret'] == 'test_client_secret'
         assert creds['token_uri'] == 'https://oauth2.googleapis.com/token'
+        assert creds['token'] == 'test_access_token'
+        assert creds['expiry'] == expiry
     
     def test_get_creds_from_db_user_not_found(self, mock_session):
         """Test error when user not found in database"""
@@ -148,3 +148,32 @@ class TestDatabase:
                 )
         
         mock_session.rollback.assert_called_once()
+
+
+class TestAddMissingColumns:
+    """Test upgrading tables created before newer model columns"""
+
+    def test_adds_new_draft_log_columns_once(self, tmp_path):
+        """Test an old draft_logs table gains the new columns and a second run is a no-op"""
+        engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE draft_logs (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+                "thread_id VARCHAR NOT NULL, recipient_email VARCHAR NOT NULL, draft_content TEXT NOT NULL, "
+                "gmail_draft_id VARCHAR, thread_context JSON, status VARCHAR NOT NULL, "
+                "created_at DATETIME NOT NULL, updated_at DATETIME)"
+            ))
+            conn.execute(text(
+                "INSERT INTO draft_logs (user_id, thread_id, recipient_email, draft_content, status, created_at) "
+                "VALUES (1, 't1', 'a@example.com', 'Hi', 'DRAFT', '2024-01-01 00:00:00')"
+            ))
+
+        added = add_missing_columns(engine)
+
+        assert {'draft_logs.reply_headers', 'draft_logs.thread_history_id', 'draft_logs.user_style'} <= set(added)
+        columns = {column['name'] for column in inspect(engine).get_columns('draft_logs')}
+        assert {'reply_headers', 'thread_history_id', 'user_style'} <= columns
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT thread_id, user_style FROM draft_logs")).fetchall() == [('t1', None)]
+        assert add_missing_columns(engine) == []
+        engine.dispose()
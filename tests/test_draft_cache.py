@@ -0,0 +1,87 @@
+"""Tests for the content-addressed draft cache"""
+import pytest
+from unittest.mock import MagicMock
+from draftly_v1.model.DraftCache import DraftCache as DraftCacheRow
+from draftly_v1.services.database import engine, get_db_session, get_cached_draft, save_cached_draft
+from draftly_v1.services.draft_cache import DraftCache, draft_cache_key
+
+
+@pytest.fixture
+def draft_cache_table():
+    """Real, empty draft_cache table in the test SQLite database"""
+    DraftCacheRow.__table__.create(bind=engine, checkfirst=True)
+    session = get_db_session()
+    session.query(DraftCacheRow).delete()
+    session.commit()
+    session.close()
+    yield
+
+
+class TestDraftCacheKey:
+    """Test what identifies a generation"""
+
+    def test_same_prompt_model_and_temperature_bucket(self):
+        """Test temperatures in the same bucket share a key"""
+        assert draft_cache_key('prompt', 'model-a', 0.71) == draft_cache_key('prompt', 'model-a', 0.69)
+
+    def test_any_difference_changes_the_key(self):
+        """Test prompt, model and temperature bucket all take part in the key"""
+        key = draft_cache_key('prompt', 'model-a', 0.7)
+        assert key != draft_cache_key('prompt!', 'model-a', 0.7)
+        assert key != draft_cache_key('prompt', 'model-b', 0.7)
+        assert key != draft_cache_key('prompt', 'model-a', 0.2)
+
+
+class TestDraftCache:
+    """Test the memory and SQL tiers"""
+
+    @pytest.mark.asyncio
+    async def test_memory_then_database_tier(self):
+        """Test a stored draft is served from memory, and a database hit is kept in memory"""
+        loader = MagicMock(side_effect=lambda key: 'from db' if key == 'k2' else None)
+        saver = MagicMock()
+        cache = DraftCache(db_loader=loader, db_saver=saver)
+
+        await cache.set('k1', 'model', 'draft one')
+        assert await cache.get('k1') == 'draft one'
+        assert await cache.get('k2') == 'from db'
+        assert await cache.get('k2') == 'from db'
+        assert await cache.get('k3') is None
+
+        assert loader.call_count == 2
+        saver.assert_called_once_with('k1', 'model', 'draft one', cache.ttl, cache.max_rows)
+        stats = cache.stats()
+        assert (stats['memory_hits'], stats['db_hits'], stats['misses']) == (2, 1, 1)
+        assert stats['hit_rate'] == 0.75
+
+    @pytest.mark.asyncio
+    async def test_disabled_cache(self):
+        """Test a disabled cache neither stores nor answers"""
+        cache = DraftCache(enabled=False, db_loader=MagicMock(), db_saver=MagicMock())
+        await cache.set('k1', 'model', 'draft')
+
+        assert await cache.get('k1') is None
+        cache._db_saver.assert_not_called()
+
+
+class TestDraftCacheTable:
+    """Test TTL and size-based eviction of the SQL tier"""
+
+    def test_expired_drafts_are_not_returned(self, draft_cache_table):
+        """Test a draft past its TTL misses"""
+        save_cached_draft('old', 'model', 'stale', ttl=-1, max_rows=10)
+        save_cached_draft('new', 'model', 'fresh', ttl=60, max_rows=10)
+
+        assert get_cached_draft('old') is None
+        assert get_cached_draft('new') == 'fresh'
+
+    def test_least_recently_used_rows_are_evicted(self, draft_cache_table):
+        """Test the table is trimmed to max_rows, keeping recently used drafts"""
+        save_cached_draft('a', 'model', 'A', ttl=60, max_rows=2)
+        save_cached_draft('b', 'model', 'B', ttl=60, max_rows=2)
+        assert get_cached_draft('a') == 'A'  # now more recently used than b
+        save_cached_draft('c', 'model', 'C', ttl=60, max_rows=2)
+
+        assert get_cached_draft('b') is None
+        assert get_cached_draft('a') == 'A'
+        assert get_cached_draft('c') == 'C'
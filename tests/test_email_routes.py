@@ -0,0 +1,104 @@
+"""Tests for streaming draft routes"""
+import json
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+from draftly_v1.app import app
+from draftly_v1.routes import email_routes
+
+client = TestClient(app)
+
+THREAD = {'llm_context': [{'from': 'a@example.com', 'body': 'Hi'}], 'history_id': '42',
+          'reply_headers': {'Subject': 'Hi'}}
+
+
+def _events(body: str) -> list:
+    events = []
+    for message in body.strip().split('\n\n'):
+        lines = message.split('\n')
+        event = lines[0][len('event: '):]
+        data = json.loads('\n'.join(line[len('data: '):] for line in lines[1:]))
+        events.append((event, data))
+    return events
+
+
+async def _chunks(*texts):
+    for text in texts:
+        yield text
+
+
+@pytest.fixture
+def session():
+    with patch('draftly_v1.routes.email_routes.validate_session', AsyncMock(return_value='user@example.com')):
+        yield
+
+
+class TestDraftStream:
+    """Test /email/draft/stream"""
+
+    def test_tokens_then_saved_draft(self, session):
+        """Test the thread, each token and the final draft are sent, and the draft is saved"""
+        with patch('draftly_v1.routes.email_routes.fetch_email_thread_by_id', AsyncMock(return_value=THREAD)), \
+             patch('draftly_v1.routes.email_routes.speculative_drafter.take', return_value=None), \
+             patch('draftly_v1.routes.email_routes.stream_draft',
+                   side_effect=lambda **kwargs: _chunks('<p>Hello', '\nthere</p>')), \
+             patch('draftly_v1.routes.email_routes.save_thread_context') as save:
+            response = client.post('/email/draft/stream', json={'threadId': 't1', 'tone': 'Friendly'})
+
+        assert response.headers['content-type'].startswith('text/event-stream')
+        events = _events(response.text)
+        assert [event for event, _ in events] == ['context', 'token', 'token', 'done']
+        assert events[0][1]['thread_context']['history_id'] == '42'
+        assert events[-1][1]['draft'] == '<p>Hello there</p>'
+        assert save.call_args.kwargs['draft_content'] == '<p>Hello there</p>'
+        assert save.call_args.kwargs['reply_headers'] == {'Subject': 'Hi'}
+
+    def test_speculative_draft_is_one_chunk(self, session):
+        """Test a pre-generated draft is streamed without calling the model"""
+        with patch('draftly_v1.routes.email_routes.fetch_email_thread_by_id', AsyncMock(return_value=THREAD)), \
+             patch('draftly_v1.routes.email_routes.speculative_drafter.take', return_value='<p>Ready</p>'), \
+             patch('draftly_v1.routes.email_routes.stream_draft') as stream, \
+             patch('draftly_v1.routes.email_routes.save_thread_context'):
+            events = _events(client.post('/email/draft/stream', json={'threadId': 't1', 'tone': 'Friendly'}).text)
+
+        stream.assert_not_called()
+        assert events[0][1]['speculative'] is True
+        assert events[-1] == ('done', {'draft': '<p>Ready</p>'})
+
+    def test_saved_style_used_without_tone(self, session):
+        """Test a request without a tone is drafted in the user's saved style"""
+        with patch('draftly_v1.routes.email_routes.get_user_by_email', return_value=MagicMock(id=7)), \
+             patch('draftly_v1.routes.email_routes.get_user_preferences',
+                   return_value={'user_style': 'Casual'}) as preferences, \
+             patch('draftly_v1.routes.email_routes.fetch_email_thread_by_id', AsyncMock(return_value=THREAD)), \
+             patch('draftly_v1.routes.email_routes.speculative_drafter.take', return_value=None), \
+             patch('draftly_v1.routes.email_routes.stream_draft',
+                   side_effect=lambda **kwargs: _chunks('<p>Hey</p>')) as stream, \
+             patch('draftly_v1.routes.email_routes.save_thread_context'):
+            events = _events(client.post('/email/draft/stream', json={'threadId': 't1'}).text)
+
+        preferences.assert_called_once_with(7)
+        assert stream.call_args.kwargs['user_style'] == 'Casual'
+        assert events[-1] == ('done', {'draft': '<p>Hey</p>'})
+
+    def test_regenerate_without_open_draft(self, session):
+        """Test regenerating a thread with no stored context is a 404"""
+        with patch('draftly_v1.routes.email_routes.get_thread_context', return_value=[]):
+            response = client.post('/email/regenerate_draft/stream', json={'thread_id': 't1', 'user_style': 'x'})
+
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_disconnect_stops_generation(self):
+        """Test a disconnected client closes the token stream and nothing is saved"""
+        request = MagicMock()
+        request.is_disconnected = AsyncMock(side_effect=[False, True])
+        chunks = _chunks('one', 'two', 'three')
+        save = MagicMock()
+
+        response = email_routes._draft_event_stream(request, chunks, save)
+        sent = [message async for message in response.body_iterator]
+
+        assert len(sent) == 1
+        save.assert_not_called()
+        assert chunks.ag_running is False and chunks.ag_frame is None
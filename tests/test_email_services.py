@@ -1,18 +1,21 @@
 """Tests for email services"""
 import pytest
-from unittest.mock import MagicMock, patch, Mock
-from email.message import EmailMessage
+from unittest.mock import AsyncMock, MagicMock, patch
+from email import message_from_bytes
 import base64
+from draftly_v1.services.gmail_client import GmailApiError, GmailBatchResponse
 from draftly_v1.services.email_services import (
     create_gmail_draft,
     send_gmail_draft,
+    deliver_replies_bulk,
 )
 
 
 @pytest.fixture
-def mock_gmail_service():
-    """Mock Gmail service"""
-    service = MagicMock()
+def mock_gmail_client():
+    """Mock asyncio Gmail client"""
+    client = MagicMock()
+    client.email = 'test@example.com'
     
     # Mock thread get
     thread_response = {
@@ -28,32 +31,53 @@ def mock_gmail_service():
             }
         }]
     }
-    service.users().threads().get().execute.return_value = thread_response
+    client.get_thread = AsyncMock(return_value=thread_response)
     
     # Mock draft create
-    service.users().drafts().create().execute.return_value = {'id': 'draft_123'}
+    client.create_draft = AsyncMock(return_value={'id': 'draft_123'})
     
     # Mock message send
-    service.users().messages().send().execute.return_value = {'id': 'sent_msg_123'}
+    client.send_message = AsyncMock(return_value={'id': 'sent_msg_123'})
     
-    return service
+    # Mock saved draft update and send
+    client.update_draft = AsyncMock(return_value={'id': 'draft_saved'})
+    client.send_draft = AsyncMock(return_value={'id': 'sent_draft_msg'})
+    
+    return client
 
 
 @pytest.fixture
-def mock_get_user_creds():
-    """Mock get_user_creds function"""
-    with patch('draftly_v1.services.email_services.get_user_creds') as mock:
+def mock_get_gmail_client(mock_gmail_client):
+    """Mock get_gmail_client function"""
+    with patch('draftly_v1.services.email_services.get_gmail_client', return_value=mock_gmail_client) as mock:
+        yield mock
+
+
+@pytest.fixture(autouse=True)
+def saved_gmail_draft():
+    """No Gmail draft saved for the thread unless a test sets one"""
+    with patch('draftly_v1.services.email_services.get_gmail_draft_id', return_value=None) as mock:
+        yield mock
+
+
+@pytest.fixture(autouse=True)
+def stored_reply_headers():
+    """No reply headers stored with the draft unless a test sets them"""
+    with patch('draftly_v1.services.email_services.get_draft_reply_headers', return_value=None) as mock:
         yield mock
 
 
+def _decode_raw(raw):
+    return message_from_bytes(base64.urlsafe_b64decode(raw))
+
+
 class TestEmailServices:
     """Test email service functions"""
     
-    def test_create_gmail_draft(self, mock_get_user_creds, mock_gmail_service):
+    @pytest.mark.asyncio
+    async def test_create_gmail_draft(self, mock_get_gmail_client, mock_gmail_client):
         """Test creating a Gmail draft"""
-        mock_get_user_creds.return_value = mock_gmail_service
-        
-        result = create_gmail_draft(
+        result = await create_gmail_draft(
             email='user@example.com',
             toEmail='recipient@example.com',
             thread_id='thread_123',
@@ -62,21 +86,15 @@ class TestEmailServices:
         
         assert result['id'] == 'draft_123'
         # Verify the draft was created with correct structure
-        # Note: uses assert_called() not assert_called_once() due to method chaining
-        call_args_list = mock_gmail_service.users().drafts().create.call_args_list
-        # Filter out the empty call() from chaining
-        actual_calls = [c for c in call_args_list if c[1]]
-        assert len(actual_calls) == 1
-        call_args = actual_calls[0]
-        assert call_args[1]['userId'] == 'me'
-        assert 'message' in call_args[1]['body']
-        assert call_args[1]['body']['message']['threadId'] == 'thread_123'
+        mock_gmail_client.create_draft.assert_awaited_once()
+        body = mock_gmail_client.create_draft.call_args[1]['body']
+        assert 'message' in body
+        assert body['message']['threadId'] == 'thread_123'
     
-    def test_create_gmail_draft_with_threading_headers(self, mock_get_user_creds, mock_gmail_service):
+    @pytest.mark.asyncio
+    async def test_create_gmail_draft_with_threading_headers(self, mock_get_gmail_client, mock_gmail_client):
         """Test draft includes proper threading headers"""
-        mock_get_user_creds.return_value = mock_gmail_service
-        
-        create_gmail_draft(
+        await create_gmail_draft(
             email='user@example.com',
             toEmail='recipient@example.com',
             thread_id='thread_123',
@@ -84,18 +102,17 @@ class TestEmailServices:
         )
         
         # Verify thread was fetched to get headers
-        # Verify thread was fetched - use call_args_list due to method chaining
-        call_args_list = mock_gmail_service.users().threads().get.call_args_list
-        actual_calls = [c for c in call_args_list if c[1]]
-        assert len(actual_calls) == 1
-        assert actual_calls[0][1]['userId'] == 'me'
-        assert actual_calls[0][1]['id'] == 'thread_123'
+        mock_gmail_client.get_thread.assert_awaited_once()
+        assert mock_gmail_client.get_thread.call_args[0][0] == 'thread_123'
+        raw = mock_gmail_client.create_draft.call_args[1]['body']['message']['raw']
+        message = _decode_raw(raw)
+        assert message['In-Reply-To'] == '<msg123@example.com>'
+        assert message['References'] == '<ref123@example.com> <msg123@example.com>'
     
-    def test_send_gmail_draft(self, mock_get_user_creds, mock_gmail_service):
+    @pytest.mark.asyncio
+    async def test_send_gmail_draft(self, mock_get_gmail_client, mock_gmail_client):
         """Test sending an email draft"""
-        mock_get_user_creds.return_value = mock_gmail_service
-        
-        result = send_gmail_draft(
+        result = await send_gmail_draft(
             email='user@example.com',
             toEmail='recipient@example.com',
             thread_id='thread_123',
@@ -104,19 +121,15 @@ class TestEmailServices:
         
         assert result['id'] == 'sent_msg_123'
         # Verify the message was sent with correct structure
-        call_args_list = mock_gmail_service.users().messages().send.call_args_list
-        actual_calls = [c for c in call_args_list if c[1]]
-        assert len(actual_calls) == 1
-        call_args = actual_calls[0]
-        assert call_args[1]['userId'] == 'me'
-        assert 'threadId' in call_args[1]['body']
-        assert call_args[1]['body']['threadId'] == 'thread_123'
+        mock_gmail_client.send_message.assert_awaited_once()
+        body = mock_gmail_client.send_message.call_args[1]['body']
+        assert 'threadId' in body
+        assert body['threadId'] == 'thread_123'
     
-    def test_send_gmail_draft_adds_re_prefix(self, mock_get_user_creds, mock_gmail_service):
+    @pytest.mark.asyncio
+    async def test_send_gmail_draft_adds_re_prefix(self, mock_get_gmail_client, mock_gmail_client):
         """Test that 'Re:' is added to subject when replying"""
-        mock_get_user_creds.return_value = mock_gmail_service
-        
-        send_gmail_draft(
+        await send_gmail_draft(
             email='user@example.com',
             toEmail='recipient@example.com',
             thread_id='thread_123',
@@ -124,21 +137,172 @@ class TestEmailServices:
         )
         
         # The function should fetch the thread to get the subject
-        # Verify thread was fetched
-        call_args_list = mock_gmail_service.users().threads().get.call_args_list
-        actual_calls = [c for c in call_args_list if c[1]]
-        assert len(actual_calls) == 1
+        mock_gmail_client.get_thread.assert_awaited_once()
+        raw = mock_gmail_client.send_message.call_args[1]['body']['raw']
+        assert _decode_raw(raw)['Subject'] == 'Re: Test Subject'
     
-    def test_send_gmail_draft_no_messages_error(self, mock_get_user_creds, mock_gmail_service):
+    @pytest.mark.asyncio
+    async def test_send_gmail_draft_no_messages_error(self, mock_get_gmail_client, mock_gmail_client):
         """Test error when thread has no messages"""
-        mock_gmail_service.users().threads().get().execute.return_value = {'messages': []}
-        mock_get_user_creds.return_value = mock_gmail_service
+        mock_gmail_client.get_thread.return_value = {'messages': []}
         
         with pytest.raises(ValueError, match='No messages found'):
-            send_gmail_draft(
+            await send_gmail_draft(
                 email='user@example.com',
                 toEmail='recipient@example.com',
                 thread_id='thread_123',
                 draft_body='Test body'
             )
 
+    @pytest.mark.asyncio
+    async def test_send_uses_stored_reply_headers(self, mock_get_gmail_client, mock_gmail_client,
+                                                  stored_reply_headers):
+        """Test headers saved with the draft make the send a single Gmail call"""
+        stored_reply_headers.return_value = {
+            'Subject': 'Re: Stored', 'Message-ID': '<stored@example.com>', 'References': None}
+
+        await send_gmail_draft(
+            email='user@example.com',
+            toEmail='recipient@example.com',
+            thread_id='thread_123',
+            draft_body='Test body'
+        )
+
+        mock_gmail_client.get_thread.assert_not_called()
+        message = _decode_raw(mock_gmail_client.send_message.call_args[1]['body']['raw'])
+        assert message['Subject'] == 'Re: Stored'
+        assert message['In-Reply-To'] == '<stored@example.com>'
+        assert message['References'] == '<stored@example.com>'
+
+    @pytest.mark.asyncio
+    async def test_saved_draft_is_updated_in_place(self, mock_get_gmail_client, mock_gmail_client, saved_gmail_draft):
+        """Test saving again updates the thread's Gmail draft instead of creating another"""
+        saved_gmail_draft.return_value = 'draft_saved'
+
+        result = await create_gmail_draft('user@example.com', 'recipient@example.com', 'thread_123', 'v2')
+
+        assert result['id'] == 'draft_saved'
+        mock_gmail_client.create_draft.assert_not_called()
+        draft_id = mock_gmail_client.update_draft.call_args[0][0]
+        body = mock_gmail_client.update_draft.call_args[1]['body']
+        assert draft_id == 'draft_saved' and body['id'] == 'draft_saved'
+        assert body['message']['threadId'] == 'thread_123'
+
+    @pytest.mark.asyncio
+    async def test_deleted_gmail_draft_is_recreated(self, mock_get_gmail_client, mock_gmail_client, saved_gmail_draft):
+        """Test a draft deleted in Gmail falls back to creating a new one"""
+        saved_gmail_draft.return_value = 'draft_gone'
+        mock_gmail_client.update_draft.side_effect = GmailApiError(404, 'Requested entity was not found.')
+
+        result = await create_gmail_draft('user@example.com', 'recipient@example.com', 'thread_123', 'v2')
+
+        assert result['id'] == 'draft_123'
+
+    @pytest.mark.asyncio
+    async def test_send_uses_saved_draft(self, mock_get_gmail_client, mock_gmail_client, saved_gmail_draft):
+        """Test sending a thread with a saved Gmail draft sends that draft"""
+        saved_gmail_draft.return_value = 'draft_saved'
+
+        result = await send_gmail_draft('user@example.com', 'recipient@example.com', 'thread_123', 'final')
+
+        assert result['id'] == 'sent_draft_msg'
+        mock_gmail_client.send_message.assert_not_called()
+        body = mock_gmail_client.send_draft.call_args[1]['body']
+        assert body['id'] == 'draft_saved'
+        assert body['message']['threadId'] == 'thread_123'
+
+
+class TestDeliverRepliesBulk:
+    """Test bulk save / send with batched Gmail calls"""
+
+    HEADERS = {'Subject': 'Hello', 'Message-ID': '<m1@example.com>', 'References': None}
+
+    @pytest.fixture
+    def bulk_deps(self, mock_get_gmail_client):
+        with patch('draftly_v1.services.email_services.get_open_drafts') as open_drafts, \
+             patch('draftly_v1.services.email_services.thread_store.get_reply_headers_many',
+                   new_callable=AsyncMock) as headers_many, \
+             patch('draftly_v1.services.email_services.execute_batch', new_callable=AsyncMock) as batch, \
+             patch('draftly_v1.services.email_services.mark_threads_as_read', new_callable=AsyncMock) as mark_read, \
+             patch('draftly_v1.services.email_services.save_bulk_reply_results', return_value=2) as save:
+            yield {'open_drafts': open_drafts, 'headers_many': headers_many, 'batch': batch,
+                   'mark_read': mark_read, 'save': save}
+
+    @staticmethod
+    def _items():
+        return [
+            {'thread_id': 't1', 'toEmail': 'a@example.com', 'draft_body': 'one', 'draft_only': False},
+            {'thread_id': 't2', 'toEmail': 'b@example.com', 'draft_body': 'two', 'draft_only': True},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_items_share_one_batch(self, bulk_deps):
+        """Test every item goes out in one batch and the bookkeeping is done once for all"""
+        bulk_deps['open_drafts'].return_value = {'t1': {'gmail_draft_id': 'd1', 'reply_headers': self.HEADERS}}
+        bulk_deps['headers_many'].return_value = {'t2': self.HEADERS}
+        bulk_deps['batch'].return_value = {'t1': GmailBatchResponse(200, data={'id': 'sent_1'}),
+                                           't2': GmailBatchResponse(200, data={'id': 'draft_2'})}
+
+        results = await deliver_replies_bulk('user@example.com', self._items())
+
+        assert [r['status'] for r in results] == ['DONE', 'DONE']
+        assert results[0]['result'] == {'message_id': 'sent_1'}
+        assert results[1]['result'] == {'draft_id': 'draft_2'}
+        bulk_deps['headers_many'].assert_awaited_once()
+        assert bulk_deps['headers_many'].await_args[0][1] == ['t2']
+        requests = bulk_deps['batch'].await_args[0][1]
+        assert bulk_deps['batch'].await_count == 1
+        assert requests['t1'].path == '/drafts/send' and requests['t1'].body['id'] == 'd1'
+        assert requests['t2'].path == '/drafts'
+        bulk_deps['mark_read'].assert_awaited_once_with('user@example.com', ['t1', 't2'])
+        saved = bulk_deps['save'].call_args[0][1]
+        assert [(r['thread_id'], r['gmail_id']) for r in saved] == [('t1', 'sent_1'), ('t2', 'draft_2')]
+
+    @pytest.mark.asyncio
+    async def test_failures_are_reported_per_item(self, bulk_deps):
+        """Test a failed item does not stop the others and is left out of the bookkeeping"""
+        bulk_deps['open_drafts'].return_value = {}
+        bulk_deps['headers_many'].return_value = {'t1': self.HEADERS,
+                                                  't2': ValueError('No messages found in thread t2')}
+        bulk_deps['batch'].return_value = {'t1': GmailBatchResponse(200, data={'id': 'sent_1'})}
+
+        results = await deliver_replies_bulk('user@example.com', self._items())
+
+        assert results[0]['status'] == 'DONE'
+        assert results[1]['status'] == 'FAILED'
+        assert 'No messages found' in results[1]['error']
+        assert list(bulk_deps['batch'].await_args[0][1]) == ['t1']
+        bulk_deps['mark_read'].assert_awaited_once_with('user@example.com', ['t1'])
+
+    @pytest.mark.asyncio
+    async def test_deleted_saved_drafts_are_recreated(self, bulk_deps):
+        """Test items whose saved Gmail draft is gone are retried as new drafts / messages"""
+        bulk_deps['open_drafts'].return_value = {
+            't1': {'gmail_draft_id': 'gone', 'reply_headers': self.HEADERS},
+            't2': {'gmail_draft_id': 'd2', 'reply_headers': self.HEADERS},
+        }
+        missing = GmailApiError(404, 'Requested entity was not found.')
+        bulk_deps['batch'].side_effect = [
+            {'t1': GmailBatchResponse(404, error=missing), 't2': GmailBatchResponse(200, data={'id': 'd2'})},
+            {'t1': GmailBatchResponse(200, data={'id': 'sent_1'})},
+        ]
+
+        results = await deliver_replies_bulk('user@example.com', self._items())
+
+        assert [r['status'] for r in results] == ['DONE', 'DONE']
+        assert bulk_deps['batch'].await_args[0][1]['t1'].path == '/messages/send'
+        bulk_deps['headers_many'].assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_unconfirmed_sends_are_unknown(self, bulk_deps):
+        """Test a send answered with a 5xx is reported UNKNOWN, a failed draft save FAILED"""
+        bulk_deps['open_drafts'].return_value = {}
+        bulk_deps['headers_many'].return_value = {'t1': self.HEADERS, 't2': self.HEADERS}
+        backend_error = GmailApiError(500, 'Backend error')
+        bulk_deps['batch'].return_value = {'t1': GmailBatchResponse(500, error=backend_error),
+                                           't2': GmailBatchResponse(500, error=backend_error)}
+
+        results = await deliver_replies_bulk('user@example.com', self._items())
+
+        assert [r['status'] for r in results] == ['UNKNOWN', 'FAILED']
+        bulk_deps['mark_read'].assert_not_awaited()
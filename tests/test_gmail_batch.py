@@ -0,0 +1,113 @@
+"""Tests for the Gmail batch executor"""
+import httpx
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from draftly_v1.services.gmail_batch import GmailBatchExecutor, is_retryable, should_retry
+from draftly_v1.services.gmail_client import (GmailApiError, GmailBatchResponse, get_message_request,
+                                              send_message_request)
+
+
+def _requests(count):
+    return {f'm{i}': get_message_request(f'm{i}') for i in range(count)}
+
+
+def _ok(request_id):
+    return GmailBatchResponse(200, data={'id': request_id})
+
+
+@pytest.fixture
+def client():
+    """Mock client whose batch call succeeds for every item"""
+    client = MagicMock()
+    client.email = 'test@example.com'
+    client.batch = AsyncMock(side_effect=lambda chunk: {r: _ok(r) for r in chunk})
+    return client
+
+
+class TestRetryable:
+    """Test retry classification"""
+
+    def test_is_retryable(self):
+        """Test rate limits and server errors are retried, client errors are not"""
+        assert is_retryable(GmailApiError(429, 'Too many'))
+        assert is_retryable(GmailApiError(503, 'Unavailable'))
+        assert is_retryable(GmailApiError(403, 'Slow down', reason='userRateLimitExceeded'))
+        assert not is_retryable(GmailApiError(403, 'Forbidden', reason='forbidden'))
+        assert not is_retryable(GmailApiError(404, 'Not found'))
+
+    def test_sends_retry_only_when_rate_limited(self):
+        """Test a send is repeated after a rate limit but not after a server error"""
+        send = send_message_request(body={'raw': 'x'})
+        assert should_retry(send, GmailApiError(429, 'Too many'))
+        assert should_retry(send, GmailApiError(403, 'Slow down', reason='rateLimitExceeded'))
+        assert not should_retry(send, GmailApiError(500, 'Backend error'))
+        assert not should_retry(send, GmailApiError(503, 'Batch request failed: connection reset'))
+        assert should_retry(get_message_request('m0'), GmailApiError(500, 'Backend error'))
+
+
+class TestGmailBatchExecutor:
+    """Test chunking, concurrency and per-item retry"""
+
+    @pytest.mark.asyncio
+    async def test_chunks_respect_size(self, client):
+        """Test requests are split into batches no larger than the chunk size"""
+        executor = GmailBatchExecutor(chunk_size=100)
+        results = await executor.run(client, _requests(250))
+        sizes = sorted(len(call.args[0]) for call in client.batch.call_args_list)
+        assert sizes == [50, 100, 100]
+        assert list(results) == list(_requests(250))
+        assert all(item.ok for item in results.values())
+
+    def test_chunk_size_capped(self):
+        """Test the chunk size never exceeds Gmail's batch limit"""
+        assert GmailBatchExecutor(chunk_size=500).chunk_size == 100
+
+    @pytest.mark.asyncio
+    async def test_only_failed_items_are_retried(self, client):
+        """Test a 429 item is retried alone and succeeds"""
+        calls = []
+
+        def batch(chunk):
+            calls.append(list(chunk))
+            if len(calls) == 1:
+                return {r: _ok(r) if r != 'm1' else
+                        GmailBatchResponse(429, error=GmailApiError(429, 'Rate limit')) for r in chunk}
+            return {r: _ok(r) for r in chunk}
+
+        client.batch.side_effect = batch
+        executor = GmailBatchExecutor(backoff_base=0)
+        results = await executor.run(client, _requests(3))
+
+        assert calls == [['m0', 'm1', 'm2'], ['m1']]
+        assert results['m1'].ok and results['m1'].attempts == 2
+        assert results['m0'].attempts == 1
+        assert executor.stats()['retries'] == 1
+
+    @pytest.mark.asyncio
+    async def test_permanent_errors_are_not_retried(self, client):
+        """Test non-retryable failures are returned after one attempt"""
+        client.batch.side_effect = lambda chunk: {
+            r: GmailBatchResponse(404, error=GmailApiError(404, 'Not found')) for r in chunk}
+        results = await GmailBatchExecutor(backoff_base=0).run(client, _requests(2))
+        assert client.batch.await_count == 1
+        assert results['m0'].status_code == 404 and not results['m0'].ok
+
+    @pytest.mark.asyncio
+    async def test_retries_are_bounded(self, client):
+        """Test items failing every time stop after max_retries"""
+        client.batch.side_effect = httpx.ConnectError('connection reset')
+        executor = GmailBatchExecutor(max_retries=2, backoff_base=0)
+        results = await executor.run(client, _requests(1))
+        assert client.batch.await_count == 3
+        assert results['m0'].status_code == 503
+        assert results['m0'].attempts == 3
+        assert executor.stats()['failures'] == 1
+
+    @pytest.mark.asyncio
+    async def test_sends_are_not_repeated_after_server_errors(self, client):
+        """Test a send that failed with a 5xx is returned as is rather than sent twice"""
+        client.batch.side_effect = lambda chunk: {
+            r: GmailBatchResponse(500, error=GmailApiError(500, 'Backend error')) for r in chunk}
+        results = await GmailBatchExecutor(backoff_base=0).run(client, {'s0': send_message_request(body={'raw': 'x'})})
+        assert client.batch.await_count == 1
+        assert results['s0'].status_code == 500
@@ -0,0 +1,206 @@
+"""Tests for the asyncio Gmail REST client"""
+import json
+import httpx
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from draftly_v1.services import gmail_client
+from draftly_v1.services.gmail_client import (
+    AsyncGmailClient,
+    GmailApiError,
+    get_message_request,
+    get_thread_request,
+    modify_thread_request,
+)
+from draftly_v1.services.utils.rate_limiter import QuotaLimiter
+
+
+def _batch_response(parts, boundary='batch_resp'):
+    body = ''
+    for index, (status, payload) in enumerate(parts):
+        body += (
+            f'--{boundary}\r\n'
+            'Content-Type: application/http\r\n'
+            f'Content-ID: <response-item{index}>\r\n\r\n'
+            f'HTTP/1.1 {status} OK\r\n'
+            'Content-Type: application/json; charset=UTF-8\r\n\r\n'
+            f'{json.dumps(payload)}\r\n'
+        )
+    body += f'--{boundary}--\r\n'
+    return httpx.Response(200, content=body.encode(),
+                          headers={'Content-Type': f'multipart/mixed; boundary={boundary}'})
+
+
+@pytest.fixture
+def transport():
+    """Install a mock HTTP transport as the shared client pool"""
+    handlers = {}
+
+    def handler(request):
+        return handlers['fn'](request)
+
+    gmail_client._http_client = httpx.AsyncClient(
+        base_url=gmail_client.GMAIL_API_ROOT, transport=httpx.MockTransport(handler))
+    # Fresh quota buckets so server rate limits in one test do not delay the next
+    with patch.object(gmail_client, 'gmail_rate_limiter', QuotaLimiter(user_rate=250, project_rate=20000)):
+        yield handlers
+    gmail_client._http_client = None
+
+
+@pytest.fixture
+def token_provider():
+    return AsyncMock(side_effect=lambda force_refresh: 'fresh' if force_refresh else 'cached')
+
+
+class TestAsyncGmailClient:
+    """Test AsyncGmailClient requests"""
+
+    @pytest.mark.asyncio
+    async def test_get_message_sends_auth_and_params(self, transport, token_provider):
+        """Test a single request carries the bearer token and query params"""
+        seen = {}
+
+        def handle(request):
+            seen['request'] = request
+            return httpx.Response(200, json={'id': 'msg_1'})
+
+        transport['fn'] = handle
+        client = AsyncGmailClient('user@example.com', token_provider)
+        result = await client.get_message('msg_1', format='metadata', metadata_headers=['From', 'To'])
+
+        assert result == {'id': 'msg_1'}
+        request = seen['request']
+        assert request.url.path == '/gmail/v1/users/me/messages/msg_1'
+        assert request.url.params.get_list('metadataHeaders') == ['From', 'To']
+        assert request.headers['Authorization'] == 'Bearer cached'
+
+    @pytest.mark.asyncio
+    async def test_refreshes_token_once_on_401(self, transport, token_provider):
+        """Test a 401 triggers one forced token refresh and a retry"""
+        tokens = []
+
+        def handle(request):
+            tokens.append(request.headers['Authorization'])
+            if len(tokens) == 1:
+                return httpx.Response(401, json={'error': {'code': 401, 'message': 'Invalid Credentials'}})
+            return httpx.Response(200, json={})
+
+        transport['fn'] = handle
+        client = AsyncGmailClient('user@example.com', token_provider)
+        await client.modify_thread('thread_1', {'removeLabelIds': ['UNREAD']})
+
+        assert tokens == ['Bearer cached', 'Bearer fresh']
+
+    @pytest.mark.asyncio
+    async def test_error_response_raises(self, transport, token_provider):
+        """Test API errors surface status, reason and Retry-After"""
+        transport['fn'] = lambda request: httpx.Response(
+            429,
+            json={'error': {'code': 429, 'message': 'Quota exceeded',
+                            'errors': [{'reason': 'rateLimitExceeded'}]}},
+            headers={'Retry-After': '3'})
+        client = AsyncGmailClient('user@example.com', token_provider)
+
+        with pytest.raises(GmailApiError) as exc_info:
+            await client.get_thread('thread_1')
+
+        assert exc_info.value.status_code == 429
+        assert exc_info.value.reason == 'rateLimitExceeded'
+        assert exc_info.value.retry_after == 3.0
+        assert 'quota' in str(exc_info.value).lower()
+
+    @pytest.mark.asyncio
+    async def test_batch_round_trip(self, transport, token_provider):
+        """Test multipart batch encoding and per-item decoding"""
+        seen = {}
+
+        def handle(request):
+            seen['body'] = request.content.decode()
+            return _batch_response([
+                (200, {'id': 'msg_1'}),
+                (404, {'error': {'code': 404, 'message': 'Not Found'}}),
+                (200, {}),
+            ])
+
+        transport['fn'] = handle
+        client = AsyncGmailClient('user@example.com', token_provider)
+        results = await client.batch({
+            'msg_1': get_message_request('msg_1', format='minimal'),
+            'msg_2': get_message_request('msg_2', format='minimal'),
+            'thread_1': modify_thread_request('thread_1', {'removeLabelIds': ['UNREAD']}),
+        })
+
+        assert 'GET /gmail/v1/users/me/messages/msg_1?format=minimal HTTP/1.1' in seen['body']
+        assert 'POST /gmail/v1/users/me/threads/thread_1/modify HTTP/1.1' in seen['body']
+        assert results['msg_1'].ok and results['msg_1'].data == {'id': 'msg_1'}
+        assert not results['msg_2'].ok
+        assert results['msg_2'].error.status_code == 404
+        assert results['thread_1'].ok
+
+    @pytest.mark.asyncio
+    async def test_response_bytes_are_recorded(self, transport, token_provider):
+        """Test response sizes are counted per endpoint and sent with the fields mask"""
+        seen = {}
+
+        def handle(request):
+            seen['fields'] = request.url.params.get('fields')
+            return httpx.Response(200, content=b'{"id": "thread_1"}')
+
+        transport['fn'] = handle
+        gmail_client.reset_response_stats()
+        client = AsyncGmailClient('user@example.com', token_provider)
+        await client.get_thread('thread_1', format='minimal', fields='historyId')
+
+        stats = gmail_client.get_response_stats()
+        assert seen['fields'] == 'historyId'
+        assert stats['GET threads'] == {'requests': 1, 'response_bytes': 18, 'bytes_per_request': 18}
+        assert stats['total']['requests'] == 1
+        gmail_client.reset_response_stats()
+
+
+class TestQuotaLimiting:
+    """Test the client consults and feeds the quota limiter"""
+
+    @pytest.mark.asyncio
+    async def test_units_charged_per_call(self, transport, token_provider):
+        """Test single calls and batches reserve their Gmail quota cost"""
+        transport['fn'] = lambda request: (
+            _batch_response([(200, {}), (200, {})]) if request.url.path.startswith('/batch')
+            else httpx.Response(200, json={}))
+        limiter = MagicMock()
+        limiter.acquire = AsyncMock(return_value=0)
+        client = AsyncGmailClient('user@example.com', token_provider, rate_limiter=limiter)
+
+        await client.send_message({'raw': 'x'})
+        await client.batch({'a': get_message_request('a'), 'b': get_thread_request('b')})
+
+        assert [c.args for c in limiter.acquire.await_args_list] == [
+            ('user@example.com', gmail_client.QUOTA_UNITS['messages.send']),
+            ('user@example.com', gmail_client.QUOTA_UNITS['messages.get'] + gmail_client.QUOTA_UNITS['threads.get']),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_response_blocks_user(self, transport, token_provider):
+        """Test a 429 with Retry-After holds the user's bucket"""
+        transport['fn'] = lambda request: httpx.Response(
+            429, json={'error': {'message': 'Too many requests'}}, headers={'Retry-After': '2'})
+        limiter = MagicMock()
+        limiter.acquire = AsyncMock(return_value=0)
+        client = AsyncGmailClient('user@example.com', token_provider, rate_limiter=limiter)
+
+        with pytest.raises(GmailApiError):
+            await client.get_profile()
+        limiter.rate_limited_by_server.assert_called_once_with('user@example.com', 2.0)
+
+    @pytest.mark.asyncio
+    async def test_pool_stats_count_requests(self, transport, token_provider):
+        """Test requests on the shared pool are counted for the reuse metrics"""
+        transport['fn'] = lambda request: httpx.Response(200, json={'historyId': '1'})
+        before = gmail_client.get_pool_stats()["requests"]
+        client = AsyncGmailClient('user@example.com', token_provider)
+
+        await client.get_profile()
+        await client.get_profile()
+
+        stats = gmail_client.get_pool_stats()
+        assert stats["requests"] == before + 2
+        assert 0.0 <= stats["reuse_ratio"] <= 1.0
@@ -1,30 +1,53 @@
 """Tests for Gmail services"""
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi import HTTPException
 from google.auth.exceptions import RefreshError
 from draftly_v1.services.gmail_services import (
     fetch_latest_email,
     fetch_email_thread_by_id,
     mark_thread_as_read,
-    get_user_creds
+    _get_access_token
 )
+from draftly_v1.services.gmail_client import GmailApiError, GmailBatchResponse
+from draftly_v1.services.gmail_batch import gmail_batch_executor
+
+
+@pytest.fixture(autouse=True)
+def no_batch_backoff():
+    """Retry failed batch items without sleeping"""
+    with patch.object(gmail_batch_executor, 'backoff_base', 0):
+        yield
 
 
 @pytest.fixture
-def mock_gmail_service():
-    """Mock Gmail API service"""
-    service = MagicMock()
-    return service
+def mock_gmail_client():
+    """Mock asyncio Gmail client"""
+    client = MagicMock()
+    client.email = 'test@example.com'
+    client.get_profile = AsyncMock(return_value={'historyId': '100'})
+    client.list_messages = AsyncMock()
+    client.get_thread = AsyncMock()
+    client.modify_thread = AsyncMock()
+    client.batch = AsyncMock()
+    return client
 
 
 @pytest.fixture
-def mock_get_user_creds():
-    """Mock get_user_creds function"""
-    with patch('draftly_v1.services.gmail_services.get_user_creds') as mock:
+def mock_get_gmail_client(mock_gmail_client):
+    """Mock get_gmail_client function"""
+    with patch('draftly_v1.services.gmail_services.get_gmail_client', return_value=mock_gmail_client) as mock:
         yield mock
 
 
+@pytest.fixture
+def no_sync_cursor():
+    """No stored inbox cursor, so fetches run a full sync"""
+    with patch('draftly_v1.services.sync_services.get_sync_cursor', return_value=None), \
+         patch('draftly_v1.services.sync_services.save_sync_cursor') as mock_save:
+        yield mock_save
+
+
 @pytest.fixture
 def sample_messages():
     """Sample Gmail messages"""
@@ -61,65 +84,57 @@ class TestGmailServices:
     """Test Gmail service functions"""
     
     @pytest.mark.asyncio
-    async def test_fetch_latest_email_success(self, mock_get_user_creds, mock_gmail_service, sample_messages):
+    async def test_fetch_latest_email_success(self, no_sync_cursor, mock_get_gmail_client, mock_gmail_client, sample_messages):
         """Test successfully fetching latest emails"""
-        mock_get_user_creds.return_value = mock_gmail_service
-        
-        # Mock list response
-        mock_gmail_service.users().messages().list().execute.return_value = {
-            'messages': sample_messages
+        mock_gmail_client.list_messages.return_value = {'messages': sample_messages}
+        
+        # Mock batch responses (msg_3 failed)
+        mock_gmail_client.batch.return_value = {
+            'msg_1': GmailBatchResponse(200, data={
+                'id': 'msg_1',
+                'threadId': 'thread_1',
+                'snippet': 'Test 1',
+                'payload': {'headers': [
+                    {'name': 'From', 'value': 'sender1@example.com'},
+                    {'name': 'Subject', 'value': 'Subject 1'}
+                ]}
+            }),
+            'msg_2': GmailBatchResponse(200, data={
+                'id': 'msg_2',
+                'threadId': 'thread_2',
+                'snippet': 'Test 2',
+                'payload': {'headers': [
+                    {'name': 'From', 'value': 'sender2@example.com'},
+                    {'name': 'Subject', 'value': 'Subject 2'}
+                ]}
+            }),
+            'msg_3': GmailBatchResponse(500, error=GmailApiError(500, 'Backend Error')),
         }
         
-        # Mock batch responses
-        def mock_callback_setup(*args, **kwargs):
-            callback = kwargs.get('callback')
-            if callback:
-                # Simulate batch responses
-                callback('msg_1', {
-                    'id': 'msg_1',
-                    'threadId': 'thread_1',
-                    'snippet': 'Test 1',
-                    'payload': {'headers': [
-                        {'name': 'From', 'value': 'sender1@example.com'},
-                        {'name': 'Subject', 'value': 'Subject 1'}
-                    ]}
-                }, None)
-                callback('msg_2', {
-                    'id': 'msg_2',
-                    'threadId': 'thread_2',
-                    'snippet': 'Test 2',
-                    'payload': {'headers': [
-                        {'name': 'From', 'value': 'sender2@example.com'},
-                        {'name': 'Subject', 'value': 'Subject 2'}
-                    ]}
-                }, None)
-            return MagicMock()
-        
-        mock_gmail_service.new_batch_http_request = mock_callback_setup
-        
         result = await fetch_latest_email('test@example.com')
         
         assert 'messages' in result
-        assert 'msgId' in result['messages']
-        assert 'threadId' in result['messages']
-        assert len(result['messages']['msgId']) >= 1
+        assert result['messages']['msgId'] == ['msg_1', 'msg_2']
+        assert result['messages']['threadId'] == ['thread_1', 'thread_2']
+        assert result['messages']['from'] == ['sender1@example.com', 'sender2@example.com']
+        # The full sync stores a cursor for the next incremental sync
+        assert no_sync_cursor.call_args[0][1] == '100'
     
     @pytest.mark.asyncio
-    async def test_fetch_latest_email_no_messages(self, mock_get_user_creds, mock_gmail_service):
+    async def test_fetch_latest_email_no_messages(self, no_sync_cursor, mock_get_gmail_client, mock_gmail_client):
         """Test fetching when no unread emails exist"""
-        mock_get_user_creds.return_value = mock_gmail_service
-        mock_gmail_service.users().messages().list().execute.return_value = {'messages': []}
+        mock_gmail_client.list_messages.return_value = {'messages': []}
         
         result = await fetch_latest_email('test@example.com')
         
         assert 'message' in result
         assert 'No new unread emails' in result['message']
+        mock_gmail_client.batch.assert_not_called()
     
     @pytest.mark.asyncio
-    async def test_fetch_latest_email_refresh_error(self, mock_get_user_creds, mock_gmail_service):
+    async def test_fetch_latest_email_refresh_error(self, no_sync_cursor, mock_get_gmail_client, mock_gmail_client):
         """Test handling RefreshError (expired credentials)"""
-        mock_get_user_creds.return_value = mock_gmail_service
-        mock_gmail_service.users().messages().list().execute.side_effect = RefreshError('Token expired')
+        mock_gmail_client.list_messages.side_effect = RefreshError('Token expired')
         
         with pytest.raises(HTTPException) as exc_info:
             await fetch_latest_email('test@example.com')
@@ -128,12 +143,16 @@ class TestGmailServices:
         assert 'expired' in exc_info.value.detail.lower()
     
     @pytest.mark.asyncio
-    async def test_fetch_email_thread_by_id_success(self, mock_get_user_creds, mock_gmail_service, sample_message_details):
+    async def test_fetch_email_thread_by_id_success(self, mock_get_gmail_client, mock_gmail_client, sample_message_details):
         """Test successfully fetching email thread"""
-        mock_get_user_creds.return_value = mock_gmail_service
-        mock_gmail_service.users().threads().get().execute.return_value = {
+        # Tiered fetch: thread metadata first, then the body of the newest message
+        mock_gmail_client.get_thread.return_value = {
+            'historyId': '10',
             'messages': [sample_message_details]
         }
+        mock_gmail_client.batch.return_value = {
+            'msg_1': GmailBatchResponse(200, data={'id': 'msg_1', 'payload': sample_message_details['payload']})
+        }
         
         result = await fetch_email_thread_by_id('test@example.com', 'thread_123')
         
@@ -142,39 +161,55 @@ class TestGmailServices:
         assert len(result['llm_context']) > 0
         assert result['llm_context'][0]['from'] == 'sender@example.com'
         assert result['llm_context'][0]['subject'] == 'Test Subject'
+        assert result['llm_context'][0]['body'] == 'Test body'
     
     @pytest.mark.asyncio
-    async def test_fetch_email_thread_by_id_error(self, mock_get_user_creds, mock_gmail_service):
+    async def test_fetch_email_thread_by_id_error(self, mock_get_gmail_client, mock_gmail_client):
         """Test error handling when fetching thread fails"""
-        mock_get_user_creds.return_value = mock_gmail_service
-        mock_gmail_service.users().threads().get().execute.side_effect = Exception('API Error')
+        mock_gmail_client.get_thread.side_effect = Exception('API Error')
         
         with pytest.raises(HTTPException) as exc_info:
             await fetch_email_thread_by_id('test@example.com', 'thread_123')
         
         assert exc_info.value.status_code == 500
     
-    def test_mark_thread_as_read_success(self, mock_get_user_creds, mock_gmail_service):
+    @pytest.mark.asyncio
+    async def test_mark_thread_as_read_success(self, mock_get_gmail_client, mock_gmail_client):
         """Test successfully marking thread as read"""
-        mock_get_user_creds.return_value = mock_gmail_service
-        mock_gmail_service.users().threads().modify().execute.return_value = {}
+        mock_gmail_client.modify_thread.return_value = {}
         
-        result = mark_thread_as_read('test@example.com', 'thread_123')
+        result = await mark_thread_as_read('test@example.com', 'thread_123')
         
         assert result is True
-        # Verify modify was called - use call_args_list due to method chaining
-        call_args_list = mock_gmail_service.users().threads().modify.call_args_list
-        actual_calls = [c for c in call_args_list if c[1]]
-        assert len(actual_calls) == 1
-        assert actual_calls[0][1]['userId'] == 'me'
-        assert actual_calls[0][1]['id'] == 'thread_123'
-        assert actual_calls[0][1]['body'] == {'removeLabelIds': ['UNREAD']}
+        mock_gmail_client.modify_thread.assert_awaited_once_with(
+            'thread_123', body={'removeLabelIds': ['UNREAD']}, fields='id'
+        )
     
-    def test_mark_thread_as_read_failure(self, mock_get_user_creds, mock_gmail_service):
+    @pytest.mark.asyncio
+    async def test_mark_thread_as_read_failure(self, mock_get_gmail_client, mock_gmail_client):
         """Test handling error when marking thread as read"""
-        mock_get_user_creds.return_value = mock_gmail_service
-        mock_gmail_service.users().threads().modify().execute.side_effect = Exception('API Error')
+        mock_gmail_client.modify_thread.side_effect = Exception('API Error')
         
-        result = mark_thread_as_read('test@example.com', 'thread_123')
+        result = await mark_thread_as_read('test@example.com', 'thread_123')
         
         assert result is False
+
+    @pytest.mark.asyncio
+    async def test_access_token_served_from_store(self):
+        """Test a cached access token is used without touching the database"""
+        with patch('draftly_v1.services.gmail_services.access_token_store') as mock_store, \
+             patch('draftly_v1.services.gmail_services.get_creds_from_db') as mock_get_creds:
+            mock_store.get.return_value = ('cached_token', None)
+            token = await _get_access_token('test@example.com')
+        assert token == 'cached_token'
+        mock_get_creds.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_access_token_force_refresh(self):
+        """Test a forced refresh invalidates the cached token first"""
+        with patch('draftly_v1.services.gmail_services.access_token_store') as mock_store, \
+             patch('draftly_v1.services.gmail_services.get_creds_from_db',
+                   return_value={'token': 'new_token'}):
+            token = await _get_access_token('test@example.com', force_refresh=True)
+        assert token == 'new_token'
+        mock_store.invalidate.assert_called_once_with('test@example.com')
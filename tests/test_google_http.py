@@ -0,0 +1,89 @@
+"""Tests for the shared Google HTTP transport"""
+import json
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from draftly_v1.services import google_http
+from draftly_v1.services.google_http import PooledHttp, authorized_http, get_http_session
+
+GMAIL_DISCOVERY_DOC = json.loads(get_static_doc('gmail', 'v1'))
+
+
+def _response(status=200, payload=None, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(payload or {}).encode()
+    response.headers.update({'Content-Type': 'application/json', 'Content-Encoding': 'gzip', **(headers or {})})
+    return response
+
+
+@pytest.fixture
+def session():
+    """Replace the shared session's request method"""
+    session = get_http_session()
+    with patch.object(session, 'request', return_value=_response(payload={'id': 'msg_1'})) as request:
+        yield request
+
+
+class TestGoogleHttp:
+    """Test the pooled transport used by googleapiclient and google-auth"""
+
+    def test_session_is_shared(self):
+        """Test every caller gets the same pooled session with gzip headers"""
+        session = get_http_session()
+        assert get_http_session() is session
+        assert 'gzip' in session.headers['User-Agent']
+        assert session.get_adapter('https://gmail.googleapis.com')._pool_maxsize == google_http.GOOGLE_HTTP_POOL_MAXSIZE
+
+    def test_request_returns_httplib2_response(self, session):
+        """Test responses are translated to the httplib2 shape without the decoded encoding"""
+        response, content = PooledHttp(timeout=5).request('https://example.com/x', 'POST', body='{}',
+                                                          headers={'a': 'b'})
+
+        assert response.status == 200
+        assert 'content-encoding' not in response
+        assert json.loads(content) == {'id': 'msg_1'}
+        session.assert_called_once_with('POST', 'https://example.com/x', data='{}', headers={'a': 'b'},
+                                        timeout=5, allow_redirects=True)
+
+    def test_built_service_uses_shared_session(self, session):
+        """Test a googleapiclient service sends its calls through the pool with the bearer token"""
+        creds = Credentials(token='access_123')
+        service = build_from_document(GMAIL_DISCOVERY_DOC, http=authorized_http(creds))
+
+        result = service.users().messages().get(userId='me', id='msg_1').execute()
+
+        assert result == {'id': 'msg_1'}
+        headers = session.call_args.kwargs['headers']
+        assert headers['authorization'] == 'Bearer access_123'
+
+    def test_add_certificate_sets_session_cert(self):
+        """Test a client certificate is configured on the shared session"""
+        with patch.object(google_http, '_session', requests.Session()):
+            PooledHttp().add_certificate('client.key', 'client.pem', '')
+            assert get_http_session().cert == ('client.pem', 'client.key')
+
+    def test_add_certificate_rejects_password(self):
+        """Test an encrypted key is refused with a clear error instead of ignored"""
+        with patch.object(google_http, '_session', requests.Session()):
+            with pytest.raises(ValueError, match='Password-protected'):
+                PooledHttp().add_certificate('client.key', 'client.pem', '',
+                                             password='secret')
+            assert get_http_session().cert is None
+
+    def test_transport_stats_report_reuse(self):
+        """Test per-host request and connection counters"""
+        pool = MagicMock(scheme='https', host='oauth2.googleapis.com', num_requests=4, num_connections=1)
+        adapter = MagicMock()
+        adapter.poolmanager.pools.keys.return_value = ['key']
+        adapter.poolmanager.pools.get.return_value = pool
+        session = MagicMock(adapters={'https://': adapter, 'http://': adapter})
+
+        with patch.object(google_http, '_session', session):
+            stats = google_http.get_transport_stats()
+
+        assert stats == {'https://oauth2.googleapis.com': {
+            'requests': 4, 'connections_opened': 1, 'reuse_ratio': 0.75}}
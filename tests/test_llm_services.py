@@ -0,0 +1,119 @@
+"""Tests for the shared LLM clients"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from draftly_v1.services import llm_services
+from draftly_v1.services.draft_cache import DraftCache
+from draftly_v1.services.utils.scheduler import FairScheduler, PRIORITY_BACKGROUND
+from draftly_v1.services.llm_services import LLMClientRegistry, DRAFT_PROMPT, generate_draft, agenerate_draft
+
+
+@pytest.fixture
+def chatgroq():
+    """ChatGroq returning a new mock client per construction"""
+    with patch('draftly_v1.services.llm_services.ChatGroq', side_effect=lambda **kwargs: MagicMock()) as mock:
+        yield mock
+
+
+class TestLLMClientRegistry:
+    """Test client and chain reuse"""
+
+    def test_client_is_built_once_per_parameters(self, chatgroq):
+        """Test repeated lookups share one client and other parameters get their own"""
+        registry = LLMClientRegistry()
+
+        first = registry.get()
+        assert registry.get() is first
+        other = registry.get(temperature=0.1)
+
+        assert other is not first
+        assert chatgroq.call_count == 2
+        assert registry.stats()['hits'] == 1
+
+    def test_defaults_follow_config_and_share_the_pool(self, chatgroq):
+        """Test the configured model is used and every client gets the same HTTP pool"""
+        registry = LLMClientRegistry()
+        with patch('draftly_v1.services.llm_services.GROQ_MODEL_NAME', 'configured-model'):
+            registry.get()
+        registry.get(model='other-model')
+
+        first, second = (call.kwargs for call in chatgroq.call_args_list)
+        assert first['model'] == 'configured-model'
+        assert second['model'] == 'other-model'
+        assert first['http_client'] is second['http_client'] is not None
+        assert first['http_async_client'] is second['http_async_client']
+
+    def test_chain_is_composed_once(self, chatgroq):
+        """Test the same prompt and client give back the same chain"""
+        registry = LLMClientRegistry()
+
+        assert registry.chain(DRAFT_PROMPT) is registry.chain(DRAFT_PROMPT)
+        assert registry.stats()['chains'] == 1
+
+    @pytest.mark.asyncio
+    async def test_close_forgets_clients(self, chatgroq):
+        """Test closing drops the clients so the next lookup builds a new one"""
+        registry = LLMClientRegistry()
+        first = registry.get()
+
+        await registry.close()
+
+        assert registry.get() is not first
+
+
+class TestGenerateDraft:
+    """Test generate_draft uses the shared chain"""
+
+    def test_invokes_shared_chain(self):
+        """Test the draft comes from the cached chain with the formatted thread"""
+        chain = MagicMock()
+        chain.invoke.return_value = '<p>Reply</p>'
+        context = [{'from': 'a@example.com', 'subject': 'Hi', 'body': '<b>Hello</b>'}]
+        with patch.object(llm_services, 'get_draft_chain', return_value=chain):
+            assert generate_draft(context, 'Friendly', 'Sam') == '<p>Reply</p>'
+
+        variables = chain.invoke.call_args[0][0]
+        assert variables['user_style'] == 'Friendly'
+        assert variables['sender_name'] == 'Sam'
+        assert 'Hello' in variables['email_context']
+
+    @pytest.mark.asyncio
+    async def test_async_draft_waits_for_a_scheduler_slot(self):
+        """Test the async gateway awaits ainvoke inside a scheduler slot for the user"""
+        chain = MagicMock()
+        chain.ainvoke = AsyncMock(return_value='<p>Reply</p>')
+        scheduler = FairScheduler(max_concurrency=1)
+        with patch.object(llm_services, 'get_draft_chain', return_value=chain), \
+             patch.object(llm_services, 'llm_scheduler', scheduler):
+            draft = await agenerate_draft([{'body': 'Hello'}], 'Friendly', 'Sam', user='sam@example.com',
+                                          priority=PRIORITY_BACKGROUND)
+
+        assert draft == '<p>Reply</p>'
+        assert scheduler.stats()['priorities']['background']['granted'] == 1
+        chain.invoke.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_identical_prompt_is_served_from_cache(self):
+        """Test a repeated prompt skips the LLM unless a fresh draft is forced"""
+        chain = MagicMock()
+        chain.ainvoke = AsyncMock(side_effect=['<p>First</p>', '<p>Second</p>'])
+        context = [{'body': 'Hello'}]
+        with patch.object(llm_services, 'get_draft_chain', return_value=chain), \
+             patch.object(llm_services, 'draft_cache', DraftCache(db_loader=None, db_saver=None)) as cache:
+            assert await agenerate_draft(context, 'Friendly', 'Sam') == '<p>First</p>'
+            assert await agenerate_draft(context, 'Friendly', 'Sam') == '<p>First</p>'
+            assert await agenerate_draft(context, 'Formal', 'Sam') == '<p>Second</p>'
+
+        assert chain.ainvoke.await_count == 2
+        assert cache.stats()['memory_hits'] == 1
+
+    @pytest.mark.asyncio
+    async def test_force_fresh_regenerates(self):
+        """Test force_fresh calls the LLM and replaces the cached draft"""
+        chain = MagicMock()
+        chain.ainvoke = AsyncMock(side_effect=['<p>First</p>', '<p>Second</p>'])
+        context = [{'body': 'Hello'}]
+        with patch.object(llm_services, 'get_draft_chain', return_value=chain), \
+             patch.object(llm_services, 'draft_cache', DraftCache(db_loader=None, db_saver=None)):
+            await agenerate_draft(context, 'Friendly', 'Sam')
+            assert await agenerate_draft(context, 'Friendly', 'Sam', force_fresh=True) == '<p>Second</p>'
+            assert await agenerate_draft(context, 'Friendly', 'Sam') == '<p>Second</p>'
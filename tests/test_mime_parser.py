@@ -0,0 +1,51 @@
+"""Tests for MIME body extraction"""
+import base64
+from unittest.mock import patch
+from draftly_v1.services.utils import mime_parser
+from draftly_v1.services.utils.mime_parser import decode_body_data, extract_body
+
+
+def _part(mime_type, text, **extra):
+    return {'mimeType': mime_type, 'body': {'data': base64.urlsafe_b64encode(text.encode()).decode()}, **extra}
+
+
+class TestExtractBody:
+    """Test the recursive MIME walker"""
+
+    def test_prefers_plain_in_nested_alternative(self):
+        """Test text/plain inside nested multiparts is found and HTML is not decoded"""
+        payload = {'mimeType': 'multipart/mixed', 'parts': [
+            {'mimeType': 'multipart/alternative', 'parts': [
+                _part('text/plain', 'Hello\r\nthere'),
+                _part('text/html', '<p>Hello there</p>'),
+            ]},
+            _part('application/pdf', 'binary', filename='report.pdf'),
+        ]}
+        with patch.object(mime_parser, 'decode_body_data', wraps=decode_body_data) as decode:
+            assert extract_body(payload) == 'Hello there'
+        assert decode.call_count == 1
+
+    def test_falls_back_to_html(self):
+        """Test HTML is used when there is no usable plain text"""
+        payload = {'mimeType': 'multipart/alternative', 'parts': [
+            _part('text/plain', ' \r\n'),
+            _part('text/html', '<p>Only\thtml</p>'),
+        ]}
+        assert extract_body(payload) == '<p>Only html</p>'
+
+    def test_single_part_body(self):
+        """Test a non-multipart payload without padding decodes"""
+        payload = {'mimeType': 'text/plain', 'body': {'data': 'VGVzdCBib2R5'}}
+        assert extract_body(payload) == 'Test body'
+
+    def test_strip_quoted_history(self):
+        """Test quoted history is dropped from the latest reply"""
+        html = {'mimeType': 'text/html', 'parts': [
+            _part('text/html', '<p>Sure</p><div class="gmail_quote">old</div>')]}
+        plain = _part('text/plain', 'Sure\n\nOn Mon, Jan 1, 2024 Bob wrote:\n> old')
+        assert extract_body(html, strip_quoted=True) == '<p>Sure</p>'
+        assert extract_body(plain, strip_quoted=True) == 'Sure'
+
+    def test_empty_payload(self):
+        """Test payloads without text parts give an empty body"""
+        assert extract_body({}) == ''
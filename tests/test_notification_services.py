@@ -0,0 +1,112 @@
+"""Tests for Gmail push notifications"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from draftly_v1.app import app
+from draftly_v1.services.notification_services import (
+    InboxNotifier,
+    LocalPushPublisher,
+    build_push_envelope,
+    decode_push_notification,
+)
+
+
+class TestPushDecoding:
+    """Test Pub/Sub envelope handling"""
+
+    def test_round_trip(self):
+        """Test an envelope built locally decodes to the same notification"""
+        envelope = build_push_envelope('user@example.com', 12345)
+        assert decode_push_notification(envelope) == ('user@example.com', '12345')
+
+    def test_invalid_envelope(self):
+        """Test malformed envelopes are rejected"""
+        with pytest.raises(ValueError):
+            decode_push_notification({'message': {'data': 'not-base64-json'}})
+
+
+class TestInboxNotifier:
+    """Test coalescing and fan-out"""
+
+    @pytest.mark.asyncio
+    async def test_burst_is_coalesced_into_one_sync(self):
+        """Test several notifications close together trigger a single sync"""
+        sync = AsyncMock(return_value={'messages': {'msgId': ['m1']}})
+        notifier = InboxNotifier(sync, coalesce_window=0.01)
+        queue = notifier.subscribe('user@example.com')
+
+        for history_id in range(5):
+            notifier.notify('user@example.com', str(history_id))
+        payload = await asyncio.wait_for(queue.get(), timeout=1)
+
+        assert payload == {'messages': {'msgId': ['m1']}}
+        assert sync.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_notification_during_sync_runs_one_follow_up(self):
+        """Test notifications arriving mid-sync cause exactly one more sync"""
+        notifier = None
+
+        async def slow_sync(email):
+            if sync.await_count == 1:
+                notifier.notify(email)
+                notifier.notify(email)
+            await asyncio.sleep(0.01)
+            return {'n': sync.await_count}
+
+        sync = AsyncMock(side_effect=slow_sync)
+        notifier = InboxNotifier(sync, coalesce_window=0.01)
+        queue = notifier.subscribe('user@example.com')
+
+        notifier.notify('user@example.com')
+        await asyncio.wait_for(queue.get(), timeout=1)
+        await asyncio.wait_for(queue.get(), timeout=1)
+
+        assert sync.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_no_sync_without_subscribers(self):
+        """Test notifications for users without open streams are ignored"""
+        sync = AsyncMock()
+        notifier = InboxNotifier(sync, coalesce_window=0)
+        notifier.notify('user@example.com')
+        await asyncio.sleep(0.01)
+        sync.assert_not_called()
+
+
+class TestPushWebhook:
+    """Test the webhook with the local publisher"""
+
+    @pytest.fixture
+    def push_token(self):
+        with patch('draftly_v1.routes.notification_routes.PUBSUB_VERIFICATION_TOKEN', 'push-secret'):
+            yield 'push-secret'
+
+    def test_local_publisher_reaches_notifier(self, push_token):
+        """Test a locally published notification is acknowledged and dispatched"""
+        publisher = LocalPushPublisher(TestClient(app), token=push_token)
+        with patch('draftly_v1.routes.notification_routes.inbox_notifier') as mock_notifier:
+            response = publisher.publish('user@example.com', 777)
+        assert response.status_code == 204
+        mock_notifier.notify.assert_called_once_with('user@example.com', '777')
+
+    def test_malformed_notification_rejected(self, push_token):
+        """Test the webhook rejects envelopes without Gmail data"""
+        response = TestClient(app).post('/notifications/gmail', json={'message': {}}, params={'token': push_token})
+        assert response.status_code == 400
+
+    def test_wrong_token_rejected(self, push_token):
+        """Test a notification without the shared token is refused"""
+        with patch('draftly_v1.routes.notification_routes.inbox_notifier') as mock_notifier:
+            response = LocalPushPublisher(TestClient(app), token='guess').publish('user@example.com', 1)
+        assert response.status_code == 403
+        mock_notifier.notify.assert_not_called()
+
+    def test_rejected_when_token_not_configured(self):
+        """Test the webhook accepts nothing while PUBSUB_VERIFICATION_TOKEN is unset"""
+        with patch('draftly_v1.routes.notification_routes.PUBSUB_VERIFICATION_TOKEN', None), \
+                patch('draftly_v1.routes.notification_routes.inbox_notifier') as mock_notifier:
+            response = LocalPushPublisher(TestClient(app)).publish('user@example.com', 1)
+        assert response.status_code == 403
+        mock_notifier.notify.assert_not_called()
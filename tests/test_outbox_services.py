@@ -0,0 +1,284 @@
+"""Tests for the durable send outbox"""
+import httpx
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi.testclient import TestClient
+from draftly_v1.app import app
+from draftly_v1.model.IdempotencyRecord import IdempotencyRecord
+from draftly_v1.model.OutboxJob import OutboxJob
+from draftly_v1.services.database import (engine, enqueue_outbox_job, claim_outbox_jobs, finish_outbox_job,
+                                          get_outbox_job, requeue_running_outbox_jobs)
+from draftly_v1.services.gmail_client import GmailApiError
+from draftly_v1.services.outbox_services import OutboxDispatcher, IdempotencyKeyReuseError
+
+
+@pytest.fixture
+def outbox_table():
+    """Real outbox table in the test SQLite database"""
+    OutboxJob.__table__.create(bind=engine, checkfirst=True)
+    IdempotencyRecord.__table__.create(bind=engine, checkfirst=True)
+    yield
+
+
+def _enqueue(email, thread_id='thread_1', draft_only=False):
+    return enqueue_outbox_job(email, thread_id, 'to@example.com', '<p>Hi</p>', draft_only)
+
+
+class TestOutboxQueue:
+    """Test claiming jobs from the outbox table"""
+
+    def test_claims_oldest_job_per_user(self, outbox_table):
+        """Test only each user's oldest job is claimable, so replies keep their order"""
+        first = _enqueue('a@example.com')
+        second = _enqueue('a@example.com')
+        other = _enqueue('b@example.com')
+
+        claimed = claim_outbox_jobs(10)
+        assert [job['job_id'] for job in claimed] == [first['job_id'], other['job_id']]
+        assert all(job['attempts'] == 1 for job in claimed)
+        assert claim_outbox_jobs(10) == []
+
+        finish_outbox_job(first['job_id'], 'DONE', result={'message_id': 'm1'})
+        assert [job['job_id'] for job in claim_outbox_jobs(10)] == [second['job_id']]
+
+    def test_interrupted_jobs_are_requeued(self, outbox_table):
+        """Test RUNNING jobs whose lease expired become claimable again"""
+        job = _enqueue('a@example.com')
+        claim_outbox_jobs(1, lease_seconds=-1)
+
+        assert requeue_running_outbox_jobs() == 1
+        claimed = claim_outbox_jobs(1)
+        assert claimed[0]['job_id'] == job['job_id']
+        assert claimed[0]['attempts'] == 2
+
+    def test_leased_jobs_are_not_taken_over(self, outbox_table):
+        """Test a job another worker is still running is neither requeued nor claimed again"""
+        _enqueue('a@example.com')
+        claim_outbox_jobs(1)
+
+        assert requeue_running_outbox_jobs() == 0
+        assert claim_outbox_jobs(1) == []
+
+    def test_expired_lease_is_claimed_without_restart(self, outbox_table):
+        """Test a worker picks up a RUNNING job whose worker died once the lease runs out"""
+        job = _enqueue('a@example.com')
+        claim_outbox_jobs(1, lease_seconds=-1)
+
+        claimed = claim_outbox_jobs(1)
+        assert [item['job_id'] for item in claimed] == [job['job_id']]
+        assert claimed[0]['attempts'] == 2
+        assert claim_outbox_jobs(1) == []
+
+
+class TestOutboxDispatcher:
+    """Test delivery attempts and retries"""
+
+    @pytest.mark.asyncio
+    async def test_successful_delivery(self, outbox_table):
+        """Test a delivered job is DONE with the Gmail ids"""
+        deliver = AsyncMock(return_value={'message_id': 'sent_1'})
+        dispatcher = OutboxDispatcher(deliver=deliver)
+        job = await dispatcher.enqueue('a@example.com', 'thread_1', 'to@example.com', '<p>Hi</p>', False)
+
+        assert await dispatcher.run_once() is True
+
+        stored = get_outbox_job(job['job_id'], 'a@example.com')
+        assert stored['status'] == 'DONE'
+        assert stored['result'] == {'message_id': 'sent_1'}
+        assert deliver.await_args[0][0]['thread_id'] == 'thread_1'
+
+    @pytest.mark.asyncio
+    async def test_transient_error_is_retried_later(self, outbox_table):
+        """Test a retryable failure schedules a backed-off retry instead of retrying inline"""
+        deliver = AsyncMock(side_effect=GmailApiError(503, 'Backend Error'))
+        dispatcher = OutboxDispatcher(deliver=deliver, backoff_base=30)
+        job = await dispatcher.enqueue('a@example.com', 'thread_1', 'to@example.com', '<p>Hi</p>', False)
+
+        await dispatcher.run_once()
+
+        assert get_outbox_job(job['job_id'])['status'] == 'RETRY'
+        # Not due yet, and it blocks the user's later jobs
+        await dispatcher.enqueue('a@example.com', 'thread_2', 'to@example.com', '<p>Hi</p>', False)
+        assert await dispatcher.run_once() is False
+        assert deliver.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_permanent_error_fails_at_once(self, outbox_table):
+        """Test errors a retry cannot fix fail the job on the first attempt"""
+        deliver = AsyncMock(side_effect=GmailApiError(400, 'Invalid To header'))
+        dispatcher = OutboxDispatcher(deliver=deliver)
+        job = await dispatcher.enqueue('a@example.com', 'thread_1', 'to@example.com', '<p>Hi</p>', False)
+
+        await dispatcher.run_once()
+
+        stored = get_outbox_job(job['job_id'])
+        assert stored['status'] == 'FAILED'
+        assert 'Invalid To header' in stored['last_error']
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_attempts(self, outbox_table):
+        """Test a job fails once its attempts are used up"""
+        deliver = AsyncMock(side_effect=GmailApiError(503, 'Backend Error'))
+        dispatcher = OutboxDispatcher(deliver=deliver, max_attempts=2, backoff_base=0, backoff_max=0)
+        job = await dispatcher.enqueue('a@example.com', 'thread_1', 'to@example.com', '<p>Hi</p>', True)
+
+        await dispatcher.run_once()
+        await dispatcher.run_once()
+
+        assert deliver.await_count == 2
+        assert get_outbox_job(job['job_id'])['status'] == 'FAILED'
+
+
+    @pytest.fixture
+    def gmail_send(self):
+        """Real deliver_reply path down to a mocked Gmail send call"""
+        client = MagicMock()
+        client.send_message = AsyncMock()
+        headers = {'subject': 'Hello', 'message_id': '<m1@example.com>', 'references': ''}
+        with patch('draftly_v1.services.email_services.get_gmail_client', return_value=client), \
+                patch('draftly_v1.services.email_services.get_gmail_draft_id', return_value=None), \
+                patch('draftly_v1.services.email_services.get_draft_reply_headers',
+                      return_value=headers):
+            yield client.send_message
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('error', [
+        GmailApiError(503, 'Backend Error'),
+        httpx.ReadTimeout('timed out'),
+    ])
+    async def test_unconfirmed_send_is_not_retried(self, outbox_table, gmail_send, error):
+        """Test a send that may have gone out ends UNKNOWN after a single Gmail call"""
+        gmail_send.side_effect = error
+        dispatcher = OutboxDispatcher(max_attempts=3, backoff_base=0, backoff_max=0)
+        job = await dispatcher.enqueue('a@example.com', 'thread_1', 'to@example.com',
+                                       '<p>Hi</p>', False)
+
+        assert await dispatcher.run_once() is True
+        assert await dispatcher.run_once() is False
+
+        gmail_send.assert_awaited_once()
+        stored = get_outbox_job(job['job_id'])
+        assert stored['status'] == 'UNKNOWN'
+        assert stored['last_error']
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_send_is_retried(self, outbox_table, gmail_send):
+        """Test a send Gmail refused with 429 is retried, as nothing went out"""
+        gmail_send.side_effect = [GmailApiError(429, 'Rate Limit Exceeded'), {'id': 'sent_1'}]
+        dispatcher = OutboxDispatcher(backoff_base=0, backoff_max=0)
+        job = await dispatcher.enqueue('a@example.com', 'thread_1', 'to@example.com',
+                                       '<p>Hi</p>', False)
+
+        with patch('draftly_v1.services.outbox_services.mark_thread_as_read', AsyncMock()), \
+                patch('draftly_v1.services.outbox_services.delete_thread_context',
+                      return_value=True):
+            await dispatcher.run_once()
+            await dispatcher.run_once()
+
+        assert gmail_send.await_count == 2
+        assert get_outbox_job(job['job_id'])['status'] == 'DONE'
+
+
+class TestIdempotency:
+    """Test Idempotency-Key handling"""
+
+    @pytest.mark.asyncio
+    async def test_repeated_key_returns_first_job(self, outbox_table):
+        """Test a repeated key queues nothing and reports the original job and result"""
+        deliver = AsyncMock(return_value={'message_id': 'sent_1'})
+        dispatcher = OutboxDispatcher(deliver=deliver)
+        args = ('a@example.com', 'thread_1', 'to@example.com', '<p>Hi</p>', False)
+
+        first = await dispatcher.enqueue(*args, idempotency_key='key-1')
+        duplicate = await dispatcher.enqueue(*args, idempotency_key='key-1')
+        assert duplicate['job_id'] == first['job_id']
+        assert duplicate['replayed'] is True
+
+        await dispatcher.run_once()
+        assert await dispatcher.run_once() is False
+        replay = await dispatcher.enqueue(*args, idempotency_key='key-1')
+        assert replay['status'] == 'DONE'
+        assert replay['result'] == {'message_id': 'sent_1'}
+        assert deliver.await_count == 1
+        assert dispatcher.stats()['replayed'] == 2
+
+    @pytest.mark.asyncio
+    async def test_key_reused_for_other_request_is_rejected(self, outbox_table):
+        """Test a key cannot be reused with a different reply"""
+        dispatcher = OutboxDispatcher(deliver=AsyncMock())
+        await dispatcher.enqueue('a@example.com', 'thread_1', 'to@example.com', '<p>Hi</p>', False,
+                                 idempotency_key='key-1')
+
+        with pytest.raises(IdempotencyKeyReuseError):
+            await dispatcher.enqueue('a@example.com', 'thread_1', 'to@example.com', '<p>Other</p>', False,
+                                     idempotency_key='key-1')
+
+    def test_keys_are_per_user(self, outbox_table):
+        """Test two users may use the same key independently"""
+        first = enqueue_outbox_job('a@example.com', 't', 'to@example.com', 'x', False, 'key-1', 'h')
+        second = enqueue_outbox_job('b@example.com', 't', 'to@example.com', 'x', False, 'key-1', 'h')
+
+        assert first['job_id'] != second['job_id']
+        assert not second['replayed']
+
+
+class TestSendRoute:
+    """Test /email/send queues instead of sending inline"""
+
+    def test_send_returns_202_with_job_id(self):
+        """Test the handler only enqueues and answers with the job id"""
+        job = {'job_id': 'job_1', 'status': 'QUEUED'}
+        with patch('draftly_v1.routes.email_routes.validate_session', AsyncMock(return_value='a@example.com')), \
+             patch('draftly_v1.routes.email_routes.outbox_dispatcher.enqueue', AsyncMock(return_value=job)) as enqueue:
+            response = TestClient(app).post('/email/send', json={
+                'thread_id': 'thread_1', 'toEmail': 'to@example.com', 'draft_body': '<p>Hi</p>', 'draft_only': False})
+
+        assert response.status_code == 202
+        assert response.json()['job_id'] == 'job_1'
+        enqueue.assert_awaited_once_with('a@example.com', 'thread_1', 'to@example.com', '<p>Hi</p>', False,
+                                         idempotency_key=None)
+
+    def test_replayed_send_is_reported(self):
+        """Test a duplicate key answers with the first job's status and result"""
+        job = {'job_id': 'job_1', 'thread_id': 'thread_1', 'draft_only': False, 'status': 'DONE', 'attempts': 1,
+               'result': {'message_id': 'sent_1'}, 'last_error': None, 'replayed': True}
+        with patch('draftly_v1.routes.email_routes.validate_session', AsyncMock(return_value='a@example.com')), \
+             patch('draftly_v1.routes.email_routes.outbox_dispatcher.enqueue', AsyncMock(return_value=job)):
+            response = TestClient(app).post('/email/send', headers={'Idempotency-Key': 'key-1'}, json={
+                'thread_id': 'thread_1', 'toEmail': 'to@example.com', 'draft_body': '<p>Hi</p>', 'draft_only': False})
+
+        assert response.status_code == 200
+        assert response.headers['Idempotent-Replayed'] == 'true'
+        assert response.json()['result'] == {'message_id': 'sent_1'}
+
+
+class TestSendBulkRoute:
+    """Test /email/send_bulk"""
+
+    def _post(self, payload, results=None):
+        with patch('draftly_v1.routes.email_routes.validate_session', AsyncMock(return_value='a@example.com')), \
+             patch('draftly_v1.routes.email_routes.deliver_replies_bulk', AsyncMock(return_value=results)) as bulk:
+            return TestClient(app).post('/email/send_bulk', json=payload), bulk
+
+    def test_returns_per_item_status(self):
+        """Test the counts and per-item results are returned"""
+        results = [{'thread_id': 't1', 'draft_only': False, 'status': 'DONE', 'result': {'message_id': 'm1'},
+                    'error': None},
+                   {'thread_id': 't2', 'draft_only': True, 'status': 'FAILED', 'result': None, 'error': 'boom'}]
+        response, bulk = self._post({'items': [
+            {'thread_id': 't1', 'toEmail': 'to@example.com', 'draft_body': 'x', 'draft_only': False},
+            {'thread_id': 't2', 'toEmail': 'to@example.com', 'draft_body': 'y'},
+        ]}, results)
+
+        assert response.status_code == 200
+        assert response.json()['delivered'] == 1 and response.json()['failed'] == 1
+        items = bulk.await_args[0][1]
+        assert items[1]['draft_only'] is True
+
+    def test_duplicate_threads_are_rejected(self):
+        """Test one request cannot reply twice to the same thread"""
+        item = {'thread_id': 't1', 'toEmail': 'to@example.com', 'draft_body': 'x'}
+        response, bulk = self._post({'items': [item, item]})
+
+        assert response.status_code == 400
+        bulk.assert_not_awaited()
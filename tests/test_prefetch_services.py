@@ -0,0 +1,97 @@
+"""Tests for background thread prefetch"""
+import asyncio
+import base64
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from draftly_v1.services import prefetch_services
+from draftly_v1.services.gmail_client import GmailApiError, GmailBatchResponse
+from draftly_v1.services.thread_store import ThreadStore
+from draftly_v1.services.utils.background import UserTaskRegistry
+
+
+def _metadata_thread(thread_id):
+    return {'id': thread_id, 'historyId': '5', 'messages': [{
+        'id': f'{thread_id}_m', 'snippet': 'Hello', 'payload': {'headers': [{'name': 'Subject', 'value': 'Hi'}]}}]}
+
+
+def _message(message_id):
+    data = base64.urlsafe_b64encode(b'<p>Hello</p>').decode()
+    return {'id': message_id, 'payload': {'mimeType': 'text/html', 'body': {'data': data}}}
+
+
+def _batch_item(request_id):
+    if request_id == 'bad':
+        return GmailBatchResponse(404, error=GmailApiError(404, 'Not found'))
+    if request_id.endswith('_m'):
+        return GmailBatchResponse(200, data=_message(request_id))
+    return GmailBatchResponse(200, data=_metadata_thread(request_id))
+
+
+@pytest.fixture
+def client():
+    """Mock Gmail client answering batched threads.get and messages.get"""
+    client = MagicMock()
+    client.email = 'test@example.com'
+    client.batch = AsyncMock(side_effect=lambda requests: {r_id: _batch_item(r_id) for r_id in requests})
+    client.get_thread = AsyncMock()
+    return client
+
+
+class TestThreadPrefetch:
+    """Test prefetching into the thread store"""
+
+    @pytest.mark.asyncio
+    async def test_prefetch_is_tiered_and_batched(self, client):
+        """Test missing threads cost one metadata batch plus one body batch, then are served without calls"""
+        store = ThreadStore(revalidate_after=60)
+        entries = await store.prefetch(client, ['t1', 't2', 'bad', 't1'])
+
+        assert [e['thread_id'] for e in entries] == ['t1', 't2']
+        assert client.batch.await_count == 2
+        threads, messages = (c[0][0] for c in client.batch.call_args_list)
+        assert list(threads) == ['t1', 't2', 'bad']
+        assert all(r.params['format'] == 'metadata' for r in threads.values())
+        assert list(messages) == ['t1_m', 't2_m']
+        entry = await store.get(client, 't1')
+        assert entry['messages'][0]['body'] == '<p>Hello</p>'
+        client.get_thread.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_fresh_threads_are_skipped(self, client):
+        """Test threads already fresh in memory are not fetched again"""
+        store = ThreadStore(revalidate_after=60)
+        await store.prefetch(client, ['t1'])
+        assert await store.prefetch(client, ['t1']) == []
+        assert client.batch.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_schedule_respects_flag(self, client):
+        """Test nothing is scheduled while prefetch is disabled"""
+        with patch.object(prefetch_services, 'THREAD_PREFETCH_ENABLED', False):
+            assert prefetch_services.schedule_thread_prefetch(client, ['t1']) is None
+
+
+class TestUserTaskRegistry:
+    """Test per-user budgets and cancellation"""
+
+    @pytest.mark.asyncio
+    async def test_budget_and_cancel(self):
+        """Test a second task over budget is rejected and logout cancels running ones"""
+        registry = UserTaskRegistry(max_per_user=1)
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(10)
+
+        task = registry.spawn('test@example.com', work())
+        assert registry.spawn('test@example.com', work()) is None
+        assert registry.spawn('other@example.com', work()) is not None
+        await started.wait()
+
+        assert registry.cancel_user('test@example.com') == 1
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert registry.running('test@example.com') == 0
+        await registry.shutdown()
+        assert registry.stats()['rejected'] == 1
@@ -0,0 +1,64 @@
+"""Tests for the quota token buckets"""
+import pytest
+from unittest.mock import patch
+from draftly_v1.services.utils.rate_limiter import QuotaLimiter, TokenBucket
+
+
+class TestTokenBucket:
+    """Test reservation and blocking"""
+
+    def test_reserve_within_capacity(self):
+        """Test calls under the burst size do not wait"""
+        bucket = TokenBucket(rate=100)
+        assert bucket.reserve(60) == 0
+        assert bucket.reserve(40) == 0
+
+    def test_reserve_beyond_capacity_waits_for_refill(self):
+        """Test an overdrawn bucket reports the refill time"""
+        bucket = TokenBucket(rate=100)
+        bucket.reserve(100)
+        assert bucket.reserve(50) == pytest.approx(0.5, abs=0.01)
+        # The next caller queues behind the previous reservation
+        assert bucket.reserve(50) == pytest.approx(1.0, abs=0.01)
+
+    def test_block_honours_retry_after(self):
+        """Test a server Retry-After holds reservations"""
+        bucket = TokenBucket(rate=100)
+        bucket.block(3)
+        assert bucket.reserve(1) == pytest.approx(3, abs=0.05)
+        assert bucket.level() < 0
+
+
+class TestQuotaLimiter:
+    """Test per-user and project limits"""
+
+    @pytest.mark.asyncio
+    async def test_users_are_limited_independently(self):
+        """Test one user's usage does not delay another user"""
+        limiter = QuotaLimiter(user_rate=100, project_rate=10000)
+        with patch('draftly_v1.services.utils.rate_limiter.asyncio.sleep') as sleep:
+            await limiter.acquire('alice@example.com', 100)
+            await limiter.acquire('bob@example.com', 100)
+            sleep.assert_not_called()
+            await limiter.acquire('alice@example.com', 100)
+            assert sleep.call_args[0][0] == pytest.approx(1.0, abs=0.01)
+        stats = limiter.stats()
+        assert stats['delayed_calls'] == 1
+        assert set(stats['users']) == {'alice@XXX', 'bob@exXXX'}
+
+    @pytest.mark.asyncio
+    async def test_project_bucket_is_shared(self):
+        """Test the project limit applies across users"""
+        limiter = QuotaLimiter(user_rate=100, project_rate=150)
+        with patch('draftly_v1.services.utils.rate_limiter.asyncio.sleep') as sleep:
+            await limiter.acquire('alice@example.com', 100)
+            await limiter.acquire('bob@example.com', 100)
+            assert sleep.call_args[0][0] == pytest.approx(50 / 150, abs=0.01)
+
+    def test_server_rate_limit_recorded(self):
+        """Test a 429 blocks the user's bucket and is counted"""
+        limiter = QuotaLimiter(user_rate=100, project_rate=10000)
+        limiter.rate_limited_by_server('alice@example.com', 2)
+        stats = limiter.stats()
+        assert stats['rate_limited'] == 1
+        assert stats['users']['alice@XXX'] <= 0
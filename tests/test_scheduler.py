@@ -0,0 +1,111 @@
+"""Tests for the fair priority scheduler"""
+import asyncio
+import pytest
+from draftly_v1.services.utils.scheduler import FairScheduler, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+
+async def _run_in_order(scheduler, requests):
+    """Queue ``requests`` ((user, priority) pairs) behind a held slot; returns the order they ran in."""
+    order = []
+
+    async def job(user, priority, index):
+        async with scheduler.slot(user, priority):
+            order.append(index)
+            await asyncio.sleep(0)
+
+    await scheduler.acquire('holder')
+    tasks = [asyncio.create_task(job(user, priority, index)) for index, (user, priority) in enumerate(requests)]
+    await asyncio.sleep(0)
+    scheduler.release('holder')
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestFairScheduler:
+    """Test slot ordering and limits"""
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap(self):
+        """Test no more than max_concurrency callers hold a slot at once"""
+        scheduler = FairScheduler(max_concurrency=2, max_per_user=10)
+        running, peak = 0, 0
+
+        async def job():
+            nonlocal running, peak
+            async with scheduler.slot('user'):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(job() for _ in range(6)))
+
+        assert peak == 2
+        assert scheduler.stats()['active'] == 0
+
+    @pytest.mark.asyncio
+    async def test_interactive_runs_before_background(self):
+        """Test waiting interactive calls get the next slot even if background work queued first"""
+        scheduler = FairScheduler(max_concurrency=1)
+
+        order = await _run_in_order(scheduler, [('a', PRIORITY_BACKGROUND), ('b', PRIORITY_BACKGROUND),
+                                                ('c', PRIORITY_INTERACTIVE)])
+
+        assert order == [2, 0, 1]
+
+    @pytest.mark.asyncio
+    async def test_users_take_turns(self):
+        """Test a user with a burst of calls does not hold back another user"""
+        scheduler = FairScheduler(max_concurrency=1)
+
+        order = await _run_in_order(scheduler, [('a', PRIORITY_INTERACTIVE)] * 3 + [('b', PRIORITY_INTERACTIVE)])
+
+        assert order == [0, 3, 1, 2]
+
+    @pytest.mark.asyncio
+    async def test_per_user_cap(self):
+        """Test one user cannot take every slot"""
+        scheduler = FairScheduler(max_concurrency=4, max_per_user=1)
+        await scheduler.acquire('a')
+        waiter = asyncio.create_task(scheduler.acquire('a'))
+        await asyncio.sleep(0)
+
+        assert not waiter.done()
+        await scheduler.acquire('b')  # other users still get slots
+        assert scheduler.stats()['priorities']['interactive']['queued'] == 1
+
+        scheduler.release('a')
+        await waiter
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        """Test a caller that gives up while queued frees its place"""
+        scheduler = FairScheduler(max_concurrency=1)
+        await scheduler.acquire('a')
+        waiter = asyncio.create_task(scheduler.acquire('b', PRIORITY_BACKGROUND))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release('a')
+
+        stats = scheduler.stats()
+        assert stats['active'] == 0
+        assert stats['priorities']['background']['queued'] == 0
+        assert stats['cancelled'] == 1
+
+    @pytest.mark.asyncio
+    async def test_release_right_after_cancel_skips_cancelled_waiter(self):
+        """Test a release before the cancelled waiter's task resumes neither raises nor leaks its slot"""
+        scheduler = FairScheduler(max_concurrency=1)
+        await scheduler.acquire('a')
+        waiter = asyncio.create_task(scheduler.acquire('b'))
+        await asyncio.sleep(0)
+
+        waiter.cancel()  # cancels the queued future now; the waiter's task resumes later
+        scheduler.release('a')
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        assert scheduler.stats()['active'] == 0
+        await asyncio.wait_for(scheduler.acquire('c'), timeout=1)
+        assert scheduler.stats()['active'] == 1
@@ -0,0 +1,98 @@
+"""Tests for speculative draft pre-generation"""
+import uuid
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from draftly_v1.model.DraftLog import DraftLog
+from draftly_v1.model.User import User
+from draftly_v1.services import speculative_services
+from draftly_v1.services.database import engine, store_user, save_thread_context, get_drafted_history_ids
+from draftly_v1.services.utils.scheduler import PRIORITY_BACKGROUND
+from draftly_v1.services.speculative_services import SpeculativeDrafter
+
+
+def _entry(thread_id, history_id='7'):
+    return {'thread_id': thread_id, 'history_id': history_id, 'reply_headers': {},
+            'messages': [{'message_id': 'm1', 'from': 'a@example.com', 'subject': 'Hi', 'body': 'Hello there'}]}
+
+
+@pytest.fixture
+def client():
+    """Mock Gmail client"""
+    client = MagicMock()
+    client.email = 'test@example.com'
+    return client
+
+
+@pytest.fixture
+def env():
+    """Patch the thread store, database and LLM used by the drafter"""
+    saved = {}
+    with patch.object(speculative_services, 'thread_store') as store, \
+            patch.object(speculative_services, 'get_user_by_email', return_value=MagicMock(style_profile='Friendly')), \
+            patch.object(speculative_services, 'get_drafted_history_ids', return_value={'t2': {'6', '7'}}), \
+            patch.object(speculative_services, 'save_speculative_draft',
+                         side_effect=lambda email, t_id, *args: saved.__setitem__(t_id, args)), \
+            patch.object(speculative_services, 'agenerate_draft', AsyncMock(return_value='Draft\ntext')) as generate:
+        store.prefetch = AsyncMock(return_value=[])
+        store.get = AsyncMock(side_effect=lambda client, t_id: _entry(t_id))
+        yield {'saved': saved, 'generate': generate}
+
+
+class TestSpeculativeDrafter:
+    """Test pre-generation and reuse"""
+
+    @pytest.mark.asyncio
+    async def test_generates_for_top_threads_without_current_draft(self, client, env):
+        """Test drafts are generated with the stored style, skipping threads already drafted"""
+        drafter = SpeculativeDrafter(top_n=3, token_budget_per_hour=100000)
+        count = await drafter.run(client, ['t1', 't2', 't3', 't4'])
+
+        assert count == 2
+        assert sorted(env['saved']) == ['t1', 't3']
+        history_id, style, context, draft = env['saved']['t1']
+        assert (history_id, style, draft) == ('7', 'Friendly', 'Draft text')
+        assert env['generate'].call_args[0][1] == 'Friendly'
+        assert env['generate'].call_args.kwargs['priority'] == PRIORITY_BACKGROUND
+
+    @pytest.mark.asyncio
+    async def test_token_budget_limits_generation(self, client, env):
+        """Test generation stops once the user's token budget is spent"""
+        cost = speculative_services.estimate_draft_tokens(list(reversed(_entry('t1')['messages'])))
+        drafter = SpeculativeDrafter(top_n=3, token_budget_per_hour=cost + 10)
+        assert await drafter.run(client, ['t1', 't3']) == 1
+        assert drafter.stats()['skipped_budget'] == 1
+
+    @pytest.mark.asyncio
+    async def test_take_matching_draft(self):
+        """Test a draft for the current history and style is returned"""
+        drafter = SpeculativeDrafter()
+        stored = {'draft_content': 'Ready', 'history_id': '7', 'user_style': 'Friendly'}
+        with patch.object(speculative_services, 'take_speculative_draft', return_value=stored):
+            assert await drafter.take('test@example.com', 't1', '7', 'Friendly') == 'Ready'
+
+    @pytest.mark.asyncio
+    async def test_take_discards_stale_draft(self):
+        """Test a draft generated before the thread changed is thrown away"""
+        drafter = SpeculativeDrafter()
+        stored = {'draft_content': 'Old', 'history_id': '6', 'user_style': 'Friendly'}
+        with patch.object(speculative_services, 'take_speculative_draft', return_value=stored) as take:
+            assert await drafter.take('test@example.com', 't1', '7', 'Friendly') is None
+        take.assert_called_once_with('test@example.com', 't1')
+        assert drafter.stats()['discarded'] == 1
+
+
+class TestDraftedHistoryIds:
+    """Test which thread states already have a draft"""
+
+    def test_opened_draft_counts_as_drafted(self):
+        """Test a thread the user opened is not pre-generated again while unchanged"""
+        User.__table__.create(bind=engine, checkfirst=True)
+        DraftLog.__table__.create(bind=engine, checkfirst=True)
+        email = f"{uuid.uuid4().hex}@example.com"
+        store_user(email=email, refresh_token='refresh', style_profile=None)
+        context = [{'from': 'a@example.com', 'to': email, 'subject': 'Hi', 'body': 'Hello'}]
+
+        save_thread_context(email, 't1', context, 'Draft', history_id='7')
+        save_thread_context(email, 't2', context, 'Draft')
+
+        assert get_drafted_history_ids(email) == {'t1': {'7'}}
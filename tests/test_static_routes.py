@@ -0,0 +1,28 @@
+"""Tests for static and monitoring routes"""
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from draftly_v1.app import app
+
+client = TestClient(app)
+
+
+class TestMetricsRoute:
+    """Test access to /metrics"""
+
+    def test_disabled_without_token(self):
+        """Test /metrics is not served while METRICS_TOKEN is unset"""
+        with patch('draftly_v1.routes.static_routes.METRICS_TOKEN', None):
+            assert client.get('/metrics').status_code == 404
+
+    def test_requires_bearer_token(self):
+        """Test /metrics refuses requests without the configured token"""
+        with patch('draftly_v1.routes.static_routes.METRICS_TOKEN', 'metrics-secret'):
+            assert client.get('/metrics').status_code == 401
+            assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+    def test_serves_metrics_with_token(self):
+        """Test the registered providers are reported to a caller with the token"""
+        with patch('draftly_v1.routes.static_routes.METRICS_TOKEN', 'metrics-secret'):
+            response = client.get('/metrics', headers={'Authorization': 'Bearer metrics-secret'})
+        assert response.status_code == 200
+        assert 'llm_context' in response.json()
@@ -0,0 +1,166 @@
+"""Tests for incremental inbox sync"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from draftly_v1.services.gmail_client import GmailApiError, GmailBatchResponse
+from draftly_v1.services.sync_services import (sync_inbox, matches_inbox_query, iter_inbox_page,
+                                              encode_page_cursor, decode_page_cursor, InvalidCursorError)
+
+
+def _metadata(msg_id, thread_id, internal_date, labels=('INBOX', 'UNREAD')):
+    return {
+        'id': msg_id,
+        'threadId': thread_id,
+        'snippet': f'snippet {msg_id}',
+        'internalDate': str(internal_date),
+        'labelIds': list(labels),
+        'payload': {'headers': [
+            {'name': 'From', 'value': f'{msg_id}@example.com'},
+            {'name': 'Subject', 'value': f'Subject {msg_id}'},
+        ]}
+    }
+
+
+def _record(msg_id, thread_id, internal_date):
+    return {
+        'id': msg_id, 'threadId': thread_id, 'from': f'{msg_id}@example.com', 'to': 'Unknown',
+        'subject': f'Subject {msg_id}', 'snippet': f'snippet {msg_id}',
+        'internalDate': internal_date, 'labelIds': ['INBOX', 'UNREAD'],
+    }
+
+
+@pytest.fixture
+def client():
+    client = MagicMock()
+    client.email = 'user@example.com'
+    client.get_profile = AsyncMock(return_value={'historyId': '500'})
+    client.list_messages = AsyncMock(return_value={'messages': []})
+    client.list_history = AsyncMock()
+    client.batch = AsyncMock(return_value={})
+    return client
+
+
+@pytest.fixture
+def cursor_store():
+    """In-memory stand-in for the sync cursor table"""
+    store = {}
+
+    def get(email):
+        return store.get(email)
+
+    def save(email, history_id, messages, has_more=False):
+        store[email] = {'history_id': str(history_id), 'messages': messages, 'has_more': has_more}
+        return True
+
+    with patch('draftly_v1.services.sync_services.get_sync_cursor', side_effect=get), \
+         patch('draftly_v1.services.sync_services.save_sync_cursor', side_effect=save):
+        yield store
+
+
+class TestSyncServices:
+    """Test the history-based sync engine"""
+
+    def test_matches_inbox_query(self):
+        """Test label filtering mirrors the inbox query"""
+        assert matches_inbox_query(['INBOX', 'UNREAD'])
+        assert not matches_inbox_query(['INBOX'])
+        assert not matches_inbox_query(['INBOX', 'UNREAD', 'CATEGORY_PROMOTIONS'])
+
+    @pytest.mark.asyncio
+    async def test_full_sync_without_cursor(self, client, cursor_store):
+        """Test the first sync lists the inbox and stores a cursor"""
+        client.list_messages.return_value = {'messages': [{'id': 'm1', 'threadId': 't1'}]}
+        client.batch.return_value = {'m1': GmailBatchResponse(200, data=_metadata('m1', 't1', 1000))}
+
+        records = await sync_inbox(client)
+
+        assert [r['id'] for r in records] == ['m1']
+        assert cursor_store['user@example.com']['history_id'] == '500'
+        client.list_history.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_idle_inbox_makes_one_history_call(self, client, cursor_store):
+        """Test an unchanged inbox is served from the snapshot"""
+        cursor_store['user@example.com'] = {
+            'history_id': '500', 'messages': [_record('m1', 't1', 1000)], 'has_more': False}
+        client.list_history.return_value = {'historyId': '500'}
+
+        records = await sync_inbox(client)
+
+        assert [r['id'] for r in records] == ['m1']
+        client.list_history.assert_awaited_once()
+        client.list_messages.assert_not_called()
+        client.batch.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_delta_applies_added_and_read_messages(self, client, cursor_store):
+        """Test new mail is fetched and read mail is dropped without a full listing"""
+        cursor_store['user@example.com'] = {
+            'history_id': '500', 'messages': [_record('m1', 't1', 1000)], 'has_more': False}
+        client.list_history.return_value = {
+            'historyId': '510',
+            'history': [
+                {'messagesAdded': [{'message': {'id': 'm2', 'threadId': 't2', 'labelIds': ['INBOX', 'UNREAD']}}]},
+                {'labelsRemoved': [{'message': {'id': 'm1', 'threadId': 't1', 'labelIds': ['INBOX']},
+                                    'labelIds': ['UNREAD']}]},
+            ]
+        }
+        client.batch.return_value = {'m2': GmailBatchResponse(200, data=_metadata('m2', 't2', 2000))}
+
+        records = await sync_inbox(client)
+
+        assert [r['id'] for r in records] == ['m2']
+        assert list(client.batch.call_args[0][0]) == ['m2']
+        client.list_messages.assert_not_called()
+        assert cursor_store['user@example.com']['history_id'] == '510'
+
+    @pytest.mark.asyncio
+    async def test_expired_cursor_falls_back_to_full_sync(self, client, cursor_store):
+        """Test a 404 from history.list triggers a full resync"""
+        cursor_store['user@example.com'] = {'history_id': '1', 'messages': [], 'has_more': False}
+        client.list_history.side_effect = GmailApiError(404, 'Requested entity was not found.')
+
+        records = await sync_inbox(client)
+
+        assert records == []
+        client.list_messages.assert_awaited_once()
+        assert cursor_store['user@example.com']['history_id'] == '500'
+
+
+class TestInboxPages:
+    """Test cursor-based inbox paging"""
+
+    def test_cursor_round_trip(self):
+        """Test a page token survives encoding and invalid cursors are rejected"""
+        cursor = encode_page_cursor('token-2')
+        assert 'token-2' not in cursor
+        assert decode_page_cursor(cursor) == 'token-2'
+        assert encode_page_cursor(None) is None
+        assert decode_page_cursor(None) is None
+        with pytest.raises(InvalidCursorError):
+            decode_page_cursor('not-a-cursor')
+
+    @pytest.mark.asyncio
+    async def test_page_is_streamed_in_chunks(self, client):
+        """Test records are fetched chunk by chunk and the next cursor comes last"""
+        client.list_messages.return_value = {
+            'messages': [{'id': f'm{i}', 'threadId': f't{i}'} for i in range(3)],
+            'nextPageToken': 'token-2',
+        }
+        client.batch.side_effect = lambda requests: {
+            msg_id: GmailBatchResponse(200, data=_metadata(msg_id, 't', 1000)) for msg_id in requests}
+
+        items = [item async for item in iter_inbox_page(client, 3, encode_page_cursor('token-1'), chunk_size=2)]
+
+        assert [item['id'] for item in items[:-1]] == ['m0', 'm1', 'm2']
+        assert decode_page_cursor(items[-1]['next_cursor']) == 'token-2'
+        assert client.list_messages.call_args.kwargs['page_token'] == 'token-1'
+        assert client.list_messages.call_args.kwargs['max_results'] == 3
+        assert [list(call.args[0]) for call in client.batch.call_args_list] == [['m0', 'm1'], ['m2']]
+
+    @pytest.mark.asyncio
+    async def test_last_page_has_no_cursor(self, client):
+        """Test an empty last page yields only a null cursor"""
+        items = [item async for item in iter_inbox_page(client, 10)]
+
+        assert items == [{'next_cursor': None}]
+        client.batch.assert_not_called()
@@ -0,0 +1,215 @@
+"""Tests for the parsed thread store"""
+import base64
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from draftly_v1.model.ThreadCache import ThreadCache
+from draftly_v1.services.database import engine, get_db_session, get_cached_thread, save_cached_thread
+from draftly_v1.services.gmail_client import GmailBatchResponse
+from draftly_v1.services.thread_store import ThreadStore, parse_thread, REPLY_HEADERS
+
+
+def _headers(index):
+    return [
+        {'name': 'From', 'value': f'sender{index}@example.com'},
+        {'name': 'To', 'value': 'me@example.com'},
+        {'name': 'Subject', 'value': 'Hi'},
+        {'name': 'Message-Id', 'value': f'<msg{index}@example.com>'},
+    ]
+
+
+def _payload(index):
+    data = base64.urlsafe_b64encode(f'<p>Body {index}</p>'.encode()).decode()
+    return {'mimeType': 'multipart/alternative', 'headers': _headers(index),
+            'parts': [{'mimeType': 'text/html', 'body': {'data': data}}]}
+
+
+def _metadata_thread(history_id, count):
+    return {
+        'id': 'thread_1',
+        'historyId': history_id,
+        'messages': [{'id': f'msg_{i}', 'snippet': f'Snippet {i} &amp; more', 'payload': {'headers': _headers(i)}}
+                     for i in range(count)],
+    }
+
+
+@pytest.fixture
+def client():
+    """Mock Gmail client serving one thread of two messages"""
+    client = MagicMock()
+    client.email = 'test@example.com'
+    client.history_id = '10'
+    client.message_count = 2
+
+    async def get_thread(thread_id, format='full', **kwargs):
+        if format == 'minimal':
+            return {'historyId': client.history_id}
+        return _metadata_thread(client.history_id, client.message_count)
+
+    async def batch(requests):
+        return {msg_id: GmailBatchResponse(200, data={'id': msg_id, 'payload': _payload(int(msg_id[-1]))})
+                for msg_id in requests}
+
+    client.get_thread = AsyncMock(side_effect=get_thread)
+    client.batch = AsyncMock(side_effect=batch)
+    return client
+
+
+def _formats(client):
+    return [c.kwargs.get('format') for c in client.get_thread.call_args_list]
+
+
+class TestParseThread:
+    """Test thread parsing"""
+
+    def test_parse_full_thread(self):
+        """Test messages and reply headers are extracted from a full thread"""
+        parsed = parse_thread({'id': 'thread_1', 'historyId': '10',
+                               'messages': [{'id': 'msg_0', 'payload': _payload(0)}]})
+        assert parsed['history_id'] == '10'
+        assert parsed['messages'][0]['from'] == 'sender0@example.com'
+        assert parsed['messages'][0]['body'] == '<p>Body 0</p>'
+        assert parsed['reply_headers'] == {
+            'Subject': 'Hi', 'Message-ID': '<msg0@example.com>', 'References': None}
+
+    def test_parse_tiered_thread(self):
+        """Test messages without a fetched body fall back to their snippet"""
+        parsed = parse_thread(_metadata_thread('10', 2), bodies={'msg_1': _payload(1)})
+        assert parsed['messages'][0]['body'] == 'Snippet 0 & more'
+        assert parsed['messages'][1]['body'] == '<p>Body 1</p>'
+
+
+class TestThreadStore:
+    """Test caching, tiered fetching and historyId validation"""
+
+    @pytest.mark.asyncio
+    async def test_tiered_fetch_uses_masks_and_limits_bodies(self, client):
+        """Test metadata is fetched for all messages and bodies only for the newest"""
+        client.message_count = 4
+        store = ThreadStore(body_messages=2)
+        entry = await store.get(client, 'thread_1')
+
+        metadata_call = client.get_thread.call_args
+        assert metadata_call.kwargs['format'] == 'metadata'
+        assert 'fields' in metadata_call.kwargs
+        requests = client.batch.call_args[0][0]
+        assert list(requests) == ['msg_2', 'msg_3']
+        assert all(r.params['fields'] for r in requests.values())
+        assert [m['body'] for m in entry['messages']] == [
+            'Snippet 0 & more', 'Snippet 1 & more', '<p>Body 2</p>', '<p>Body 3</p>']
+
+    @pytest.mark.asyncio
+    async def test_repeat_read_within_window_makes_no_calls(self, client):
+        """Test a second read inside the revalidation window is served from memory"""
+        store = ThreadStore(revalidate_after=60)
+        first = await store.get(client, 'thread_1')
+        second = await store.get(client, 'thread_1')
+        assert first is second
+        assert _formats(client) == ['metadata']
+        assert client.batch.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_unchanged_thread_is_validated_cheaply(self, client):
+        """Test an old entry costs one minimal call when the thread is unchanged"""
+        store = ThreadStore(revalidate_after=0)
+        await store.get(client, 'thread_1')
+        await store.get(client, 'thread_1')
+        assert _formats(client) == ['metadata', 'minimal']
+        assert store.stats()['fetches'] == 1
+
+    @pytest.mark.asyncio
+    async def test_changed_thread_is_refetched(self, client):
+        """Test a new historyId triggers a new download"""
+        store = ThreadStore(revalidate_after=0)
+        await store.get(client, 'thread_1')
+        client.history_id = '11'
+        entry = await store.get(client, 'thread_1')
+        assert entry['history_id'] == '11'
+        assert _formats(client) == ['metadata', 'minimal', 'metadata']
+
+    @pytest.mark.asyncio
+    async def test_mark_stale_forces_validation(self, client):
+        """Test sync-driven invalidation ends the trust window"""
+        store = ThreadStore(revalidate_after=60)
+        await store.get(client, 'thread_1')
+        store.mark_stale('test@example.com', 'thread_1')
+        await store.get(client, 'thread_1')
+        assert _formats(client) == ['metadata', 'minimal']
+
+    @pytest.mark.asyncio
+    async def test_reply_headers_without_cached_thread(self, client):
+        """Test reply headers come from one metadata call limited to the reply headers"""
+        store = ThreadStore()
+        headers = await store.get_reply_headers(client, 'thread_1')
+        assert headers['Message-ID'] == '<msg1@example.com>'
+        call = client.get_thread.call_args
+        assert call.kwargs['format'] == 'metadata'
+        assert call.kwargs['metadata_headers'] == list(REPLY_HEADERS)
+        client.batch.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_reply_headers_from_cached_thread(self, client):
+        """Test reply headers of a cached thread need no Gmail call"""
+        store = ThreadStore(revalidate_after=60)
+        await store.get(client, 'thread_1')
+        headers = await store.get_reply_headers(client, 'thread_1')
+        assert headers['Message-ID'] == '<msg1@example.com>'
+        assert client.get_thread.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_sql_tier(self, client):
+        """Test entries are persisted and reloaded from the second tier"""
+        rows = {}
+        store = ThreadStore(
+            revalidate_after=60,
+            db_loader=lambda email, thread_id: rows.get((email, thread_id)),
+            db_saver=lambda email, thread_id, history_id, messages, reply_headers: rows.__setitem__(
+                (email, thread_id),
+                {'thread_id': thread_id, 'history_id': history_id,
+                 'messages': messages, 'reply_headers': reply_headers}),
+        )
+        await store.get(client, 'thread_1')
+        store.clear()
+        entry = await store.get(client, 'thread_1')
+        assert entry['messages'][0]['message_id'] == 'msg_0'
+        assert _formats(client) == ['metadata', 'minimal']
+        assert store.stats()['db_hits'] == 1
+
+
+@pytest.fixture
+def thread_cache_table():
+    """Real, empty thread_cache table in the test SQLite database"""
+    ThreadCache.__table__.create(bind=engine, checkfirst=True)
+    session = get_db_session()
+    session.query(ThreadCache).delete()
+    session.commit()
+    session.close()
+    yield
+
+
+class TestThreadCacheTable:
+    """Test pruning of the SQL tier"""
+
+    def test_rows_beyond_the_per_user_cap_are_pruned(self, thread_cache_table):
+        """Test only the most recently saved threads of a user are kept"""
+        for thread_id in ('t1', 't2', 't3'):
+            save_cached_thread('a@example.com', thread_id, '1', [], {}, max_rows_per_user=2)
+        save_cached_thread('b@example.com', 't1', '1', [], {}, max_rows_per_user=2)
+
+        assert get_cached_thread('a@example.com', 't1') is None
+        assert get_cached_thread('a@example.com', 't2') is not None
+        assert get_cached_thread('a@example.com', 't3') is not None
+        assert get_cached_thread('b@example.com', 't1') is not None
+
+    def test_old_rows_are_pruned(self, thread_cache_table):
+        """Test threads not saved within max_age are dropped on the user's next write"""
+        save_cached_thread('a@example.com', 'old', '1', [], {})
+        session = get_db_session()
+        session.query(ThreadCache).update({"updated_at": datetime.now(timezone.utc) - timedelta(days=30)})
+        session.commit()
+        session.close()
+
+        save_cached_thread('a@example.com', 'new', '1', [], {}, max_age=86400)
+
+        assert get_cached_thread('a@example.com', 'old') is None
+        assert get_cached_thread('a@example.com', 'new') is not None
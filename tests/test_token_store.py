@@ -0,0 +1,81 @@
+"""Tests for the access token store"""
+import threading
+import time
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from draftly_v1.services.token_store import TokenStore
+
+
+def _expiry(seconds):
+    return datetime.utcnow() + timedelta(seconds=seconds)
+
+
+class TestTokenStore:
+    """Test TokenStore caching and refresh behaviour"""
+
+    def test_returns_cached_token(self):
+        """Test a fresh token is served without refreshing"""
+        store = TokenStore(refresh_margin=60)
+        store.put('user@example.com', 'cached', _expiry(3600))
+        refresh = MagicMock()
+
+        token, _ = store.get_or_refresh('user@example.com', refresh)
+
+        assert token == 'cached'
+        refresh.assert_not_called()
+
+    def test_refreshes_inside_margin(self):
+        """Test a token about to expire is refreshed"""
+        store = TokenStore(refresh_margin=300)
+        store.put('user@example.com', 'stale', _expiry(60))
+        refresh = MagicMock(return_value=('new', _expiry(3600)))
+
+        token, _ = store.get_or_refresh('user@example.com', refresh)
+
+        assert token == 'new'
+        refresh.assert_called_once()
+
+    def test_single_flight_refresh(self):
+        """Test concurrent callers share a single refresh"""
+        store = TokenStore(refresh_margin=60)
+        calls = []
+
+        def slow_refresh():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'shared', _expiry(3600)
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(store.get_or_refresh('user@example.com', slow_refresh)[0]))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert results == ['shared'] * 5
+
+    def test_uses_db_tier_before_refreshing(self):
+        """Test a fresh token persisted by another worker is reused"""
+        loader = MagicMock(return_value=('from_db', _expiry(3600)))
+        store = TokenStore(refresh_margin=60, db_loader=loader, db_saver=MagicMock())
+        refresh = MagicMock()
+
+        token, _ = store.get_or_refresh('user@example.com', refresh)
+
+        assert token == 'from_db'
+        refresh.assert_not_called()
+        assert store.stats()['db_hits'] == 1
+
+    def test_refresh_error_propagates(self):
+        """Test refresh failures are raised to the caller"""
+        store = TokenStore()
+        refresh = MagicMock(side_effect=RuntimeError('invalid_grant'))
+
+        with pytest.raises(RuntimeError):
+            store.get_or_refresh('user@example.com', refresh)
+        assert store.stats()['refresh_errors'] == 1
@@ -0,0 +1,48 @@
+"""Tests for the TTL cache utility"""
+from unittest.mock import patch
+from draftly_v1.services.utils.ttl_cache import TTLCache
+
+
+class TestTTLCache:
+    """Test TTLCache behaviour"""
+
+    def test_get_and_set(self):
+        """Test values can be stored and read back"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+        assert cache.get('missing') is None
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest entry is evicted when the cache is full"""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert 'b' not in cache
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_entries_expire(self):
+        """Test entries are dropped once their TTL has passed"""
+        cache = TTLCache(maxsize=2, ttl=10)
+        with patch('draftly_v1.services.utils.ttl_cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with patch('draftly_v1.services.utils.ttl_cache.time.monotonic', return_value=111):
+            assert cache.get('a') is None
+        assert len(cache) == 0
+
+    def test_byte_bound(self):
+        """Test entries are evicted to stay under max_bytes and oversized values are not stored"""
+        cache = TTLCache(maxsize=10, ttl=60, max_bytes=10, sizeof=len)
+        cache.set('a', 'xxxx')
+        cache.set('b', 'yyyy')
+        cache.set('c', 'zzzz')
+        assert 'a' not in cache
+        assert cache.stats()['bytes'] == 8
+        cache.set('big', 'x' * 11)
+        assert 'big' not in cache
+        assert cache.get('c') == 'zzzz'